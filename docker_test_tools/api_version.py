@@ -1,7 +1,95 @@
-def get_server_api_version():
+"""Docker server api version discovery.
+
+Negotiating the api version costs a round trip to the docker daemon, so the negotiated version is
+cached on disk per daemon endpoint (the DOCKER_HOST), and negotiation is skipped altogether when
+the version is pinned using the DOCKER_API_VERSION environment variable.
+
+The module doesn't import the docker_test_tools package, so it can be run as a script by the build.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DOCKER_HOST = 'unix://var/run/docker.sock'
+
+# Negotiated versions cache, mapping a docker daemon endpoint to its api version & negotiation time
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'docker-test-tools', 'api-versions.json')
+CACHE_TTL = 24 * 60 * 60
+
+
+def get_docker_host():
+    """Return the docker daemon endpoint, as configured by the DOCKER_HOST environment variable."""
+    return os.environ.get('DOCKER_HOST') or DEFAULT_DOCKER_HOST
+
+
+def get_known_api_version():
+    """Return the server api version if it's pinned or cached, None otherwise."""
+    pinned_version = os.environ.get('DOCKER_API_VERSION')
+    if pinned_version and pinned_version != 'auto':
+        return pinned_version
+
+    cached = _read_cache().get(get_docker_host())
+    if cached and time.time() - cached['time'] < CACHE_TTL:
+        return cached['version']
+
+    return None
+
+
+def create_client():
+    """Return a docker api client of the DOCKER_HOST daemon, avoiding negotiation if the api version is known."""
     from docker import APIClient
-    client = APIClient(base_url='unix://var/run/docker.sock')
-    return client.api_version
+    from docker.utils import kwargs_from_env
+
+    return APIClient(version=get_known_api_version() or 'auto', **kwargs_from_env())
+
+
+def get_server_api_version(client=None):
+    """Return the docker server api version.
+
+    The version is negotiated (and cached) only if it's not pinned or cached already.
+
+    :param client: docker api client used for the negotiation, a new client is created if not given.
+    """
+    version = get_known_api_version()
+    if version:
+        return version
+
+    client = client if client else create_client()
+    version = client.api_version
+    _write_cache(get_docker_host(), version)
+    return version
+
+
+def _read_cache():
+    """Return the negotiated versions cache content, empty if it's missing or invalid."""
+    try:
+        with open(CACHE_PATH) as cache_file:
+            return json.load(cache_file) or {}
+
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_cache(docker_host, version):
+    """Add the negotiated version to the cache, replacing the cache file atomically."""
+    cache = _read_cache()
+    cache[docker_host] = {'version': version, 'time': time.time()}
+    try:
+        cache_dir = os.path.dirname(CACHE_PATH)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(file_descriptor, 'w') as temp_file:
+            json.dump(cache, temp_file)
+        os.rename(temp_path, CACHE_PATH)
+
+    except (IOError, OSError):
+        log.debug("Failed writing %s", CACHE_PATH, exc_info=True)
 
 
 if __name__ == '__main__':
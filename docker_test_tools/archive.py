@@ -0,0 +1,130 @@
+"""Streaming tar archives, used for transferring files into and out of containers.
+
+Archives are generated and extracted chunk by chunk, so the memory used does not depend
+on the size of the transferred files.
+"""
+import io
+import os
+import logging
+import tarfile
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_tar(paths, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generate a tar archive of the given paths, chunk by chunk.
+
+    Each path is archived under its base name, directories are archived recursively.
+
+    :param list paths: local files & directories paths to archive.
+    :param int chunk_size: maximal size (in bytes) of the file data chunks read.
+    :return generator: generator of the archive bytes chunks.
+    """
+    # Used only for building the members headers, nothing is written through it
+    header_builder = tarfile.TarFile(fileobj=io.BytesIO(), mode="w", format=tarfile.GNU_FORMAT)
+
+    for path in paths:
+        for member_path, arcname in _iter_members(path):
+            info = header_builder.gettarinfo(member_path, arcname=arcname)
+            yield info.tobuf(header_builder.format, header_builder.encoding, header_builder.errors)
+
+            if not info.isreg():
+                continue
+
+            with io.open(member_path, "rb") as member_file:
+                for chunk in _iter_file(member_file, size=info.size, chunk_size=chunk_size):
+                    yield chunk
+
+            remainder = info.size % tarfile.BLOCKSIZE
+            if remainder:
+                yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+
+    # End of archive marker - two empty blocks
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+def extract_tar(chunks, target_dir):
+    """Extract a tar archive given as a stream of bytes chunks into the target directory.
+
+    :param chunks: iterable of the archive bytes chunks.
+    :param str target_dir: directory to extract the archive into.
+    :return list: the extracted members names.
+    :raise RuntimeError: in case a member would be extracted outside of the target directory.
+    """
+    target_dir = os.path.abspath(target_dir)
+    extracted = []
+    with tarfile.open(fileobj=ChunksReader(chunks), mode="r|") as archive:
+        for member in archive:
+            member_path = os.path.abspath(os.path.join(target_dir, member.name))
+            if os.path.commonprefix([member_path + os.sep, target_dir + os.sep]) != target_dir + os.sep:
+                raise RuntimeError("Archive member %s is outside of the target directory" % member.name)
+
+            if hasattr(tarfile, "data_filter"):
+                archive.extract(member, target_dir, filter="data")
+            else:
+                archive.extract(member, target_dir)
+
+            extracted.append(member.name)
+
+    return extracted
+
+
+class ChunksReader(object):
+    """Minimal read-only file object over an iterable of bytes chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = b""
+        self.offset = 0
+
+    def read(self, size=-1):
+        """Read up to `size` bytes, read until the end of the stream if size is negative."""
+        parts = []
+        while size != 0:
+            if self.offset >= len(self.chunk):
+                chunk = next(self.chunks, None)
+                if chunk is None:
+                    break
+
+                self.chunk, self.offset = chunk, 0
+                continue
+
+            end = len(self.chunk) if size < 0 else self.offset + size
+            part = self.chunk[self.offset:end]
+            self.offset += len(part)
+            if size > 0:
+                size -= len(part)
+
+            parts.append(part)
+
+        return b"".join(parts)
+
+
+def _iter_members(path):
+    """Yield (path, arcname) of the given path and, for directories, of everything under it."""
+    path = os.path.abspath(path)
+    base_dir = os.path.dirname(path)
+    yield path, os.path.basename(path)
+
+    if not os.path.isdir(path) or os.path.islink(path):
+        return
+
+    for dir_path, dir_names, file_names in os.walk(path):
+        dir_names.sort()
+        for name in dir_names + sorted(file_names):
+            member_path = os.path.join(dir_path, name)
+            yield member_path, os.path.relpath(member_path, base_dir)
+
+
+def _iter_file(file_object, size, chunk_size):
+    """Yield exactly `size` bytes of the file, chunk by chunk."""
+    remaining = size
+    while remaining > 0:
+        chunk = file_object.read(min(chunk_size, remaining))
+        if not chunk:
+            raise RuntimeError("File %s changed size while being archived" % file_object.name)
+
+        remaining -= len(chunk)
+        yield chunk
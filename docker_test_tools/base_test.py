@@ -13,7 +13,10 @@ class BaseDockerTest(unittest.TestCase):
     * CHECKS_TIMEOUT: Define the timeout (in seconds) for the required services start up.
     * CHECKS_INTERVAL: Define the interval (in seconds) for sampling required services checks.
     * REQUIRED_HEALTH_CHECKS: Define the health checks (callables) to pass up before the test starts running.
+    * REQUIRED_SERVICES: Define the services the test needs (along with the services they depend on).
     * WAIT_FOR_SERVICES: Define whether to wait for services health checks at test setup or not.
+
+    When all the tests declare their REQUIRED_SERVICES, the plugins start only the services they need.
     """
     # Override to define the timeout (in seconds) for the required checks to pass.
     CHECKS_TIMEOUT = 120
@@ -27,12 +30,21 @@ class BaseDockerTest(unittest.TestCase):
     # Override to disable health checks validation before the test starts running.
     WAIT_FOR_SERVICES = True
 
+    # Override to define the services the test needs, all the services are required by default.
+    REQUIRED_SERVICES = []
+
     def setUp(self):
         """Manage the required containers setup."""
+        # Start the required services, in case the environment was started without them
+        self.controller.ensure_services(self.REQUIRED_SERVICES)
+
         if self.WAIT_FOR_SERVICES:
             # Wait for docker inspection on the services to pass
+            services = self.controller.resolve_services(self.REQUIRED_SERVICES) if self.REQUIRED_SERVICES else None
             self.assertTrue(
-                self.controller.wait_for_services(interval=self.CHECKS_INTERVAL, timeout=self.CHECKS_TIMEOUT),
+                self.controller.wait_for_services(services=services,
+                                                  interval=self.CHECKS_INTERVAL,
+                                                  timeout=self.CHECKS_TIMEOUT),
                 "Required checks didn't pass within timeout")
 
         if self.REQUIRED_HEALTH_CHECKS:
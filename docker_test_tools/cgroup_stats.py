@@ -0,0 +1,348 @@
+"""Containers stats sampled directly from their cgroup files, without the docker daemon.
+
+`docker stats` (and the docker stats api) costs the docker daemon CPU and samples about once a second.
+The cgroup stats collector lists the project containers using the docker api once in a while, and samples
+their cgroup (v1 or v2) accounting files and network devices at a configurable frequency - keeping the files
+open and re-reading them, so sampling costs a few reads per container. When the containers processes aren't
+visible (e.g. running inside a build container, where their host pids are missing or belong to other processes),
+their cgroups are found by the container ids under the cgroup root, and a warning is logged if they can't be found.
+
+The samples are written to the stats file in the `docker stats` lines format - with numbers instead of human
+readable sizes, and the sample time - so they are summarized by `ClusterStats` the same way:
+
+* cpu - the used CPU percentage since the previous sample (100% per fully used CPU).
+* ram - the used memory, excluding the inactive page cache (as `docker stats` does).
+* net & net_tx - the received & transmitted network bytes (the `docker stats` NET I/O values).
+* block & block_write - the read & written block device bytes (the `docker stats` BLOCK I/O values).
+"""
+import io
+import os
+import json
+import time
+import logging
+import threading
+from timeit import default_timer
+
+import six
+
+from docker_test_tools.stats import DEFAULT_LEAK_SLOPE, StatsCollector
+from docker_test_tools.startup import PROJECT_LABEL
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CGROUP_ROOT = "/sys/fs/cgroup"
+DEFAULT_PROC_ROOT = "/proc"
+
+
+def get_cgroup_dirs(pid, cgroup_root=DEFAULT_CGROUP_ROOT, proc_root=DEFAULT_PROC_ROOT):
+    """Return the process cgroup directories.
+
+    :param int pid: the process id.
+    :return dict: controller name (e.g. `memory`, `cpuacct`) to its cgroup directory, the cgroup v2 unified
+        hierarchy directory is under the empty name.
+    """
+    dirs = {}
+    with io.open(os.path.join(proc_root, str(pid), "cgroup"), "r") as cgroup_file:
+        for line in cgroup_file:
+            if not line.strip():
+                continue
+
+            _, controllers, path = line.strip().split(":", 2)
+            for controller in controllers.split(","):
+                dirs[controller] = os.path.join(cgroup_root, controllers, path.lstrip("/"))
+
+    return dirs
+
+
+def find_container_cgroup_dirs(container_id, cgroup_root=DEFAULT_CGROUP_ROOT):
+    """Return the container cgroup directories, found by the container id under the cgroup root.
+
+    Used when the container process isn't visible (e.g. when running inside a container, in another pid
+    namespace), looking for the cgroup directories docker creates with the cgroupfs & systemd drivers.
+
+    :param str container_id: the container full id.
+    :return dict: controller name to its cgroup directory, like `get_cgroup_dirs` - empty if none was found.
+    """
+    names = [os.path.join("docker", container_id), os.path.join("system.slice", "docker-%s.scope" % container_id)]
+
+    if os.path.exists(os.path.join(cgroup_root, "cgroup.controllers")):
+        hierarchies = [""]
+    else:
+        hierarchies = sorted(os.listdir(cgroup_root)) if os.path.isdir(cgroup_root) else []
+
+    dirs = {}
+    for controllers in hierarchies:
+        for name in names:
+            path = os.path.join(cgroup_root, controllers, name)
+            if os.path.isdir(path):
+                for controller in controllers.split(","):
+                    dirs[controller] = path
+                break
+
+    return dirs
+
+
+def parse_key_values(content):
+    """Parse a cgroup flat keyed file content (e.g. `memory.stat`) into a dictionary of integers."""
+    values = {}
+    for line in content.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            values[fields[0]] = int(fields[1])
+
+    return values
+
+
+class ContainerCgroup(object):
+    """Reader of a single container cgroup accounting files, and network devices."""
+
+    def __init__(self, name, pid, cgroup_root=DEFAULT_CGROUP_ROOT, proc_root=DEFAULT_PROC_ROOT, container_id=None):
+        """Open the container stats files.
+
+        :param str name: the container name.
+        :param int pid: the container main process id.
+        :param str container_id: the container full id, for finding its cgroup when its process isn't visible
+            under the proc root (e.g. in another pid namespace, where the pid may belong to an unrelated process) -
+            in which case its network devices aren't sampled.
+        :raise IOError: if the container cgroup isn't found.
+        """
+        self.name = name
+        self.pid = pid
+        self.files = {}
+
+        try:
+            dirs = get_cgroup_dirs(pid, cgroup_root=cgroup_root, proc_root=proc_root)
+        except (IOError, OSError):
+            dirs = {}
+
+        # The process cgroup is verified to be the container's, when its id is known
+        pid_visible = bool(dirs) and (not container_id or any(container_id in path for path in dirs.values()))
+        if not pid_visible:
+            dirs = find_container_cgroup_dirs(container_id, cgroup_root=cgroup_root) if container_id else {}
+            if not dirs:
+                raise IOError("Container %s cgroup wasn't found under %s" % (name, cgroup_root))
+
+        self.unified = os.path.exists(os.path.join(cgroup_root, "cgroup.controllers"))
+        if self.unified:
+            self._open("cpu", dirs[""], "cpu.stat")
+            self._open("memory", dirs[""], "memory.current")
+            self._open("memory_stat", dirs[""], "memory.stat")
+            self._open("io", dirs[""], "io.stat")
+
+        else:
+            self._open("cpu", dirs.get("cpuacct"), "cpuacct.usage")
+            self._open("memory", dirs.get("memory"), "memory.usage_in_bytes")
+            self._open("memory_stat", dirs.get("memory"), "memory.stat")
+            self._open("io", dirs.get("blkio"), "blkio.throttle.io_service_bytes")
+
+        if pid_visible:
+            self._open("net", os.path.join(proc_root, str(pid), "net"), "dev")
+
+    def _open(self, key, dir_path, file_name):
+        """Open the stats file, unless it doesn't exist (e.g. its controller isn't enabled)."""
+        path = os.path.join(dir_path, file_name) if dir_path else None
+        if path and os.path.exists(path):
+            self.files[key] = io.open(path, "rb")
+
+    def _read(self, key):
+        """Re-read the stats file content, empty if it doesn't exist."""
+        stats_file = self.files.get(key)
+        if stats_file is None:
+            return ""
+
+        stats_file.seek(0)
+        return stats_file.read().decode("ascii")
+
+    def read(self):
+        """Return the container current stats.
+
+        :return tuple: (used CPU seconds, used memory bytes, received network bytes, transmitted network bytes,
+            read block device bytes, written block device bytes).
+        :raise IOError: if the container is no longer running.
+        """
+        memory_stat = parse_key_values(self._read("memory_stat"))
+        memory = int(self._read("memory") or 0)
+
+        if self.unified:
+            cpu = parse_key_values(self._read("cpu")).get("usage_usec", 0) / 1e6
+            memory -= memory_stat.get("inactive_file", 0)
+            io_stat = [field.split("=", 1) for line in self._read("io").splitlines() for field in line.split()[1:]]
+            block_read = sum(int(value) for key, value in io_stat if key == "rbytes")
+            block_write = sum(int(value) for key, value in io_stat if key == "wbytes")
+
+        else:
+            cpu = int(self._read("cpu") or 0) / 1e9
+            memory -= memory_stat.get("total_inactive_file", 0)
+            io_service_bytes = [line.split() for line in self._read("io").splitlines()]
+            block_read = sum(int(fields[2]) for fields in io_service_bytes if len(fields) == 3 and fields[1] == "Read")
+            block_write = sum(int(fields[2]) for fields in io_service_bytes
+                              if len(fields) == 3 and fields[1] == "Write")
+
+        # The devices lines are '<interface>: <rx bytes> <rx packets> (6 more rx counters) <tx bytes> ...',
+        # after two header lines
+        net_rx = net_tx = 0
+        for line in self._read("net").splitlines()[2:]:
+            interface, _, counters = line.partition(":")
+            counters = counters.split()
+            if interface.strip() != "lo" and len(counters) > 8:
+                net_rx += int(counters[0])
+                net_tx += int(counters[8])
+
+        return cpu, max(memory, 0), net_rx, net_tx, block_read, block_write
+
+    def close(self):
+        """Close the container stats files."""
+        for stats_file in self.files.values():
+            stats_file.close()
+
+        self.files = {}
+
+
+class CgroupStatsCollector(StatsCollector):
+    """Utility for containers stats collection, sampling their cgroup files directly."""
+
+    # Interval (seconds) of listing the project containers, finding started & restarted containers
+    REFRESH_INTERVAL = 5
+
+    def __init__(self, target_dir_path, project, encoding, environment_variables, docker_client, shared=False,
+                 leak_slope=DEFAULT_LEAK_SLOPE, frequency=10, cgroup_root=DEFAULT_CGROUP_ROOT,
+                 proc_root=DEFAULT_PROC_ROOT, clock=default_timer):
+        """Initialize the stats collector.
+
+        :param docker_client: docker api client, used for listing the project containers.
+        :param bool shared: whether other processes write messages to the stats file as well,
+            in which case the stats file is written in append mode.
+        :param int leak_slope: RAM growth (bytes per minute) above which a container is suspected of leaking
+            memory, 0 for not suspecting any container.
+        :param int frequency: number of samples per second.
+        :param str cgroup_root: the cgroup file system mount point.
+        :param str proc_root: the proc file system mount point.
+        :param callable clock: returns the current time in seconds, for measuring the CPU usage.
+        """
+        super(CgroupStatsCollector, self).__init__(
+            target_dir_path=target_dir_path,
+            project=project,
+            encoding=encoding,
+            environment_variables=environment_variables,
+            shared=shared,
+            leak_slope=leak_slope,
+        )
+        self.docker_client = docker_client
+        self.interval = 1.0 / frequency
+        self.cgroup_root = cgroup_root
+        self.proc_root = proc_root
+        self.clock = clock
+
+        self.containers = {}
+        self.cpu_samples = {}
+        self.unresolved_warned = False
+        self.sampler_thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start a stats sampling thread which writes the containers stats into a file."""
+        log.debug("Starting cgroup stats sampling from environment containers")
+        self._open_stats_file()
+        self.refresh()
+
+        self.stop_event.clear()
+        self.sampler_thread = threading.Thread(target=self._sample_stats)
+        self.sampler_thread.daemon = True
+        self.sampler_thread.start()
+
+    def stop(self):
+        """Stop the stats sampling, close the stats file and write the stats summary."""
+        if self.sampler_thread:
+            self.stop_event.set()
+            self.sampler_thread.join()
+            self.sampler_thread = None
+
+        for container in self.containers.values():
+            container.close()
+
+        self.containers = {}
+        super(CgroupStatsCollector, self).stop()
+
+    def update(self, message):
+        """Write a common log message to the container stats."""
+        with self.lock:
+            super(CgroupStatsCollector, self).update(message)
+
+    def refresh(self):
+        """Start sampling the project running containers which aren't sampled yet."""
+        project_filter = "{0}={1}".format(PROJECT_LABEL, self.project)
+        for container in self.docker_client.containers(filters={"label": project_filter}):
+            if container["Id"] in self.containers:
+                continue
+
+            name = container["Names"][0].lstrip("/") if container.get("Names") else container["Id"][:12]
+            try:
+                state = self.docker_client.inspect_container(container["Id"])["State"]
+                if not state.get("Running", True):
+                    continue
+
+                self.containers[container["Id"]] = ContainerCgroup(
+                    name=name, pid=state["Pid"], cgroup_root=self.cgroup_root, proc_root=self.proc_root,
+                    container_id=container["Id"],
+                )
+            except (IOError, OSError):
+                # The cgroup isn't visible from here (e.g. in another cgroup namespace), so nothing is recorded
+                if not self.unresolved_warned:
+                    self.unresolved_warned = True
+                    log.warning("Failed resolving container %s cgroup under %s, its stats aren't collected - "
+                                "consider using the docker stats backend", name, self.cgroup_root, exc_info=True)
+
+            except Exception:
+                # The container may have stopped since it was listed
+                log.debug("Failed opening container %s cgroup stats", name, exc_info=True)
+
+    def sample(self):
+        """Write the containers current stats into the stats file."""
+        now = self.clock()
+        lines = []
+        for container_id, container in list(self.containers.items()):
+            try:
+                cpu, ram, net_rx, net_tx, block_read, block_write = container.read()
+            except (IOError, OSError, ValueError):
+                # The container has stopped, it's sampled again once it's running (see refresh)
+                log.debug("Stopped sampling container %s stats", container.name, exc_info=True)
+                container.close()
+                del self.containers[container_id]
+                self.cpu_samples.pop(container_id, None)
+                continue
+
+            # The CPU usage is measured between samples, so the first sample of a container is skipped
+            previous = self.cpu_samples.get(container_id)
+            self.cpu_samples[container_id] = (now, cpu)
+            if previous is None or now <= previous[0]:
+                continue
+
+            lines.append(json.dumps({
+                "name": container.name,
+                "cpu": round((cpu - previous[1]) / (now - previous[0]) * 100, 2),
+                "ram": ram,
+                "net": net_rx,
+                "net_tx": net_tx,
+                "block": block_read,
+                "block_write": block_write,
+                "time": round(time.time(), 3),
+            }, sort_keys=True) + "\n")
+
+        if lines:
+            with self.lock:
+                self.stats_file.write(six.u("").join(lines))
+                self.stats_file.flush()
+
+    def _sample_stats(self):
+        """Sample the containers stats until the collection stops."""
+        next_refresh = self.clock() + self.REFRESH_INTERVAL
+        while not self.stop_event.wait(self.interval):
+            try:
+                if self.clock() >= next_refresh:
+                    next_refresh = self.clock() + self.REFRESH_INTERVAL
+                    self.refresh()
+
+                self.sample()
+            except Exception:
+                log.warning("Failed sampling the environment containers stats", exc_info=True)
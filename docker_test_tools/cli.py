@@ -0,0 +1,120 @@
+"""Command line tools for the collected environment logs.
+
+Usage:
+
+    dtt-logs search --log-path logs/docker-tests.log --service consul.service --test test_service_down refused
+    dtt-logs merge --log-path logs/docker-tests.log --test test_service_down
+    dtt-logs split --log-path logs/docker-tests.log --workers 8
+"""
+from __future__ import print_function
+
+import os
+import sys
+import argparse
+
+from docker_test_tools import log_index, log_merge, log_split
+from docker_test_tools.config import Config
+
+
+def search(args):
+    """Print the indexed log lines matching the query."""
+    index = log_index.LogIndex.load(args.index if args.index else log_index.get_index_path(args.log_path))
+    count = 0
+    for match in index.search(terms=args.terms, service=args.service, test=args.test,
+                              since=args.since, until=args.until):
+        print("{service} | {line}".format(service=match.service, line=match.line))
+        count += 1
+        if args.limit and count >= args.limit:
+            break
+
+    return 0 if count else 1
+
+
+def merge(args):
+    """Print the services log lines, ordered by their timestamps."""
+    services = args.service or log_merge.get_log_services(
+        args.log_path, compose_paths=args.compose_path or [Config.DEFAULT_DOCKER_COMPOSE_PATH])
+    if services is None:
+        raise RuntimeError("Can't tell which logs next to %s are services logs - no logs index or compose files "
+                           "found, use --service to list the services" % args.log_path)
+
+    services_logs = log_merge.find_service_logs(os.path.dirname(os.path.abspath(args.log_path)),
+                                                services=services, exclude=[args.log_path])
+    if not services_logs:
+        raise RuntimeError("No services logs found next to %s" % args.log_path)
+
+    width = max(len(service) for service in services_logs)
+    for line in log_merge.merge_logs(services_logs, since=args.since, until=args.until, test=args.test):
+        print("{service:<{width}} | {line}".format(service=line.service, width=width, line=line.line))
+
+    return 0
+
+
+def split(args):
+    """Split the combined log file into a file per service, using a process pool."""
+    if not os.path.isfile(args.log_path):
+        raise RuntimeError("No combined log file found at %s" % args.log_path)
+
+    services = log_split.split_logs(args.log_path, encoding=args.encoding, workers=args.workers,
+                                    chunk_size=args.chunk_size * 1024 * 1024, index_logs=args.index_logs)
+    print("Split {log_path} into {count} services log files".format(log_path=args.log_path, count=len(services)))
+    return 0
+
+
+def get_parser():
+    """Return the command line arguments parser."""
+    parser = argparse.ArgumentParser(prog="dtt-logs", description="Docker test tools environment logs utilities.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    search_parser = subparsers.add_parser("search", help="find log lines using the logs index (see `index-logs`)")
+    search_parser.add_argument("terms", nargs="*", help="terms which must all appear in the log lines")
+    search_parser.add_argument("--log-path", default=Config.DEFAULT_LOG_PATH,
+                               help="the configured `log-path`, whose logs index is searched")
+    search_parser.add_argument("--index", help="the logs index path, overrides --log-path")
+    search_parser.add_argument("-s", "--service", help="search only the logs of the given service")
+    search_parser.add_argument("-t", "--test", help="search only logs written while the given test was running")
+    search_parser.add_argument("--since", help="search logs written since the given time (ISO 8601 or epoch)")
+    search_parser.add_argument("--until", help="search logs written until the given time (ISO 8601 or epoch)")
+    search_parser.add_argument("--limit", type=int, default=0, help="max number of lines to print")
+    search_parser.set_defaults(handler=search)
+
+    merge_parser = subparsers.add_parser("merge", help="print the services logs ordered by their timestamps")
+    merge_parser.add_argument("--log-path", default=Config.DEFAULT_LOG_PATH,
+                              help="the configured `log-path`, whose services logs are merged")
+    merge_parser.add_argument("-s", "--service", action="append",
+                              help="merge only the logs of the given services (may be repeated), defaults to the "
+                                   "indexed services or the compose files services")
+    merge_parser.add_argument("--compose-path", action="append",
+                              help="the docker compose files whose services logs are merged, used when the logs "
+                                   "aren't indexed (may be repeated, default: %s)" % Config.DEFAULT_DOCKER_COMPOSE_PATH)
+    merge_parser.add_argument("-t", "--test", help="merge only logs written while the given test was running")
+    merge_parser.add_argument("--since", help="merge logs written since the given time (ISO 8601 or epoch)")
+    merge_parser.add_argument("--until", help="merge logs written until the given time (ISO 8601 or epoch)")
+    merge_parser.set_defaults(handler=merge)
+
+    split_parser = subparsers.add_parser("split", help="split a combined log file into a file per service")
+    split_parser.add_argument("--log-path", default=Config.DEFAULT_LOG_PATH,
+                              help="the combined log file, the services log files are written next to it")
+    split_parser.add_argument("--encoding", default="utf-8", help="the log file encoding")
+    split_parser.add_argument("--workers", type=int, default=0, help="number of worker processes (default: CPUs)")
+    split_parser.add_argument("--chunk-size", type=int, default=log_split.DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                              help="the size (MB) of the log file chunks split by each worker")
+    split_parser.add_argument("--index-logs", action="store_true", help="index the services log files as well")
+    split_parser.set_defaults(handler=split)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the command line tool, return the exit status."""
+    args = get_parser().parse_args(argv)
+    try:
+        return args.handler(args)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
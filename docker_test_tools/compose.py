@@ -1,15 +1,27 @@
 import subprocess
 
 from docker_test_tools import utils
+from docker_test_tools.profiler import Profiler
 
 
 class Compose:
-    def __init__(self, compose_path, project_name, environment_variables, command):
+    def __init__(self, compose_path, project_name, environment_variables, command, project_directory=None,
+                 profiler=None, profiles=None):
+        """Initialize the compose.
+
+        compose_path: docker compose file path, or a list of paths (later files override earlier ones).
+        profiles: docker compose profiles to enable.
+        """
         self.__environment_variables = environment_variables
+        self.profiler = profiler if profiler else Profiler(enabled=False)
         self.command = command.split(" ")
-        if compose_path:
+        if project_directory:
+            self.command += ["--project-directory", project_directory]
+        for path in utils.to_list(compose_path):
             self.command.append("-f")
-            self.command.append(compose_path)
+            self.command.append(path)
+        for profile in utils.to_list(profiles):
+            self.command += ["--profile", profile]
         self.command += ["-p", project_name]
         self.logs_process = None
 
@@ -19,13 +31,45 @@ class Compose:
             error_message="Failed getting the compose services",
         ).split("\n")
 
-    def up(self):
+    def up(self, services=None, no_deps=False):
+        """Run the compose services.
+
+        services: services to run, defaults to all the services.
+        no_deps: whether or not to skip running the services dependencies.
+        """
+        command_args = ["up", "--build", "-d"]
+        if no_deps:
+            command_args.append("--no-deps")
+
         self.__try_run_or_raise(
-            command_args=["up", "--build", "-d"],
+            command_args=command_args + list(services or []),
             error_message="Failed up the compose services",
             stderr=subprocess.STDOUT,
         )
 
+    def create(self, services=None):
+        """Build & create the compose services containers, along with the project networks & volumes, without
+        starting them.
+
+        services: services to create (along with their dependencies), defaults to all the services.
+        """
+        self.__try_run_or_raise(
+            command_args=["up", "--build", "--no-start"] + list(services or []),
+            error_message="Failed creating the compose services",
+            stderr=subprocess.STDOUT,
+        )
+
+    def start(self, services):
+        """Start the created containers of the compose services.
+
+        services: services to start.
+        """
+        self.__try_run_or_raise(
+            command_args=["start"] + list(services),
+            error_message="Failed starting the compose services",
+            stderr=subprocess.STDOUT,
+        )
+
     def down(self):
         self.__try_run_or_raise(
             command_args=["down"],
@@ -42,7 +86,7 @@ class Compose:
     def start_logs_collector(self, stdout):
         """Start a log collection process which writes docker-compose logs into a stdout.
 
-        stdout: stream to write the logs to.
+        stdout: stream to write the logs to (or subprocess.PIPE, for reading them from the returned process).
         """
         cmd = self.command + [
             "logs",
@@ -55,6 +99,7 @@ class Compose:
             stdout=stdout,
             env=self.__environment_variables,
         )
+        return self.logs_process
 
     def stop_logs_collector(self):
         """Stop the log collection process."""
@@ -72,7 +117,8 @@ class Compose:
 
     def __run_command(self, command_args, stderr=None):
         cmd = self.command + command_args
-        services_output = subprocess.check_output(
-            cmd, stderr=stderr, env=self.__environment_variables
-        )
+        with self.profiler.span("compose " + command_args[0], category="compose", command=" ".join(cmd)):
+            services_output = subprocess.check_output(
+                cmd, stderr=stderr, env=self.__environment_variables
+            )
         return utils.to_str(services_output).strip()
@@ -0,0 +1,234 @@
+"""Utilities for reading & rewriting docker compose files in-process."""
+import io
+import os
+import re
+import copy
+import json
+import hashlib
+import logging
+
+import six
+
+from docker_test_tools import utils
+
+log = logging.getLogger(__name__)
+
+# Parsed services metadata cache, keyed by the compose files content & the variables they use
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "docker-test-tools", "compose")
+# Bumped whenever the metadata format or parsing changes, invalidating the cached metadata
+METADATA_VERSION = 1
+
+# Matches '$$', '$VAR', '${VAR}' and '${VAR<separator><value>}' (separators: ':-', '-', ':?', '?')
+VARIABLE_PATTERN = re.compile(r"\$(?:(\$)|([_a-zA-Z][_a-zA-Z0-9]*)|{([_a-zA-Z][_a-zA-Z0-9]*)(?:(:?[-?])([^}]*))?})")
+
+
+def load(compose_path):
+    """Load a docker compose file.
+
+    :param str compose_path: docker compose file path.
+    :return dict: the compose file content.
+    """
+    import yaml
+
+    with io.open(compose_path, "r", encoding="utf-8") as compose_file:
+        return yaml.safe_load(compose_file) or {}
+
+
+def dump(compose_config, compose_path):
+    """Write a docker compose file.
+
+    :param dict compose_config: the compose file content.
+    :param str compose_path: docker compose file path.
+    """
+    import yaml
+
+    with io.open(compose_path, "w", encoding="utf-8") as compose_file:
+        compose_file.write(yaml.safe_dump(compose_config, default_flow_style=False))
+
+
+def with_ephemeral_ports(compose_config):
+    """Return a copy of the compose config in which the services publish their ports on ephemeral host ports.
+
+    Fixed container names are removed as well, allowing several projects of the same compose file
+    to run side by side.
+
+    :param dict compose_config: the compose file content.
+    :return dict: the rewritten compose file content.
+    """
+    compose_config = copy.deepcopy(compose_config)
+    for service_config in (compose_config.get("services") or {}).values():
+        service_config.pop("container_name", None)
+        if service_config.get("ports"):
+            service_config["ports"] = [_ephemeral_port(port) for port in service_config["ports"]]
+
+    return compose_config
+
+
+def get_dependencies(compose_config):
+    """Return the services dependencies, as defined by their 'depends_on' option.
+
+    :param dict compose_config: the compose file content.
+    :return dict: service name to the list of service names it depends on.
+    """
+    return {
+        service_name: sorted(service_config.get("depends_on") or [])
+        for service_name, service_config in (compose_config.get("services") or {}).items()
+    }
+
+
+def get_metadata(compose_paths, environment=None):
+    """Return the services metadata of the compose files, without running docker compose.
+
+    The metadata is cached on disk, keyed by the compose files content, the project '.env' file
+    and the values of the variables the files use, so unchanged files aren't parsed again.
+
+    Files using features which aren't supported in-process ('extends', 'include') are not parsed,
+    in which case None is returned and docker compose should be used instead.
+
+    :param list compose_paths: the docker compose file paths, later files override earlier ones.
+    :param dict environment: variables used for interpolation, defaults to the process environment.
+    :return dict: the service names, and per service its health check, dependencies & ports - or None.
+    """
+    environment = os.environ if environment is None else environment
+    try:
+        contents = [_read(path) for path in compose_paths]
+    except (IOError, OSError):
+        log.debug("Failed reading compose files %s, skipping in-process parsing", compose_paths)
+        return None
+
+    variables = _read_env_file(os.path.join(os.path.dirname(os.path.abspath(compose_paths[0])), ".env"))
+    variables.update(environment)
+
+    cache_key = _get_cache_key(compose_paths, contents, variables)
+    cache_path = os.path.join(CACHE_DIR, cache_key + ".json")
+    metadata = utils.read_json_file(cache_path)
+    if metadata is not None:
+        return metadata
+
+    metadata = _parse_metadata(contents, variables)
+    if metadata is not None:
+        utils.write_json_file(cache_path, metadata)
+
+    return metadata
+
+
+def _parse_metadata(contents, variables):
+    """Parse the compose files content into the services metadata, None if not supported."""
+    import yaml
+
+    services = {}
+    for content in contents:
+        try:
+            compose_config = yaml.safe_load(content) or {}
+        except yaml.YAMLError:
+            log.debug("Failed parsing compose file, skipping in-process parsing", exc_info=True)
+            return None
+
+        if "include" in compose_config:
+            return None
+
+        for service_name, service_config in (compose_config.get("services") or {}).items():
+            service_config = service_config or {}
+            if "$" in service_name or "extends" in service_config:
+                return None
+
+            merged = services.setdefault(service_name, {"ports": []})
+            merged["ports"] = merged["ports"] + (service_config.get("ports") or [])
+            for option in ("healthcheck", "depends_on", "profiles"):
+                if option in service_config:
+                    merged[option] = service_config[option]
+
+    active_profiles = set(_interpolate("${COMPOSE_PROFILES}", variables).split(","))
+    services = {
+        service_name: service_config for service_name, service_config in services.items()
+        if not service_config.get("profiles") or active_profiles & set(service_config["profiles"])
+    }
+
+    return _interpolate({
+        "services": sorted(services),
+        "healthchecks": {name: config.get("healthcheck") for name, config in services.items()},
+        "depends_on": {name: sorted(config.get("depends_on") or []) for name, config in services.items()},
+        "ports": {name: config["ports"] for name, config in services.items()},
+    }, variables)
+
+
+def _interpolate(value, variables):
+    """Return the value with its variables substituted, as done by docker compose."""
+    if isinstance(value, dict):
+        return {key: _interpolate(item, variables) for key, item in value.items()}
+
+    if isinstance(value, list):
+        return [_interpolate(item, variables) for item in value]
+
+    if not isinstance(value, six.string_types):
+        return value
+
+    def substitute(match):
+        escaped, name, braced_name, separator, default = match.groups()
+        if escaped:
+            return "$"
+
+        variable = variables.get(name or braced_name)
+        if (separator == ":-" and not variable) or (separator == "-" and variable is None):
+            return default
+
+        return variable or ""
+
+    return VARIABLE_PATTERN.sub(substitute, value)
+
+
+def _get_cache_key(compose_paths, contents, variables):
+    """Return the metadata cache key of the compose files."""
+    used_variables = {"COMPOSE_PROFILES"}
+    for content in contents:
+        for match in VARIABLE_PATTERN.finditer(content):
+            used_variables.add(match.group(2) or match.group(3))
+
+    key = hashlib.sha256()
+    key.update(json.dumps({
+        "version": METADATA_VERSION,
+        "paths": [os.path.abspath(path) for path in compose_paths],
+        "contents": contents,
+        "variables": {name: variables.get(name) for name in used_variables if name},
+    }, sort_keys=True).encode("utf-8"))
+    return key.hexdigest()
+
+
+def _read(path):
+    """Return the file content."""
+    with io.open(path, "r", encoding="utf-8") as target_file:
+        return target_file.read()
+
+
+def _read_env_file(env_path):
+    """Return the variables defined in a docker compose '.env' file, empty if it doesn't exist."""
+    variables = {}
+    try:
+        lines = _read(env_path).splitlines()
+    except (IOError, OSError):
+        return variables
+
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#") and "=" in line:
+            name, _, value = line.partition("=")
+            variables[name.strip()] = value.strip().strip("'\"")
+
+    return variables
+
+
+def _ephemeral_port(port):
+    """Return the port definition, published on an ephemeral host port.
+
+    Supports both the short syntax ('[[host_ip:]host_port:]container_port[/protocol]')
+    and the long syntax (mapping with target, published, protocol & host_ip).
+    """
+    if isinstance(port, dict):
+        port = dict(port)
+        port.pop("published", None)
+        return port
+
+    spec, _, protocol = str(port).partition("/")
+    parts = spec.rsplit(":", 2)
+    ephemeral = parts[-1] if len(parts) < 3 else "{0}::{1}".format(parts[0], parts[-1])
+    return ephemeral + "/" + protocol if protocol else ephemeral
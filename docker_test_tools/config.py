@@ -9,9 +9,23 @@ class Config(object):
 
     * Docker logs path.
     * Compose project name.
-    * Docker compose file path.
+    * Docker compose file paths (comma separated, later files override earlier ones).
+    * Docker compose profiles to enable (comma separated).
     * Docker compose command [docker-compose | docker compose].
     * Whether or not to keep containers between test runs [True/ False].
+    * Whether or not to run an isolated environment per test worker process [True/ False].
+    * Number of pre-started environments kept by the environment pool.
+    * Whether or not to start the services ordered by their dependencies [True/ False].
+    * Whether or not to write a timeline of the environment setup & teardown [True/ False].
+    * Whether or not to also write the timeline in chrome trace format [True/ False].
+    * Whether or not to stream the containers logs using the docker api [True/ False].
+    * Whether or not to index the services logs for searching [True/ False].
+    * Per service log quota - max log bytes & lines per second, sampling of the lines exceeding them,
+      and the size of the last dropped lines kept per service.
+    * Stats backend [docker | cgroup], and the cgroup stats sampling frequency (per second).
+    * RAM growth (bytes per minute) above which a container is suspected of leaking memory.
+    * Per service resource limits, and the interval (seconds) of evaluating the live stats against them.
+    * Whether to export the live stats in the OpenMetrics format, and the port serving them (0 for not serving them).
 
     The configuration may be set via:
 
@@ -24,18 +38,56 @@ class Config(object):
         [environment]
         log-path = <docker log path>
         project-name = <compose project name>
-        docker-compose-path = <docker compose path>
+        docker-compose-path = <docker compose paths>
+        compose-profiles = <docker compose profiles>
         docker-compose-command = <docker compose command>
         reuse-containers = <True/ False>.
+        isolate-workers = <True/ False>.
+        pool-size = <number of pooled environments>
+        ordered-startup = <True/ False>
+        profile = <True/ False>
+        chrome-trace = <True/ False>
+        stream-logs = <True/ False>
+        index-logs = <True/ False>
+        log-bytes-per-second = <max log bytes per second per service>
+        log-lines-per-second = <max log lines per second per service>
+        log-sample-rate = <write every N-th line exceeding the quota>
+        log-tail-bytes = <size of the last dropped lines kept per service>
+        stats-backend = <docker/ cgroup>
+        stats-frequency = <cgroup stats samples per second>
+        ram-leak-slope = <RAM growth bytes per minute of leak suspects>
+        resource-limits = <service: metric=limit, ...; service: metric=limit, ...>
+        watchdog-interval = <seconds between resource limits evaluations>
+        export-openmetrics = <True/ False>
+        openmetrics-port = <port of the stats OpenMetrics endpoint>
 
     Supported environment variables:
 
         DTT_LOG_PATH = <docker log path>
         DTT_PROJECT_NAME = <compose project name>
-        DTT_COMPOSE_PATH = <docker compose path>
+        DTT_COMPOSE_PATH = <docker compose paths>
+        DTT_COMPOSE_PROFILES = <docker compose profiles>
         DTT_COMPOSE_COMMAND = <docker compose command>
         DTT_REUSE_CONTAINERS = <1/0>.
         DTT_COLLECT_STATS = <1/0>
+        DTT_ISOLATE_WORKERS = <1/0>
+        DTT_POOL_SIZE = <number of pooled environments>
+        DTT_ORDERED_STARTUP = <1/0>
+        DTT_PROFILE = <1/0>
+        DTT_CHROME_TRACE = <1/0>
+        DTT_STREAM_LOGS = <1/0>
+        DTT_INDEX_LOGS = <1/0>
+        DTT_LOG_BYTES_PER_SECOND = <max log bytes per second per service>
+        DTT_LOG_LINES_PER_SECOND = <max log lines per second per service>
+        DTT_LOG_SAMPLE_RATE = <write every N-th line exceeding the quota>
+        DTT_LOG_TAIL_BYTES = <size of the last dropped lines kept per service>
+        DTT_STATS_BACKEND = <docker/ cgroup>
+        DTT_STATS_FREQUENCY = <cgroup stats samples per second>
+        DTT_RAM_LEAK_SLOPE = <RAM growth bytes per minute of leak suspects>
+        DTT_RESOURCE_LIMITS = <service: metric=limit, ...; service: metric=limit, ...>
+        DTT_WATCHDOG_INTERVAL = <seconds between resource limits evaluations>
+        DTT_EXPORT_OPENMETRICS = <1/0>
+        DTT_OPENMETRICS_PORT = <port of the stats OpenMetrics endpoint>
 
     """
     # Expected section name in the configuration file
@@ -48,6 +100,25 @@ class Config(object):
     DOCKER_COMPOSE_PATH_OPTION = 'docker-compose-path'
     DOCKER_COMPOSE_COMMAND_OPTION = 'docker-compose-command'
     COLLECT_STATS_OPTION = 'collect-stats'
+    ISOLATE_WORKERS_OPTION = 'isolate-workers'
+    POOL_SIZE_OPTION = 'pool-size'
+    COMPOSE_PROFILES_OPTION = 'compose-profiles'
+    ORDERED_STARTUP_OPTION = 'ordered-startup'
+    PROFILE_OPTION = 'profile'
+    CHROME_TRACE_OPTION = 'chrome-trace'
+    STREAM_LOGS_OPTION = 'stream-logs'
+    INDEX_LOGS_OPTION = 'index-logs'
+    LOG_BYTES_PER_SECOND_OPTION = 'log-bytes-per-second'
+    LOG_LINES_PER_SECOND_OPTION = 'log-lines-per-second'
+    LOG_SAMPLE_RATE_OPTION = 'log-sample-rate'
+    LOG_TAIL_BYTES_OPTION = 'log-tail-bytes'
+    STATS_BACKEND_OPTION = 'stats-backend'
+    STATS_FREQUENCY_OPTION = 'stats-frequency'
+    RAM_LEAK_SLOPE_OPTION = 'ram-leak-slope'
+    RESOURCE_LIMITS_OPTION = 'resource-limits'
+    WATCHDOG_INTERVAL_OPTION = 'watchdog-interval'
+    EXPORT_OPENMETRICS_OPTION = 'export-openmetrics'
+    OPENMETRICS_PORT_OPTION = 'openmetrics-port'
 
     # Expected options in the configuration file
     LOG_PATH_ENV_VAR = 'DTT_LOG_PATH'
@@ -56,6 +127,25 @@ class Config(object):
     DOCKER_COMPOSE_PATH_ENV_VAR = 'DTT_COMPOSE_PATH'
     DOCKER_COMPOSE_COMMAND_ENV_VAR = 'DTT_COMPOSE_COMMAND'
     COLLECT_STATS_ENV_VAR = 'DTT_COLLECT_STATS'
+    ISOLATE_WORKERS_ENV_VAR = 'DTT_ISOLATE_WORKERS'
+    POOL_SIZE_ENV_VAR = 'DTT_POOL_SIZE'
+    COMPOSE_PROFILES_ENV_VAR = 'DTT_COMPOSE_PROFILES'
+    ORDERED_STARTUP_ENV_VAR = 'DTT_ORDERED_STARTUP'
+    PROFILE_ENV_VAR = 'DTT_PROFILE'
+    CHROME_TRACE_ENV_VAR = 'DTT_CHROME_TRACE'
+    STREAM_LOGS_ENV_VAR = 'DTT_STREAM_LOGS'
+    INDEX_LOGS_ENV_VAR = 'DTT_INDEX_LOGS'
+    LOG_BYTES_PER_SECOND_ENV_VAR = 'DTT_LOG_BYTES_PER_SECOND'
+    LOG_LINES_PER_SECOND_ENV_VAR = 'DTT_LOG_LINES_PER_SECOND'
+    LOG_SAMPLE_RATE_ENV_VAR = 'DTT_LOG_SAMPLE_RATE'
+    LOG_TAIL_BYTES_ENV_VAR = 'DTT_LOG_TAIL_BYTES'
+    STATS_BACKEND_ENV_VAR = 'DTT_STATS_BACKEND'
+    STATS_FREQUENCY_ENV_VAR = 'DTT_STATS_FREQUENCY'
+    RAM_LEAK_SLOPE_ENV_VAR = 'DTT_RAM_LEAK_SLOPE'
+    RESOURCE_LIMITS_ENV_VAR = 'DTT_RESOURCE_LIMITS'
+    WATCHDOG_INTERVAL_ENV_VAR = 'DTT_WATCHDOG_INTERVAL'
+    EXPORT_OPENMETRICS_ENV_VAR = 'DTT_EXPORT_OPENMETRICS'
+    OPENMETRICS_PORT_ENV_VAR = 'DTT_OPENMETRICS_PORT'
 
     # Configuration default values
     DEFAULT_LOG_PATH = 'docker-tests.log'
@@ -64,6 +154,25 @@ class Config(object):
     DEFAULT_DOCKER_COMPOSE_PATH = 'docker-compose.yml'
     DEFAULT_DOCKER_COMPOSE_COMMAND = 'docker compose'
     DEFAULT_COLLECT_STATS = False
+    DEFAULT_ISOLATE_WORKERS = False
+    DEFAULT_POOL_SIZE = 1
+    DEFAULT_COMPOSE_PROFILES = ''
+    DEFAULT_ORDERED_STARTUP = False
+    DEFAULT_PROFILE = False
+    DEFAULT_CHROME_TRACE = False
+    DEFAULT_STREAM_LOGS = False
+    DEFAULT_INDEX_LOGS = False
+    DEFAULT_LOG_BYTES_PER_SECOND = 0
+    DEFAULT_LOG_LINES_PER_SECOND = 0
+    DEFAULT_LOG_SAMPLE_RATE = 0
+    DEFAULT_LOG_TAIL_BYTES = 0
+    DEFAULT_STATS_BACKEND = 'docker'
+    DEFAULT_STATS_FREQUENCY = 10
+    DEFAULT_RAM_LEAK_SLOPE = 1024 * 1024
+    DEFAULT_RESOURCE_LIMITS = ''
+    DEFAULT_WATCHDOG_INTERVAL = 1.0
+    DEFAULT_EXPORT_OPENMETRICS = False
+    DEFAULT_OPENMETRICS_PORT = 0
 
     def __init__(self,
                  config_path=None,
@@ -72,7 +181,26 @@ class Config(object):
                  collect_stats=DEFAULT_COLLECT_STATS,
                  reuse_containers=DEFAULT_REUSE_CONTAINERS,
                  docker_compose_path=DEFAULT_DOCKER_COMPOSE_PATH,
-                 docker_compose_command=DEFAULT_DOCKER_COMPOSE_COMMAND):
+                 docker_compose_command=DEFAULT_DOCKER_COMPOSE_COMMAND,
+                 isolate_workers=DEFAULT_ISOLATE_WORKERS,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 ordered_startup=DEFAULT_ORDERED_STARTUP,
+                 profile=DEFAULT_PROFILE,
+                 chrome_trace=DEFAULT_CHROME_TRACE,
+                 compose_profiles=DEFAULT_COMPOSE_PROFILES,
+                 stream_logs=DEFAULT_STREAM_LOGS,
+                 index_logs=DEFAULT_INDEX_LOGS,
+                 log_bytes_per_second=DEFAULT_LOG_BYTES_PER_SECOND,
+                 log_lines_per_second=DEFAULT_LOG_LINES_PER_SECOND,
+                 log_sample_rate=DEFAULT_LOG_SAMPLE_RATE,
+                 log_tail_bytes=DEFAULT_LOG_TAIL_BYTES,
+                 stats_backend=DEFAULT_STATS_BACKEND,
+                 stats_frequency=DEFAULT_STATS_FREQUENCY,
+                 ram_leak_slope=DEFAULT_RAM_LEAK_SLOPE,
+                 resource_limits=DEFAULT_RESOURCE_LIMITS,
+                 watchdog_interval=DEFAULT_WATCHDOG_INTERVAL,
+                 export_openmetrics=DEFAULT_EXPORT_OPENMETRICS,
+                 openmetrics_port=DEFAULT_OPENMETRICS_PORT):
 
         # Set default values
         self.log_path = log_path
@@ -81,6 +209,25 @@ class Config(object):
         self.reuse_containers = reuse_containers
         self.docker_compose_path = docker_compose_path
         self.docker_compose_command = docker_compose_command
+        self.isolate_workers = isolate_workers
+        self.pool_size = pool_size
+        self.ordered_startup = ordered_startup
+        self.profile = profile
+        self.chrome_trace = chrome_trace
+        self.compose_profiles = compose_profiles
+        self.stream_logs = stream_logs
+        self.index_logs = index_logs
+        self.log_bytes_per_second = log_bytes_per_second
+        self.log_lines_per_second = log_lines_per_second
+        self.log_sample_rate = log_sample_rate
+        self.log_tail_bytes = log_tail_bytes
+        self.stats_backend = stats_backend
+        self.stats_frequency = stats_frequency
+        self.ram_leak_slope = ram_leak_slope
+        self.resource_limits = resource_limits
+        self.watchdog_interval = watchdog_interval
+        self.export_openmetrics = export_openmetrics
+        self.openmetrics_port = openmetrics_port
 
         # Update the config values based on the config file (overrides constructor configurations)
         if config_path:
@@ -97,6 +244,37 @@ class Config(object):
         self.reuse_containers = os.environ.get(self.REUSE_CONTAINERS_ENV_VAR, self.reuse_containers)
         self.docker_compose_path = os.environ.get(self.DOCKER_COMPOSE_PATH_ENV_VAR, self.docker_compose_path)
         self.docker_compose_command = os.environ.get(self.DOCKER_COMPOSE_COMMAND_ENV_VAR, self.docker_compose_command)
+        self.isolate_workers = self.get_env_flag(self.ISOLATE_WORKERS_ENV_VAR, self.isolate_workers)
+        self.pool_size = int(os.environ.get(self.POOL_SIZE_ENV_VAR, self.pool_size))
+        self.ordered_startup = self.get_env_flag(self.ORDERED_STARTUP_ENV_VAR, self.ordered_startup)
+        self.profile = self.get_env_flag(self.PROFILE_ENV_VAR, self.profile)
+        self.chrome_trace = self.get_env_flag(self.CHROME_TRACE_ENV_VAR, self.chrome_trace)
+        self.compose_profiles = os.environ.get(self.COMPOSE_PROFILES_ENV_VAR, self.compose_profiles)
+        self.stream_logs = self.get_env_flag(self.STREAM_LOGS_ENV_VAR, self.stream_logs)
+        self.index_logs = self.get_env_flag(self.INDEX_LOGS_ENV_VAR, self.index_logs)
+        self.log_bytes_per_second = int(os.environ.get(self.LOG_BYTES_PER_SECOND_ENV_VAR, self.log_bytes_per_second))
+        self.log_lines_per_second = int(os.environ.get(self.LOG_LINES_PER_SECOND_ENV_VAR, self.log_lines_per_second))
+        self.log_sample_rate = int(os.environ.get(self.LOG_SAMPLE_RATE_ENV_VAR, self.log_sample_rate))
+        self.log_tail_bytes = int(os.environ.get(self.LOG_TAIL_BYTES_ENV_VAR, self.log_tail_bytes))
+        self.stats_backend = os.environ.get(self.STATS_BACKEND_ENV_VAR, self.stats_backend)
+        self.stats_frequency = int(os.environ.get(self.STATS_FREQUENCY_ENV_VAR, self.stats_frequency))
+        self.ram_leak_slope = int(os.environ.get(self.RAM_LEAK_SLOPE_ENV_VAR, self.ram_leak_slope))
+        self.resource_limits = os.environ.get(self.RESOURCE_LIMITS_ENV_VAR, self.resource_limits)
+        self.watchdog_interval = float(os.environ.get(self.WATCHDOG_INTERVAL_ENV_VAR, self.watchdog_interval))
+        self.export_openmetrics = self.get_env_flag(self.EXPORT_OPENMETRICS_ENV_VAR, self.export_openmetrics)
+        self.openmetrics_port = int(os.environ.get(self.OPENMETRICS_PORT_ENV_VAR, self.openmetrics_port))
+
+    @staticmethod
+    def get_env_flag(env_var, default):
+        """Return the boolean value of a flag env variable, the default if it's not set.
+
+        Empty values, '0', 'false', 'no' and 'off' (case insensitive) are false, other values are true.
+        """
+        value = os.environ.get(env_var)
+        if value is None:
+            return default
+
+        return str(value).strip().lower() not in ('', '0', 'false', 'no', 'off')
 
     def get_file_config(self, config_path):
         """Update the config values based on the config file."""
@@ -124,3 +302,60 @@ class Config(object):
 
         if self.DOCKER_COMPOSE_COMMAND_OPTION in read_options:
             self.docker_compose_command = config_reader.get(self.SECTION_NAME, self.DOCKER_COMPOSE_COMMAND_OPTION)
+
+        if self.ISOLATE_WORKERS_OPTION in read_options:
+            self.isolate_workers = config_reader.getboolean(self.SECTION_NAME, self.ISOLATE_WORKERS_OPTION)
+
+        if self.POOL_SIZE_OPTION in read_options:
+            self.pool_size = config_reader.getint(self.SECTION_NAME, self.POOL_SIZE_OPTION)
+
+        if self.ORDERED_STARTUP_OPTION in read_options:
+            self.ordered_startup = config_reader.getboolean(self.SECTION_NAME, self.ORDERED_STARTUP_OPTION)
+
+        if self.PROFILE_OPTION in read_options:
+            self.profile = config_reader.getboolean(self.SECTION_NAME, self.PROFILE_OPTION)
+
+        if self.CHROME_TRACE_OPTION in read_options:
+            self.chrome_trace = config_reader.getboolean(self.SECTION_NAME, self.CHROME_TRACE_OPTION)
+
+        if self.COMPOSE_PROFILES_OPTION in read_options:
+            self.compose_profiles = config_reader.get(self.SECTION_NAME, self.COMPOSE_PROFILES_OPTION)
+
+        if self.STREAM_LOGS_OPTION in read_options:
+            self.stream_logs = config_reader.getboolean(self.SECTION_NAME, self.STREAM_LOGS_OPTION)
+
+        if self.INDEX_LOGS_OPTION in read_options:
+            self.index_logs = config_reader.getboolean(self.SECTION_NAME, self.INDEX_LOGS_OPTION)
+
+        if self.LOG_BYTES_PER_SECOND_OPTION in read_options:
+            self.log_bytes_per_second = config_reader.getint(self.SECTION_NAME, self.LOG_BYTES_PER_SECOND_OPTION)
+
+        if self.LOG_LINES_PER_SECOND_OPTION in read_options:
+            self.log_lines_per_second = config_reader.getint(self.SECTION_NAME, self.LOG_LINES_PER_SECOND_OPTION)
+
+        if self.LOG_SAMPLE_RATE_OPTION in read_options:
+            self.log_sample_rate = config_reader.getint(self.SECTION_NAME, self.LOG_SAMPLE_RATE_OPTION)
+
+        if self.LOG_TAIL_BYTES_OPTION in read_options:
+            self.log_tail_bytes = config_reader.getint(self.SECTION_NAME, self.LOG_TAIL_BYTES_OPTION)
+
+        if self.STATS_BACKEND_OPTION in read_options:
+            self.stats_backend = config_reader.get(self.SECTION_NAME, self.STATS_BACKEND_OPTION)
+
+        if self.STATS_FREQUENCY_OPTION in read_options:
+            self.stats_frequency = config_reader.getint(self.SECTION_NAME, self.STATS_FREQUENCY_OPTION)
+
+        if self.RAM_LEAK_SLOPE_OPTION in read_options:
+            self.ram_leak_slope = config_reader.getint(self.SECTION_NAME, self.RAM_LEAK_SLOPE_OPTION)
+
+        if self.RESOURCE_LIMITS_OPTION in read_options:
+            self.resource_limits = config_reader.get(self.SECTION_NAME, self.RESOURCE_LIMITS_OPTION)
+
+        if self.WATCHDOG_INTERVAL_OPTION in read_options:
+            self.watchdog_interval = config_reader.getfloat(self.SECTION_NAME, self.WATCHDOG_INTERVAL_OPTION)
+
+        if self.EXPORT_OPENMETRICS_OPTION in read_options:
+            self.export_openmetrics = config_reader.getboolean(self.SECTION_NAME, self.EXPORT_OPENMETRICS_OPTION)
+
+        if self.OPENMETRICS_PORT_OPTION in read_options:
+            self.openmetrics_port = config_reader.getint(self.SECTION_NAME, self.OPENMETRICS_PORT_OPTION)
@@ -1,20 +1,31 @@
 import logging
 import os
+import time
+from collections import defaultdict
 from contextlib import contextmanager
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
-import docker
+import six
 import waiting
 
+from docker_test_tools import api_version
+from docker_test_tools import archive
+from docker_test_tools import compose_file
 from docker_test_tools import config
+from docker_test_tools import execution
 from docker_test_tools import logs
-from docker_test_tools import stats
+from docker_test_tools import profiler
+from docker_test_tools import startup
 from docker_test_tools import utils
-from docker_test_tools.api_version import get_server_api_version
 from docker_test_tools.compose import Compose
+from docker_test_tools.log_quota import LogQuota
+from docker_test_tools.metrics import Metrics, timed
 
 log = logging.getLogger(__name__)
 
+SNAPSHOT_REPOSITORY = "dtt-snapshot"
+
 
 class EnvironmentController(object):
     """Utility for managing environment operations."""
@@ -27,64 +38,296 @@ class EnvironmentController(object):
         log_path,
         collect_stats=False,
         reuse_containers=False,
+        shared=False,
+        ephemeral_ports=False,
+        ordered_startup=False,
+        profile=False,
+        chrome_trace=False,
+        metrics=None,
+        profiles=None,
+        stream_logs=False,
+        ready_log_patterns=None,
+        index_logs=False,
+        log_quota=None,
+        stats_backend="docker",
+        stats_frequency=10,
+        ram_leak_slope=1024 * 1024,
+        resource_limits=None,
+        watchdog_interval=1,
+        export_openmetrics=False,
+        openmetrics_port=0,
     ):
         self.log_path = log_path
         self.compose_path = compose_path
+        self.compose_paths = utils.to_list(compose_path)
+        self.profiles = utils.to_list(profiles)
+        self.compose_command = compose_command
         self.project_name = project_name
+        self.collect_stats = collect_stats
         self.reuse_containers = reuse_containers
-
-        self.docker_client = docker.client.APIClient()
-        self.environment_variables = self._get_environment_variables()
-        self.compose = Compose(
-            compose_path=compose_path,
-            project_name=project_name,
+        self.shared = shared
+        self.ephemeral_ports = ephemeral_ports
+        self.ordered_startup = ordered_startup
+        self.startup_report = None
+        self.recovery_times = defaultdict(list)
+        self.snapshots = {}
+        self.restore_times = defaultdict(list)
+        self.work_dir = os.path.dirname(self.log_path)
+        self.encoding = os.environ.get("PYTHONIOENCODING", "utf-8")
+        self.chrome_trace = chrome_trace
+        self.stream_logs = stream_logs
+        self.index_logs = index_logs
+        self.log_quota = log_quota
+        self.stats_backend = stats_backend
+        self.stats_frequency = stats_frequency
+        self.ram_leak_slope = ram_leak_slope
+        self.resource_limits = resource_limits
+        self.watchdog_interval = watchdog_interval
+        self.export_openmetrics = export_openmetrics
+        self.openmetrics_port = openmetrics_port
+        self.ready_log_patterns = dict(ready_log_patterns or {})
+        self._ready_log_waiters = {}
+        self.metrics = metrics if metrics else Metrics()
+        self.profiler = profiler.Profiler(enabled=bool(profile or chrome_trace))
+        self.required_services = None
+        self.started_services = set()
+        self._up_start = None
+        self._readiness_pending = set()
+
+    # The docker client, compose and plugins are created on first use, so creating a controller is cheap
+    @utils.lazy_property
+    def docker_client(self):
+        """Docker api client of the DOCKER_HOST daemon."""
+        return api_version.create_client()
+
+    @utils.lazy_property
+    def environment_variables(self):
+        """Environment variables of the docker compose commands."""
+        return self._get_environment_variables()
+
+    @utils.lazy_property
+    def compose(self):
+        """Docker compose of the environment."""
+        compose_paths = self.compose_paths
+        project_directory = None
+        if self.ephemeral_ports:
+            project_directory = os.path.dirname(os.path.abspath(compose_paths[0]))
+            compose_paths = [
+                self._write_ephemeral_ports_compose_file(compose_path, index)
+                for index, compose_path in enumerate(compose_paths)
+            ]
+
+        return Compose(
+            compose_path=compose_paths,
+            project_name=self.project_name,
             environment_variables=self.environment_variables,
-            command=compose_command,
+            command=self.compose_command,
+            project_directory=project_directory,
+            profiler=self.profiler,
+            profiles=self.profiles,
         )
 
-        self.services = self.get_services()
-        self.encoding = self.environment_variables.get("PYTHONIOENCODING", "utf-8")
-        self.work_dir = os.path.dirname(self.log_path)
-        self.logs_collector = logs.LogCollector(
-            log_path=log_path,
+    @utils.lazy_property
+    def services(self):
+        """The environment service names."""
+        return self.get_services()
+
+    @utils.lazy_property
+    def services_metadata(self):
+        """The services metadata parsed in-process from the compose files, None if they can't be parsed.
+
+        See `compose_file.get_metadata` for the metadata content.
+        """
+        if not self.compose_paths:
+            return None
+
+        environment = dict(os.environ, COMPOSE_PROFILES=",".join(self.profiles)) if self.profiles else None
+        return compose_file.get_metadata(self.compose_paths, environment=environment)
+
+    @utils.lazy_property
+    def logs_collector(self):
+        """Collector of the environment containers logs - streamed using the docker api, or docker compose."""
+        if self.stream_logs:
+            return logs.StreamingLogCollector(
+                log_path=self.log_path,
+                encoding=self.encoding,
+                docker_client=self.docker_client,
+                project_name=self.project_name,
+                shared=self.shared,
+                index_logs=self.index_logs,
+                quota=self.log_quota,
+            )
+
+        return logs.LogCollector(
+            log_path=self.log_path,
             encoding=self.encoding,
             compose=self.compose,
+            shared=self.shared,
+            index_logs=self.index_logs,
+            quota=self.log_quota,
         )
 
-        self.plugins = []
-        self.plugins.append(self.logs_collector)
+    @utils.lazy_property
+    def log_tailer(self):
+        """Incremental reader of the combined log, shared by the log waiters."""
+        return logs.LogTailer(log_path=self.log_path, encoding=self.encoding, project_name=self.project_name)
+
+    @utils.lazy_property
+    def plugins(self):
+        """The environment plugins - logs collector, and stats collector if enabled."""
+        plugins = [self.logs_collector]
+        if self.collect_stats and self.stats_backend == "cgroup":
+            from docker_test_tools import cgroup_stats
+
+            plugins.append(
+                cgroup_stats.CgroupStatsCollector(
+                    encoding=self.encoding,
+                    project=self.project_name,
+                    target_dir_path=self.work_dir,
+                    environment_variables=self.environment_variables,
+                    docker_client=self.docker_client,
+                    shared=self.shared,
+                    leak_slope=self.ram_leak_slope,
+                    frequency=self.stats_frequency,
+                )
+            )
+
+        elif self.collect_stats:
+            from docker_test_tools import stats
 
-        if collect_stats:
-            self.plugins.append(
+            plugins.append(
                 stats.StatsCollector(
                     encoding=self.encoding,
                     project=self.project_name,
                     target_dir_path=self.work_dir,
                     environment_variables=self.environment_variables,
+                    shared=self.shared,
+                    leak_slope=self.ram_leak_slope,
                 )
             )
 
+        if self.resource_watchdog:
+            plugins.append(self.resource_watchdog)
+
+        if self.stats_exporter:
+            plugins.append(self.stats_exporter)
+
+        return plugins
+
+    @utils.lazy_property
+    def resource_watchdog(self):
+        """Watchdog of the services resource limits over the live stats, None unless stats are collected."""
+        if not self.resource_limits:
+            return None
+
+        if not self.collect_stats:
+            log.warning("Resource limits are not evaluated, since stats are not collected (see collect-stats)")
+            return None
+
+        from docker_test_tools import stats, watchdog
+
+        return watchdog.ResourceWatchdog(
+            stats_file_path=stats.get_stats_file_path(self.work_dir),
+            limits=self.resource_limits,
+            project_name=self.project_name,
+            interval=self.watchdog_interval,
+        )
+
+    @utils.lazy_property
+    def stats_exporter(self):
+        """OpenMetrics exporter of the live stats, None unless stats are collected.
+
+        Environments with ephemeral ports (e.g. isolated workers and pooled environments) are set up side by side,
+        so they serve their stats on any free port instead of the configured one - logging the served url.
+        """
+        if not self.export_openmetrics and not self.openmetrics_port:
+            return None
+
+        if not self.collect_stats:
+            log.warning("Stats are not exported to OpenMetrics, since they are not collected (see collect-stats)")
+            return None
+
+        from docker_test_tools import openmetrics, stats
+
+        return openmetrics.OpenMetricsExporter(
+            stats_file_path=stats.get_stats_file_path(self.work_dir),
+            metrics_file_path=openmetrics.get_metrics_file_path(self.work_dir) if self.export_openmetrics else None,
+            port=(0 if self.ephemeral_ports else self.openmetrics_port) if self.openmetrics_port else None,
+            project_name=self.project_name,
+        )
+
     @classmethod
     def from_file(cls, config_path):
         """Return an environment controller based on the given config.
 
         :return EnvironmentController: controller based on the given config
         """
-        config_object = config.Config(config_path=config_path)
-        return cls(
+        return cls.from_config(config.Config(config_path=config_path))
+
+    @classmethod
+    def from_config(cls, config_object, **kwargs):
+        """Return an environment controller based on the given config object.
+
+        :param Config config_object: the environment configuration.
+        :param kwargs: controller arguments overriding the configuration values.
+        :return EnvironmentController: controller based on the given config
+        """
+        controller_kwargs = dict(
             log_path=config_object.log_path,
             project_name=config_object.project_name,
             collect_stats=config_object.collect_stats,
             compose_path=config_object.docker_compose_path,
+            profiles=config_object.compose_profiles,
             compose_command=config_object.docker_compose_command,
             reuse_containers=config_object.reuse_containers,
+            ordered_startup=config_object.ordered_startup,
+            profile=config_object.profile,
+            chrome_trace=config_object.chrome_trace,
+            stream_logs=config_object.stream_logs,
+            index_logs=config_object.index_logs,
+            log_quota=LogQuota(
+                bytes_per_second=config_object.log_bytes_per_second,
+                lines_per_second=config_object.log_lines_per_second,
+                sample_rate=config_object.log_sample_rate,
+                tail_bytes=config_object.log_tail_bytes,
+            ),
+            stats_backend=config_object.stats_backend,
+            stats_frequency=config_object.stats_frequency,
+            ram_leak_slope=config_object.ram_leak_slope,
+            resource_limits=config_object.resource_limits,
+            watchdog_interval=config_object.watchdog_interval,
+            export_openmetrics=config_object.export_openmetrics,
+            openmetrics_port=config_object.openmetrics_port,
         )
+        controller_kwargs.update(kwargs)
+        return cls(**controller_kwargs)
+
+    def _write_ephemeral_ports_compose_file(self, compose_path, index=0):
+        """Write a copy of the compose file publishing the services ports on ephemeral host ports.
+
+        :param str compose_path: the original docker compose file path.
+        :param int index: the compose file index, in case of multiple compose files.
+        :return str: the written docker compose file path.
+        """
+        if self.work_dir and not os.path.exists(self.work_dir):
+            os.makedirs(self.work_dir)
+
+        file_name = "{0}.docker-compose.yml" if not index else "{0}.{1}.docker-compose.yml"
+        target_path = os.path.join(self.work_dir, file_name.format(self.project_name, index))
+        log.debug("Writing %s with ephemeral host ports into %s", compose_path, target_path)
+        compose_file.dump(compose_file.with_ephemeral_ports(compose_file.load(compose_path)), target_path)
+        return target_path
 
     def get_services(self):
         """Get the services info based on the compose file.
 
+        The compose file is parsed in-process if possible, docker compose is used otherwise.
+
         :return list: service names.
         """
+        if self.services_metadata is not None:
+            return self.services_metadata["services"]
+
         log.debug(
             "Getting environment services, using docker compose: %s", self.compose_path
         )
@@ -98,14 +341,16 @@ class EnvironmentController(object):
         """
         try:
             log.debug("Setting up the environment")
-            self.cleanup()
-            self.up()
+            with self.profiler.span("setup", category="environment"):
+                self.cleanup()
+                self.up()
 
-            for plugin in self.plugins:
-                try:
-                    plugin.start()
-                except:
-                    logging.warning("Failed starting Plugin %s, skipping", plugin)
+                for plugin in self.plugins:
+                    try:
+                        with self.profiler.span("start " + type(plugin).__name__, category="plugin"):
+                            plugin.start()
+                    except:
+                        logging.warning("Failed starting Plugin %s, skipping", plugin)
 
         except:
             log.exception("Setup failure, tearing down the test environment")
@@ -119,13 +364,79 @@ class EnvironmentController(object):
         """
         log.debug("Tearing down the environment")
         try:
-            for plugin in self.plugins:
+            with self.profiler.span("teardown", category="environment"):
                 try:
-                    plugin.stop()
-                except:
-                    logging.warning("Failed stopping Plugin %s, skipping", plugin)
+                    for plugin in self.plugins:
+                        try:
+                            with self.profiler.span("stop " + type(plugin).__name__, category="plugin"):
+                                plugin.stop()
+                        except:
+                            logging.warning("Failed stopping Plugin %s, skipping", plugin)
+                finally:
+                    self.cleanup()
+                    self.remove_snapshots()
         finally:
-            self.cleanup()
+            self.write_profile()
+
+    def write_profile(self):
+        """Write the profiling timeline to the work dir, if profiling is enabled.
+
+        The timeline is written to '<project>.profile.json', and in chrome trace format
+        to '<project>.trace.json' if `chrome_trace` is enabled.
+        """
+        if not self.profiler.enabled:
+            return
+
+        try:
+            self.profiler.write_timeline(os.path.join(self.work_dir, "{0}.profile.json".format(self.project_name)))
+            if self.chrome_trace:
+                self.profiler.write_chrome_trace(
+                    os.path.join(self.work_dir, "{0}.trace.json".format(self.project_name))
+                )
+        except:
+            log.exception("Failed writing the environment profile")
+
+    def attach(self):
+        """Attach to an environment set up by another process.
+
+        The environment is used as is, the plugins are attached to the data collected by the process
+        which set the environment up so that `update_plugins` messages are written to it.
+        Requires the controller to be created with `shared=True` in all processes.
+        """
+        log.debug("Attaching to the environment")
+        self.started_services = set(self.active_services)
+        for plugin in self.plugins:
+            try:
+                plugin.attach()
+            except:
+                logging.warning("Failed attaching Plugin %s, skipping", plugin)
+
+    def detach(self):
+        """Detach from an environment set up by another process, leaving it running."""
+        log.debug("Detaching from the environment")
+        for plugin in self.plugins:
+            try:
+                plugin.detach()
+            except:
+                logging.warning("Failed detaching Plugin %s, skipping", plugin)
+
+    def set_log_path(self, log_path):
+        """Collect the environment logs (and the rest of the work dir data) into another path from the next setup.
+
+        The plugins, which collect into the work dir, are created again - and the ready log waiters are dropped,
+        so readiness is checked against the new logs. Must be called while the environment is torn down.
+
+        :param str log_path: the environment combined log path.
+        """
+        self.log_path = log_path
+        self.work_dir = os.path.dirname(log_path)
+        if self.work_dir and not os.path.exists(self.work_dir):
+            os.makedirs(self.work_dir)
+
+        for name in ("logs_collector", "log_tailer", "plugins", "resource_watchdog", "stats_exporter"):
+            self.__dict__.pop(name, None)
+
+        self._ready_log_waiters = {}
 
     def cleanup(self):
         """Cleanup the environment.
@@ -139,9 +450,42 @@ class EnvironmentController(object):
         self.down()
 
     def up(self):
-        """Run environment containers."""
+        """Run environment containers.
+
+        When ordered startup is enabled, the services are started ordered by their dependencies
+        and the startup timing breakdown is kept in `startup_report`.
+
+        When profiling is enabled, each service readiness is recorded as the time from `up` until the
+        service is first found ready - by the ordered startup, or else by the services checks.
+
+        When required services are set (see `set_required_services`), only these services are started.
+        """
         log.debug("Setting environment up, using docker compose: %s", self.compose_path)
-        self.compose.up()
+        self._up_start = time.time()
+        if not self.ordered_startup:
+            # Services readiness is recorded once they are first found ready (see `is_container_ready`)
+            self._readiness_pending = set(self.active_services) if self.profiler.enabled else set()
+            self.compose.up(services=self.required_services)
+            self.started_services = set(self.active_services)
+            return
+
+        dependencies = self.get_dependencies()
+        self.startup_report = startup.StartupScheduler(
+            compose=self.compose,
+            docker_client=self.docker_client,
+            project_name=self.project_name,
+            dependencies={
+                service: [dependency for dependency in dependencies.get(service, []) if dependency in self.services]
+                for service in self.active_services
+            },
+            is_ready=self.is_container_ready,
+        ).run()
+        self.started_services = set(self.active_services)
+
+        for service, timing in self.startup_report["services"].items():
+            self.profiler.add_span("ready " + service, category="readiness",
+                                   start=self._up_start + timing["waited"], end=self._up_start + timing["ready"],
+                                   service=service)
 
     def down(self):
         """Stop and remove environment containers."""
@@ -149,7 +493,83 @@ class EnvironmentController(object):
             "Taking environment down, using docker compose: %s", self.compose_path
         )
         self.compose.down()
+        self.started_services = set()
+
+    def get_dependencies(self):
+        """Return the services dependencies, as defined by their 'depends_on' option.
+
+        :return dict: service name to the list of service names it depends on.
+        """
+        if self.services_metadata is not None:
+            return self.services_metadata["depends_on"]
+
+        dependencies = defaultdict(list)
+        for compose_path in self.compose_paths or [config.Config.DEFAULT_DOCKER_COMPOSE_PATH]:
+            for service, service_dependencies in compose_file.get_dependencies(compose_file.load(compose_path)).items():
+                dependencies[service].extend(service_dependencies)
+
+        return dependencies
+
+    def resolve_services(self, services):
+        """Return the given services along with the services they (transitively) depend on.
+
+        :param list services: service names as they appear in the docker compose file.
+        :return list: the sorted service names.
+        :raise RuntimeError: if a service is not defined by the docker compose file.
+        """
+        dependencies = self.get_dependencies()
+        resolved = set()
+        pending = list(services)
+        while pending:
+            service = pending.pop()
+            if service in resolved:
+                continue
+
+            if service not in self.services:
+                raise RuntimeError("Service %s is not defined by the environment" % service)
+
+            resolved.add(service)
+            pending.extend(dependencies.get(service, []))
+
+        return sorted(resolved)
+
+    def set_required_services(self, services):
+        """Set the services started by `up`, along with the services they depend on.
+
+        Services required later on may be started using `ensure_services`.
+
+        :param list services: service names, or None for starting all the services.
+        """
+        self.required_services = self.resolve_services(services) if services is not None else None
+        log.debug("Required environment services: %s", self.required_services or "all")
+
+    @property
+    def active_services(self):
+        """The services started by `up` - the required services if set, all the services otherwise."""
+        return self.required_services if self.required_services is not None else self.services
+
+    def ensure_services(self, services=None):
+        """Start the given services and the services they depend on, if they weren't started yet.
+
+        Relevant only when the environment was started with a subset of the services (see `set_required_services`).
+
+        :param list services: service names, or None for all the services.
+        :return list: the services which were started.
+        """
+        if self.required_services is None:
+            return []
+
+        services = self.resolve_services(services) if services else self.services
+        missing = [service for service in services if service not in self.started_services]
+        if missing:
+            log.info("Starting additional environment services: %s", missing)
+            self.compose.up(services=missing)
+            self.started_services.update(missing)
+            self.required_services = sorted(set(self.required_services) | set(missing))
 
+        return missing
+
+    @timed("kill_container")
     def kill_container(self, name):
         """Kill the container.
 
@@ -168,6 +588,7 @@ class EnvironmentController(object):
         container_id = self.get_container_id(name=name)
         self.docker_client.restart(container_id)
 
+    @timed("pause_container")
     def pause_container(self, name):
         """Pause the container.
 
@@ -204,6 +625,7 @@ class EnvironmentController(object):
         container_id = self.get_container_id(name=name)
         self.docker_client.start(container_id)
 
+    @timed("inspect_container")
     def inspect_container(self, name):
         """Returns the inspect content of a container
 
@@ -217,7 +639,8 @@ class EnvironmentController(object):
         """Return True if the container is in ready state.
 
         If a health check is defined, a healthy container will be considered as ready.
-        If no health check is defined, a running container will be considered as ready.
+        If no health check is defined, a running container will be considered as ready - once it logged
+        its ready log pattern, if one is defined (see `ready_log_patterns`).
 
         :param str name: container name as it appears in the docker compose file.
         """
@@ -230,10 +653,90 @@ class EnvironmentController(object):
             is_ready = status_output["Health"]["Status"] == "healthy"
         else:
             is_ready = status_output["Status"] == "running"
+            if is_ready and name in self.ready_log_patterns:
+                is_ready = self._is_ready_log_written(name)
 
         log.debug("Container %s ready: %s", name, is_ready)
+        if is_ready and self._readiness_pending:
+            self._record_readiness(name)
+
         return is_ready
 
+    def _is_ready_log_written(self, name):
+        """Return True if the service has logged its ready log pattern."""
+        waiter = self._ready_log_waiters.get(name)
+        if waiter is None:
+            waiter = self._ready_log_waiters[name] = self.log_tailer.watch(name, self.ready_log_patterns[name])
+
+        self.log_tailer.poll()
+        return waiter.event.is_set()
+
+    def _reset_ready_log(self, name):
+        """Require the service to log its ready log pattern again, e.g. before it's restarted."""
+        waiter = self._ready_log_waiters.pop(name, None)
+        if waiter is not None:
+            self.log_tailer.unwatch(waiter)
+            self._ready_log_waiters[name] = self.log_tailer.watch(
+                name, self.ready_log_patterns[name], since=self.log_tailer.get_marker()
+            )
+
+    def get_log_marker(self):
+        """Return a marker of the current position of the environment logs, to be used by `wait_for_log`."""
+        return self.log_tailer.get_marker()
+
+    @timed("wait_for_log")
+    def wait_for_log(self, name, pattern, timeout=60, since=None, interval=logs.LogTailer.POLL_INTERVAL):
+        """Wait for the service to write a log line matching the pattern, return the matching log message.
+
+        Only the log lines written since the previous read are scanned - the log is read once and shared by all
+        the concurrent waiters.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param pattern: regular expression (string or compiled) searched in the service log lines.
+        :param int timeout: timeout (in seconds) for the log line to be written.
+        :param int since: log marker (see `get_log_marker`) to search from, the logs start if not given.
+        :param float interval: interval (in seconds) between log reads.
+        :raise TimeoutExpired: if no matching log line was written within the timeout.
+
+        Usage:
+
+        >>> marker = controller.get_log_marker()
+        >>> # trigger the service
+        >>> controller.wait_for_log('consul', 'Synced node info', timeout=10, since=marker)
+        """
+        log.debug("Waiting for %s to log %s", name, pattern)
+        message = self.log_tailer.wait(self.log_tailer.watch(name, pattern, since=since),
+                                       timeout=timeout, interval=interval)
+        if message is None:
+            raise waiting.TimeoutExpired(timeout, "{0} log line matching {1}".format(name, pattern))
+
+        return message
+
+    def _record_readiness(self, name):
+        """Record the time it took the service to become ready since the environment was started."""
+        try:
+            self._readiness_pending.remove(name)
+        except KeyError:
+            return
+
+        self.profiler.add_span("ready " + name, category="readiness", start=self._up_start, end=time.time(),
+                               service=name)
+
+    def get_host_port(self, name, container_port, protocol="tcp"):
+        """Return the host port a container port is published on.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param int container_port: the port exposed by the container.
+        :param str protocol: the port protocol (tcp/ udp).
+        :return int: the host port.
+        """
+        ports = self.inspect_container(name)["NetworkSettings"]["Ports"] or {}
+        bindings = ports.get("{0}/{1}".format(container_port, protocol))
+        if not bindings:
+            raise RuntimeError("Port %s/%s of container %s is not published" % (container_port, protocol, name))
+
+        return int(bindings[0]["HostPort"])
+
     def container_status(self, name):
         """Returns container status
 
@@ -246,8 +749,9 @@ class EnvironmentController(object):
 
         If the service compose configuration contains an health check, the method will wait for a 'healthy' state.
         If it doesn't the method will wait for a 'running' state.
+        By default, waits for the started services (see `active_services`).
         """
-        services = services if services else self.services
+        services = services if services else self.active_services
         log.info("Waiting for %s to reach the required state", services)
         checks_callbacks = [partial(self.is_container_ready, name) for name in services]
         return utils.run_health_checks(
@@ -259,7 +763,10 @@ class EnvironmentController(object):
         """Container down context manager.
 
         Simulate container down scenario by killing the container within the context,
-        once context ends restart the container and wait for the service check to pass.
+        once context ends start the container and wait for the service check to pass.
+
+        The time from the container kill until the service check passes is recorded
+        under `recovery_times[name]`.
 
         :param str name: container name as it appears in the docker compose file.
         :param callable health_check: a callable used to determine if the service has recovered.
@@ -275,13 +782,35 @@ class EnvironmentController(object):
         """
         container_id = self.get_container_id(name)
         self.docker_client.kill(container_id)
+        killed_at = time.time()
         try:
             yield
         finally:
-            self.docker_client.restart(container_id)
+            self._reset_ready_log(name)
+            self._recover_container(container_id)
             self.wait_for_health(
                 name=name, health_check=health_check, interval=interval, timeout=timeout
             )
+            recovery_time = time.time() - killed_at
+            self.recovery_times[name].append(recovery_time)
+            log.info("Container %s recovered %.3f seconds after kill", name, recovery_time)
+
+    def _recover_container(self, container_id):
+        """Bring a killed container back up.
+
+        A killed container is usually already exited, in which case it is started directly -
+        `restart` would first wait for a stop timeout on a container that is already dead.
+        Containers that are in any other state are restarted.
+
+        :param str container_id: the killed container id.
+        """
+        status = self.docker_client.inspect_container(container_id)["State"]["Status"]
+        if status in ("exited", "created"):
+            log.debug("Container %s is %s, starting it", container_id, status)
+            self.docker_client.start(container_id)
+        else:
+            log.debug("Container %s is %s, restarting it", container_id, status)
+            self.docker_client.restart(container_id)
 
     @contextmanager
     def container_paused(self, name, health_check=None, interval=1, timeout=60):
@@ -336,11 +865,87 @@ class EnvironmentController(object):
         try:
             yield
         finally:
+            self._reset_ready_log(name)
             self.docker_client.start(container_id)
             self.wait_for_health(
                 name=name, health_check=health_check, interval=interval, timeout=timeout
             )
 
+    def snapshot(self, services=None):
+        """Capture the containers filesystem state, to be restored later using `restore`.
+
+        Should be called once the environment is healthy. The snapshot is taken using `docker commit`,
+        data stored in volumes is not part of the snapshot.
+
+        :param list services: services to snapshot, defaults to the started services (see `active_services`).
+        """
+        services = services if services else self.active_services
+        for name in services:
+            log.debug("Taking a snapshot of %s container", name)
+            start_time = time.time()
+            container_id = self.get_container_id(name)
+            repository = "{0}/{1}_{2}".format(SNAPSHOT_REPOSITORY, self.project_name, name).lower()
+            self.docker_client.commit(container_id, repository=repository, tag="latest")
+            self.snapshots[name] = repository + ":latest"
+            log.info("Snapshot of %s container taken in %.3f seconds", name, time.time() - start_time)
+
+    def restore(self, name, health_check=None, interval=1, timeout=60):
+        """Restore the container to its snapshot state and wait for the service check to pass.
+
+        The container is replaced by a container created from the snapshot image, using the same
+        name, configuration and networks. The time it took is recorded under `restore_times[name]`.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param callable health_check: a callable used to determine if the service has recovered.
+        :param int interval: interval (in seconds) between checks.
+        :param int timeout: timeout (in seconds) for all checks to pass.
+        """
+        if name not in self.snapshots:
+            raise RuntimeError("No snapshot was taken for container %s" % name)
+
+        log.debug("Restoring %s container from snapshot %s", name, self.snapshots[name])
+        start_time = time.time()
+        container_id = self.get_container_id(name)
+        container_info = self.docker_client.inspect_container(container_id)
+        self.docker_client.remove_container(container_id, force=True)
+
+        # Attach the first network on creation, the rest are connected before the container starts
+        networks = [
+            (network_name, [alias for alias in network_info.get("Aliases") or [] if not container_id.startswith(alias)])
+            for network_name, network_info in sorted(container_info["NetworkSettings"]["Networks"].items())
+        ]
+        container_config = dict(container_info["Config"], Image=self.snapshots[name])
+        container_config["HostConfig"] = container_info["HostConfig"]
+        if networks:
+            network_name, aliases = networks[0]
+            container_config["NetworkingConfig"] = {"EndpointsConfig": {network_name: {"Aliases": aliases}}}
+
+        new_container_id = self.docker_client.create_container_from_config(
+            container_config, name=container_info["Name"].lstrip("/")
+        )["Id"]
+        for network_name, aliases in networks[1:]:
+            self.docker_client.connect_container_to_network(new_container_id, network_name, aliases=aliases)
+
+        self._reset_ready_log(name)
+        self.docker_client.start(new_container_id)
+        self.wait_for_health(name=name, health_check=health_check, interval=interval, timeout=timeout)
+
+        restore_time = time.time() - start_time
+        self.restore_times[name].append(restore_time)
+        log.info("Container %s restored from snapshot in %.3f seconds", name, restore_time)
+
+    def remove_snapshots(self):
+        """Remove the snapshot images taken by the controller."""
+        import docker
+
+        for name, image in list(self.snapshots.items()):
+            try:
+                self.docker_client.remove_image(image, force=True)
+                del self.snapshots[name]
+            except docker.errors.APIError:
+                log.warning("Failed removing snapshot %s of container %s", image, name)
+
+    @timed("wait_for_health")
     def wait_for_health(self, name, health_check=None, interval=1, timeout=60):
         """Container stopped context manager.
 
@@ -355,10 +960,9 @@ class EnvironmentController(object):
         )
         waiting.wait(health_check, sleep_seconds=interval, timeout_seconds=timeout)
 
-    @staticmethod
-    def _get_environment_variables():
+    def _get_environment_variables(self):
         """Set the compose api version according to the server's api version"""
-        server_api_version = get_server_api_version()
+        server_api_version = api_version.get_server_api_version(self.docker_client)
         log.debug(
             "docker server api version is %s, updating environment_variables",
             server_api_version,
@@ -367,10 +971,26 @@ class EnvironmentController(object):
         env["COMPOSE_API_VERSION"] = env["DOCKER_API_VERSION"] = server_api_version
         return env
 
+    def get_leak_suspects(self):
+        """Return the containers suspected of leaking memory, once the stats collection stopped.
+
+        :return list: the suspects, see `stats.ClusterStats.get_leak_suspects`.
+        """
+        if not self.collect_stats:
+            return []
+
+        from docker_test_tools import stats
+
+        return [
+            suspect for plugin in self.plugins if isinstance(plugin, stats.StatsCollector)
+            for suspect in plugin.leak_suspects
+        ]
+
     def update_plugins(self, message):
         for plugin in self.plugins:
             plugin.update(message=message)
 
+    @timed("get_container_id")
     def get_container_id(self, name):
         """Get container id by name.
 
@@ -378,20 +998,123 @@ class EnvironmentController(object):
         """
         return self.compose.get_service_container_id(name)
 
+    @timed("run_exec_in_container")
     def run_exec_in_container(self, name, command):
         """
         Execute command in container by container name
         :param str name: container name.
         :param str command: command to run in the container.
         """
-        log.debug("Creating exec instance in container %s", name)
         container_id = self.get_container_id(name=name)
-        exec_create_output = self.docker_client.exec_create(container_id, command)
-        if not exec_create_output or not exec_create_output.get("Id"):
-            raise RuntimeError("Failed to create exec instance in container %s with command %s" % (name, command))
-        exec_id = exec_create_output.get("Id")
+        exec_id = self._create_exec(name=name, container_id=container_id, command=command)
         log.debug("Starting exec instance in container %s", name)
         exec_start_output = self.docker_client.exec_start(exec_id)
         if exec_start_output is None:
             raise RuntimeError("Failed to start exec instance in container %s with command %s" % (name, command))
         return exec_start_output
+
+    def stream_exec_in_container(self, name, command):
+        """Execute command in container and stream its output.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param str command: command to run in the container.
+        :return ExecStream: iterable over the demuxed (stdout, stderr) output chunks, exposing the exit code.
+        """
+        container_id = self.get_container_id(name=name)
+        exec_id = self._create_exec(name=name, container_id=container_id, command=command)
+        log.debug("Starting streamed exec instance in container %s", name)
+        chunks = self.docker_client.exec_start(exec_id, stream=True, demux=True)
+        return execution.ExecStream(docker_client=self.docker_client, exec_id=exec_id, chunks=chunks)
+
+    def exec_in_container_to_file(self, name, command, stdout_path, stderr_path=None):
+        """Execute command in container and write its output into files without buffering it.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param str command: command to run in the container.
+        :param str stdout_path: file path to write the command stdout to.
+        :param str stderr_path: file path to write the command stderr to, if not given stderr is written to stdout.
+        :return int: the command exit code.
+        """
+        stream = self.stream_exec_in_container(name=name, command=command)
+        return stream.write_to_file(stdout_path=stdout_path, stderr_path=stderr_path)
+
+    def run_exec_in_containers(self, names, command, output_dir=None):
+        """Execute the same command concurrently in several containers.
+
+        :param list names: container names as they appear in the docker compose file.
+        :param str command: command to run in the containers.
+        :param str output_dir: if given, each container output is written to '<name>.stdout' & '<name>.stderr'
+            files in this directory instead of being returned.
+        :return dict: container name to `ExecResult`, holding the output files paths if output_dir is given.
+        """
+        def run_exec(name):
+            stream = self.stream_exec_in_container(name=name, command=command)
+            if not output_dir:
+                return stream.read()
+
+            stdout_path = os.path.join(output_dir, name + ".stdout")
+            stderr_path = os.path.join(output_dir, name + ".stderr")
+            exit_code = stream.write_to_file(stdout_path=stdout_path, stderr_path=stderr_path)
+            return execution.ExecResult(exit_code=exit_code, stdout=stdout_path, stderr=stderr_path)
+
+        pool = ThreadPool(processes=len(names) or 1)
+        try:
+            async_results = {name: pool.apply_async(run_exec, (name,)) for name in names}
+            return {name: async_result.get() for name, async_result in async_results.items()}
+        finally:
+            pool.close()
+
+    def copy_to_container(self, name, paths, target_dir, chunk_size=archive.DEFAULT_CHUNK_SIZE):
+        """Copy local files & directories into the container.
+
+        The archive is streamed to the container while being generated, it is never held in memory.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param list paths: local files & directories paths to copy, each is copied under its base name.
+        :param str target_dir: existing directory in the container to copy the paths into.
+        :param int chunk_size: size (in bytes) of the chunks read from the local files.
+        """
+        paths = [paths] if isinstance(paths, six.string_types) else paths
+        log.debug("Copying %s into %s container at %s", paths, name, target_dir)
+        container_id = self.get_container_id(name=name)
+        if not self.docker_client.put_archive(
+            container_id, target_dir, archive.iter_tar(paths=paths, chunk_size=chunk_size)
+        ):
+            raise RuntimeError("Failed copying %s into container %s at %s" % (paths, name, target_dir))
+
+    def copy_from_container(self, name, paths, target_dir, chunk_size=archive.DEFAULT_CHUNK_SIZE):
+        """Copy files & directories from the container into a local directory.
+
+        The archive is extracted while being received from the container, it is never held in memory.
+
+        :param str name: container name as it appears in the docker compose file.
+        :param list paths: container files & directories paths to copy, each is copied under its base name.
+        :param str target_dir: local directory to copy the paths into.
+        :param int chunk_size: size (in bytes) of the chunks read from the container.
+        :return list: the copied files & directories names, relative to the target directory.
+        """
+        paths = [paths] if isinstance(paths, six.string_types) else paths
+        log.debug("Copying %s from %s container into %s", paths, name, target_dir)
+        container_id = self.get_container_id(name=name)
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        copied = []
+        for path in paths:
+            chunks, _ = self.docker_client.get_archive(container_id, path, chunk_size=chunk_size)
+            copied.extend(archive.extract_tar(chunks=chunks, target_dir=target_dir))
+
+        return copied
+
+    def _create_exec(self, name, container_id, command):
+        """Create an exec instance in the container and return its id.
+
+        :param str name: container name.
+        :param str container_id: container id.
+        :param str command: command to run in the container.
+        """
+        log.debug("Creating exec instance in container %s", name)
+        exec_create_output = self.docker_client.exec_create(container_id, command)
+        if not exec_create_output or not exec_create_output.get("Id"):
+            raise RuntimeError("Failed to create exec instance in container %s with command %s" % (name, command))
+        return exec_create_output.get("Id")
@@ -0,0 +1,81 @@
+import io
+import logging
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+# Result of a command executed in a container.
+# When the output is written to files, `stdout` & `stderr` hold the files paths instead of the output.
+ExecResult = namedtuple("ExecResult", ["exit_code", "stdout", "stderr"])
+
+
+class ExecStream(object):
+    """Streamed output of a command executed in a container.
+
+    Iterating the stream yields `(stdout, stderr)` chunks as they are produced by the command,
+    one of them is always None. The output is never buffered as a whole.
+
+    Usage:
+
+    >>> stream = controller.stream_exec_in_container(name='db', command='pg_dumpall')
+    >>> for stdout, stderr in stream:
+    >>>     ...
+    >>> stream.exit_code
+    """
+
+    def __init__(self, docker_client, exec_id, chunks):
+        """Initialize the exec stream.
+
+        :param docker_client: docker api client used to run the command.
+        :param str exec_id: the exec instance id.
+        :param chunks: demuxed output generator returned by `exec_start`.
+        """
+        self.docker_client = docker_client
+        self.exec_id = exec_id
+        self.chunks = chunks
+
+    def __iter__(self):
+        for stdout, stderr in self.chunks:
+            yield stdout, stderr
+
+    @property
+    def exit_code(self):
+        """Return the command exit code, None if the command is still running."""
+        return self.docker_client.exec_inspect(self.exec_id)["ExitCode"]
+
+    def write_to(self, stdout, stderr=None):
+        """Write the command output into the given binary streams, and return the command exit code.
+
+        :param stdout: binary stream to write the command stdout to.
+        :param stderr: binary stream to write the command stderr to, if not given stderr is written to stdout.
+        :return int: the command exit code.
+        """
+        stderr = stderr if stderr is not None else stdout
+        for stdout_chunk, stderr_chunk in self:
+            if stdout_chunk:
+                stdout.write(stdout_chunk)
+
+            if stderr_chunk:
+                stderr.write(stderr_chunk)
+
+        return self.exit_code
+
+    def write_to_file(self, stdout_path, stderr_path=None):
+        """Write the command output into the given files, and return the command exit code.
+
+        :param str stdout_path: file path to write the command stdout to.
+        :param str stderr_path: file path to write the command stderr to, if not given stderr is written to stdout.
+        :return int: the command exit code.
+        """
+        with io.open(stdout_path, "wb") as stdout_file:
+            if not stderr_path:
+                return self.write_to(stdout_file)
+
+            with io.open(stderr_path, "wb") as stderr_file:
+                return self.write_to(stdout_file, stderr_file)
+
+    def read(self):
+        """Read the whole command output, and return an `ExecResult`."""
+        stdout, stderr = io.BytesIO(), io.BytesIO()
+        exit_code = self.write_to(stdout, stderr)
+        return ExecResult(exit_code=exit_code, stdout=stdout.getvalue(), stderr=stderr.getvalue())
@@ -0,0 +1,483 @@
+"""Full-text index of the collected containers logs.
+
+The index is built incrementally while the per service log files are written, and holds:
+
+* An inverted index - each token to the offsets of the lines containing it, per log file. The postings are
+  kept in memory up to `LogIndexer.SEGMENT_POSTINGS`, then flushed to a segment file on disk - the segments
+  are merged when the index is written, so indexing large logs takes a bounded amount of memory.
+* A sparse time index - the offset of every `TIME_INDEX_INTERVAL` timestamped line, per log file.
+* The tests sections - the offsets range between each test begin & end messages, per log file.
+
+Queries use the index to read only the relevant lines, instead of scanning the whole log files.
+
+Usage:
+
+>>> index = LogIndex.load(get_index_path('logs/docker-tests.log'))
+>>> for match in index.search(terms=['connection', 'refused'], service='consul.service', test='test_service_down'):
+>>>     print(match.service, match.line)
+"""
+import io
+import os
+import re
+import gzip
+import json
+import heapq
+import bisect
+import shutil
+import logging
+import calendar
+import tempfile
+from collections import defaultdict, namedtuple
+
+import six
+
+log = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.json.gz"
+
+# Prefix of the common messages written to all the log files (see `LogCollector.COMMON_LOG_PREFIX`)
+COMMON_LOG_PREFIX = ">>>"
+
+TOKEN_PATTERN = re.compile(r"\w{2,64}", re.UNICODE)
+TIMESTAMP_PATTERN = re.compile(r"^\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?(Z|[+-]\d{2}:?\d{2})?(?=\s|$)")
+WORKER_TAG_PATTERN = re.compile(r"^\[\w+\] ")
+TEST_BEGIN_PATTERN = re.compile(r"^=+ TEST BEGINNING: (.+?) =+$")
+SESSION_MESSAGE_PATTERN = re.compile(r"^=+ .* =+$")
+
+LogMatch = namedtuple("LogMatch", ["service", "stream", "path", "offset", "timestamp", "line"])
+
+
+def get_index_path(log_path):
+    """Return the index path of the logs collected into the given log path."""
+    return os.path.splitext(log_path)[0] + INDEX_SUFFIX
+
+
+def tokenize(text):
+    """Return the unique (lower cased) tokens of the text."""
+    return set(token.lower() for token in TOKEN_PATTERN.findall(text))
+
+
+def parse_timestamp(line):
+    """Return the line timestamp (seconds since epoch), None if the line doesn't start with a timestamp.
+
+    :param str line: a log line, starting with a docker log timestamp (e.g. 2024-01-01T10:00:00.123456789Z).
+    """
+    match = TIMESTAMP_PATTERN.match(line)
+    if not match:
+        return None
+
+    date, fraction, zone = match.groups()
+    timestamp = calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]),
+                                 int(date[11:13]), int(date[14:16]), int(date[17:19]), 0, 0, 0))
+    timestamp += float("0" + fraction) if fraction else 0
+    if zone and zone != "Z":
+        sign = -1 if zone[0] == "+" else 1
+        zone = zone[1:].replace(":", "")
+        timestamp += sign * (int(zone[:2]) * 3600 + int(zone[2:]) * 60)
+
+    return timestamp
+
+
+def to_timestamp(value):
+    """Return the given time as seconds since epoch.
+
+    :param value: seconds since epoch, or an ISO 8601 timestamp (UTC unless specifying a time zone).
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+
+    try:
+        return float(value)
+    except ValueError:
+        timestamp = parse_timestamp(value)
+        if timestamp is None:
+            raise RuntimeError("Invalid time: %s" % value)
+
+        return timestamp
+
+
+def get_section_message(line):
+    """Return the message of a common log line, None if it's not a common log line."""
+    line = line.strip()
+    if not line.startswith(COMMON_LOG_PREFIX):
+        return None
+
+    # Common lines are in the format of: '>>> <time> <message>'
+    parts = line[len(COMMON_LOG_PREFIX):].strip().split(" ", 1)
+    return WORKER_TAG_PATTERN.sub("", parts[1] if len(parts) > 1 else "").strip()
+
+
+def get_section_name(message):
+    """Return the name of the test section started by the common message, None if it ends the current section.
+
+    :param str message: a common log message (see `get_section_message`).
+    """
+    match = TEST_BEGIN_PATTERN.match(message)
+    if match:
+        return match.group(1)
+
+    # Plain messages are the test names written by the nose2 plugin, other messages end the current test
+    if message and not SESSION_MESSAGE_PATTERN.match(message):
+        return message
+
+    return None
+
+
+class LogIndexer(object):
+    """Builds the logs index incrementally, while the log files are written.
+
+    Not thread safe - the log collectors feed the indexer while holding their own locks.
+    """
+
+    # Number of timestamped lines between the time index entries
+    TIME_INDEX_INTERVAL = 256
+
+    # Number of postings kept in memory before they are flushed to a segment file
+    SEGMENT_POSTINGS = 1000000
+
+    def __init__(self, encoding="utf-8", work_dir=None):
+        """Initialize the indexer.
+
+        :param str encoding: the log files encoding, used for calculating the lines offsets.
+        :param str work_dir: directory of the temporary postings segments, the system temp directory if None.
+        """
+        self.encoding = encoding
+        self.work_dir = work_dir
+        self.files = []
+        self.positions = []
+        self.pending = []
+        self.line_counts = []
+        self.postings = defaultdict(lambda: defaultdict(list))
+        self.postings_count = 0
+        self.segments_dir = None
+        self.segments = []
+        self.times = []
+        self.sections = []
+        self.open_sections = {}
+
+    def add_file(self, path, service, stream="stdout"):
+        """Add a log file to the index, return its id.
+
+        :param str path: the log file path, relative to the index directory.
+        :param str service: the service whose logs are written to the file.
+        :param str stream: the service logs stream written to the file (stdout/ stderr).
+        """
+        self.files.append({"path": path, "service": service, "stream": stream})
+        self.positions.append(0)
+        self.pending.append(six.u(""))
+        self.line_counts.append(0)
+        self.times.append([])
+        return len(self.files) - 1
+
+    def feed(self, file_id, text):
+        """Index the text written to the log file.
+
+        :param int file_id: the log file id (see `add_file`).
+        :param str text: the text written to the file, not necessarily aligned to lines.
+        """
+        lines = (self.pending[file_id] + text).split(six.u("\n"))
+        self.pending[file_id] = lines.pop()
+        for line in lines:
+            offset = self.positions[file_id]
+            self.positions[file_id] += len(line.encode(self.encoding)) + 1
+            self._index_line(file_id, offset, line)
+
+    def close(self):
+        """Index the incomplete lines and close the open tests sections."""
+        for file_id, line in enumerate(self.pending):
+            if line:
+                self._index_line(file_id, self.positions[file_id], line)
+                self.positions[file_id] += len(line.encode(self.encoding))
+                self.pending[file_id] = six.u("")
+
+        for file_id in list(self.open_sections):
+            self._close_section(file_id, self.positions[file_id])
+
+    def to_dict(self):
+        """Return the index content, with the postings offsets delta encoded."""
+        return dict(self._get_header(), tokens=dict(self.iter_tokens()))
+
+    def iter_tokens(self):
+        """Return an iterator of the (token, postings) pairs ordered by token, merging the flushed segments.
+
+        The postings map a file id (as a string) to the delta encoded offsets of the lines containing the token.
+        """
+        segments = [self._read_segment(number, path) for number, path in enumerate(self.segments)]
+        segments.append(self._iter_postings(len(self.segments)))
+        token, merged, last_offsets = None, {}, {}
+        for entry_token, _, files_deltas in heapq.merge(*segments):
+            if entry_token != token:
+                if token is not None:
+                    yield token, merged
+                token, merged, last_offsets = entry_token, {}, {}
+
+            # Each segment deltas start from offset 0, continue them from the previous segment last offset
+            for file_id, deltas in files_deltas.items():
+                last_offset = last_offsets.get(file_id, 0)
+                merged.setdefault(file_id, []).extend([deltas[0] - last_offset] + deltas[1:])
+                last_offsets[file_id] = sum(deltas)
+
+        if token is not None:
+            yield token, merged
+
+    def write(self, path):
+        """Write the index to the given path, streaming the merged postings into it."""
+        self.close()
+        log.debug("Writing the logs index into %s", path)
+        try:
+            with gzip.open(path, "wb") as index_file:
+                # The tokens are written last, one at a time, so the whole postings are never held in memory
+                index_file.write(json.dumps(self._get_header(), separators=(",", ":"))[:-1].encode("utf-8"))
+                index_file.write(b',"tokens":{')
+                for number, (token, postings) in enumerate(self.iter_tokens()):
+                    index_file.write((("," if number else "") + json.dumps(token) + ":" +
+                                      json.dumps(postings, separators=(",", ":"))).encode("utf-8"))
+                index_file.write(b"}}")
+        finally:
+            self.discard_segments()
+
+    def discard_segments(self):
+        """Remove the flushed postings segments."""
+        if self.segments_dir:
+            shutil.rmtree(self.segments_dir, ignore_errors=True)
+
+        self.segments_dir = None
+        self.segments = []
+
+    def _get_header(self):
+        """Return the index content, except for the tokens postings."""
+        return {
+            "version": INDEX_VERSION,
+            "encoding": self.encoding,
+            "files": [dict(info, size=size) for info, size in zip(self.files, self.positions)],
+            "times": self.times,
+            "sections": self.sections,
+        }
+
+    def _index_line(self, file_id, offset, line):
+        """Add the line tokens, timestamp & test section to the index."""
+        message = get_section_message(line)
+        if message is not None:
+            self._update_sections(file_id, offset, message)
+            return
+
+        timestamp = parse_timestamp(line)
+        if timestamp is not None:
+            if self.line_counts[file_id] % self.TIME_INDEX_INTERVAL == 0:
+                self.times[file_id].append([timestamp, offset])
+            self.line_counts[file_id] += 1
+
+        tokens = tokenize(line)
+        for token in tokens:
+            self.postings[token][file_id].append(offset)
+
+        self.postings_count += len(tokens)
+        if self.postings_count >= self.SEGMENT_POSTINGS:
+            self._flush_segment()
+
+    def _flush_segment(self):
+        """Write the in-memory postings to a segment file, sorted by token with delta encoded offsets."""
+        if not self.postings:
+            return
+
+        if self.segments_dir is None:
+            self.segments_dir = tempfile.mkdtemp(prefix=".log-index-", dir=self.work_dir or None)
+
+        path = os.path.join(self.segments_dir, "segment{0}.json.gz".format(len(self.segments)))
+        with gzip.open(path, "wb", compresslevel=1) as segment_file:
+            for token, _, files_deltas in self._iter_postings(len(self.segments)):
+                segment_file.write((json.dumps([token, files_deltas], separators=(",", ":")) + "\n").encode("utf-8"))
+
+        self.segments.append(path)
+        self.postings = defaultdict(lambda: defaultdict(list))
+        self.postings_count = 0
+
+    def _iter_postings(self, number):
+        """Return an iterator of the in-memory (token, segment number, postings) entries, ordered by token."""
+        for token in sorted(self.postings):
+            yield token, number, {
+                str(file_id): [offset - previous for offset, previous in zip(offsets, [0] + offsets[:-1])]
+                for file_id, offsets in self.postings[token].items()
+            }
+
+    @staticmethod
+    def _read_segment(number, path):
+        """Return an iterator of the segment (token, segment number, postings) entries, ordered by token."""
+        with gzip.open(path, "rb") as segment_file:
+            for line in segment_file:
+                token, files_deltas = json.loads(line.decode("utf-8"))
+                yield token, number, files_deltas
+
+    def _update_sections(self, file_id, offset, message):
+        """Open or close a test section based on the common message."""
+        if file_id in self.open_sections:
+            self._close_section(file_id, offset)
+
+        name = get_section_name(message)
+        if name is not None:
+            self._open_section(file_id, offset, name)
+
+    def _open_section(self, file_id, offset, name):
+        self.open_sections[file_id] = len(self.sections)
+        self.sections.append([name, file_id, offset, None])
+
+    def _close_section(self, file_id, offset):
+        self.sections[self.open_sections.pop(file_id)][3] = offset
+
+
+class LogIndex(object):
+    """Query API of a logs index."""
+
+    def __init__(self, content, base_dir):
+        """Initialize the index.
+
+        :param dict content: the index content (see `LogIndexer.to_dict`).
+        :param str base_dir: the directory the indexed log files paths are relative to.
+        """
+        if content.get("version") != INDEX_VERSION:
+            raise RuntimeError("Unsupported logs index version: %s" % content.get("version"))
+
+        self.encoding = content["encoding"]
+        self.files = content["files"]
+        self.tokens = content["tokens"]
+        self.times = content["times"]
+        self.sections = content["sections"]
+        self.base_dir = base_dir
+
+    @classmethod
+    def load(cls, path):
+        """Load the index from the given path."""
+        if not os.path.exists(path):
+            raise RuntimeError("Logs index not found: %s" % path)
+
+        with gzip.open(path, "rb") as index_file:
+            return cls(json.loads(index_file.read().decode("utf-8")), base_dir=os.path.dirname(path))
+
+    @property
+    def services(self):
+        """The indexed service names."""
+        return sorted(set(info["service"] for info in self.files))
+
+    @property
+    def tests(self):
+        """The indexed test names."""
+        return sorted(set(section[0] for section in self.sections))
+
+    def search(self, terms=(), service=None, test=None, since=None, until=None):
+        """Find the log lines matching the query, ordered by log file & offset.
+
+        :param list terms: terms which must all appear in the line (case insensitive).
+        :param str service: return only the lines of the given service.
+        :param str test: return only the lines written while a test whose name contains the given name was running.
+        :param since: return only lines logged at or after the given time (seconds since epoch or ISO 8601 timestamp).
+        :param until: return only lines logged at or before the given time (seconds since epoch or ISO 8601 timestamp).
+        :return iterator: the matching lines, as `LogMatch` tuples.
+        """
+        tokens = set()
+        for term in terms:
+            tokens.update(tokenize(term))
+
+        since, until = to_timestamp(since), to_timestamp(until)
+        for file_id, info in enumerate(self.files):
+            if service and info["service"] != service:
+                continue
+
+            ranges = self._get_ranges(file_id, test, since, until)
+            if not ranges:
+                continue
+
+            path = os.path.join(self.base_dir, info["path"])
+            with io.open(path, "rb") as log_file:
+                if tokens:
+                    offsets = self._get_offsets(file_id, tokens)
+                    lines = self._read_lines(log_file, offsets, ranges)
+                else:
+                    lines = self._scan_lines(log_file, ranges)
+
+                for offset, line in lines:
+                    line = line.decode(self.encoding, "replace").rstrip("\n")
+                    if not line.strip() or get_section_message(line) is not None:
+                        continue
+
+                    timestamp = parse_timestamp(line)
+                    if (since is not None or until is not None) and timestamp is None:
+                        continue
+                    if since is not None and timestamp < since:
+                        continue
+                    if until is not None and timestamp > until:
+                        continue
+
+                    yield LogMatch(service=info["service"], stream=info["stream"], path=path, offset=offset,
+                                   timestamp=timestamp, line=line)
+
+    def _get_offsets(self, file_id, tokens):
+        """Return the sorted offsets of the file lines containing all the tokens."""
+        offsets = None
+        for token in tokens:
+            deltas = self.tokens.get(token, {}).get(str(file_id))
+            if not deltas:
+                return []
+
+            token_offsets, total = set(), 0
+            for delta in deltas:
+                total += delta
+                token_offsets.add(total)
+
+            offsets = token_offsets if offsets is None else offsets & token_offsets
+
+        return sorted(offsets)
+
+    def _get_ranges(self, file_id, test, since, until):
+        """Return the sorted (start, end) offset ranges of the file which may hold matching lines."""
+        size = self.files[file_id]["size"]
+        if test:
+            ranges = [(start, end if end is not None else size)
+                      for name, section_file_id, start, end in self.sections
+                      if section_file_id == file_id and test in name]
+        else:
+            ranges = [(0, size)]
+
+        # Narrow the ranges using the sparse time index
+        times = self.times[file_id]
+        if times and (since is not None or until is not None):
+            timestamps = [timestamp for timestamp, _ in times]
+            start = 0
+            if since is not None:
+                index = bisect.bisect_right(timestamps, since) - 1
+                start = times[index][1] if index >= 0 else 0
+
+            end = size
+            if until is not None:
+                index = bisect.bisect_right(timestamps, until)
+                end = times[index][1] if index < len(times) else size
+
+            ranges = [(max(range_start, start), min(range_end, end)) for range_start, range_end in ranges]
+
+        return [(start, end) for start, end in sorted(ranges) if start < end]
+
+    @staticmethod
+    def _read_lines(log_file, offsets, ranges):
+        """Read the lines at the given offsets, which are within the ranges."""
+        starts = [start for start, _ in ranges]
+        for offset in offsets:
+            index = bisect.bisect_right(starts, offset) - 1
+            if index < 0 or offset >= ranges[index][1]:
+                continue
+
+            log_file.seek(offset)
+            yield offset, log_file.readline()
+
+    @staticmethod
+    def _scan_lines(log_file, ranges):
+        """Read all the lines within the ranges."""
+        for start, end in ranges:
+            log_file.seek(start)
+            offset = start
+            while offset < end:
+                line = log_file.readline()
+                if not line:
+                    break
+
+                yield offset, line
+                offset += len(line)
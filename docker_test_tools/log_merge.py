@@ -0,0 +1,156 @@
+"""Time ordered view of the services logs.
+
+The services log files are each ordered by time, so they are merged using a k-way merge - keeping a single
+pending line per service in a heap, so memory use depends on the number of services, not on the logs size.
+Rotated (`<name>.log.1`, `<name>.log.2.gz`, ...) and compressed segments are read in order as one log.
+
+Usage:
+
+>>> services = get_log_services('logs/docker-tests.log', compose_paths=['docker-compose.yml'])
+>>> for line in merge_logs(find_service_logs('logs', services=services), test='test_service_down'):
+>>>     print(line.service, line.line)
+"""
+import io
+import os
+import re
+import gzip
+import heapq
+from collections import namedtuple
+
+from docker_test_tools import compose_file
+from docker_test_tools.log_index import (LogIndex, get_index_path, get_section_message, get_section_name,
+                                         parse_timestamp, to_timestamp)
+
+SEGMENT_PATTERN = re.compile(r"^(?P<name>.+\.log)(\.(?P<number>\d+))?(?P<gz>\.gz)?$")
+
+STDERR_SUFFIX = ".stderr"
+
+MergedLine = namedtuple("MergedLine", ["timestamp", "service", "line"])
+
+
+def get_log_services(log_path, compose_paths=None):
+    """Return the names of the services whose logs are collected next to the combined log file.
+
+    The services are taken from the logs index when there is one (see `index-logs`), otherwise from the
+    compose files metadata.
+
+    :param str log_path: the configured `log-path` (the combined log file).
+    :param list compose_paths: the docker compose file paths, used when the logs aren't indexed.
+    :return list: the service names, or None if they can't be resolved.
+    """
+    index_path = get_index_path(log_path)
+    if os.path.exists(index_path):
+        return LogIndex.load(index_path).services
+
+    metadata = compose_file.get_metadata(compose_paths) if compose_paths else None
+    return metadata["services"] if metadata is not None else None
+
+
+def find_service_logs(log_dir, services=None, exclude=()):
+    """Return the services log files segments in the directory.
+
+    :param str log_dir: the logs directory.
+    :param list services: return only the log files of the given services (both their stdout & stderr logs),
+        if not given every `*.log` file in the directory is considered a service log.
+    :param list exclude: log files to ignore (e.g. the combined log file).
+    :return dict: service name (the log file name, e.g. `consul.service` or `consul.service.stderr`) to its
+        log segments paths, oldest first.
+    """
+    excluded = set(os.path.basename(path) for path in exclude)
+    segments = {}
+    for file_name in os.listdir(log_dir):
+        match = SEGMENT_PATTERN.match(file_name)
+        if not match or match.group("name") in excluded or not os.path.isfile(os.path.join(log_dir, file_name)):
+            continue
+
+        service = match.group("name")[:-len(".log")]
+        if services is not None and service not in services and \
+                not (service.endswith(STDERR_SUFFIX) and service[:-len(STDERR_SUFFIX)] in services):
+            continue
+
+        # The active segment is the newest, rotated segments are numbered from the newest to the oldest
+        number = int(match.group("number")) if match.group("number") else 0
+        segments.setdefault(service, []).append((-number, file_name))
+
+    return {
+        service: [os.path.join(log_dir, file_name) for _, file_name in sorted(service_segments)]
+        for service, service_segments in segments.items()
+    }
+
+
+def read_segments(paths, encoding="utf-8"):
+    """Iterate over the lines of the log segments, reading gzip compressed segments as well.
+
+    :param list paths: the log segments paths, oldest first.
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else io.open
+        with opener(path, "rb") as log_file:
+            for line in log_file:
+                yield line.decode(encoding, "replace").rstrip("\n")
+
+
+def iter_service_lines(lines, since=None, until=None, test=None):
+    """Iterate over the timestamped service log lines within the time range or test.
+
+    Lines without a timestamp (e.g. multi-line messages) take the timestamp of the line before them,
+    so they stay next to it. Common log messages are used for finding the test sections, and are skipped.
+
+    :param iterator lines: the service log lines, ordered by time.
+    :param float since: skip lines logged before the given time (seconds since epoch).
+    :param float until: stop at lines logged after the given time (seconds since epoch).
+    :param str test: return only the lines written while a test whose name contains the given name was running.
+    :return iterator: (timestamp, line) tuples.
+    """
+    timestamp = float("-inf")
+    section = None
+    for line in lines:
+        message = get_section_message(line)
+        if message is not None:
+            section = get_section_name(message)
+            continue
+
+        if not line.strip():
+            continue
+
+        timestamp = parse_timestamp(line) or timestamp
+        if until is not None and timestamp > until:
+            return
+
+        if since is not None and timestamp < since:
+            continue
+
+        if test is not None and (section is None or test not in section):
+            continue
+
+        yield timestamp, line
+
+
+def merge_logs(services_logs, since=None, until=None, test=None, encoding="utf-8"):
+    """Iterate over the services log lines, ordered by their timestamps.
+
+    :param dict services_logs: service name to its log segments paths, oldest first (see `find_service_logs`).
+    :param since: skip lines logged before the given time (seconds since epoch or ISO 8601 timestamp).
+    :param until: stop at lines logged after the given time (seconds since epoch or ISO 8601 timestamp).
+    :param str test: return only the lines written while a test whose name contains the given name was running.
+    :return iterator: the lines as `MergedLine` tuples, lines of the same time are ordered by service name.
+    """
+    since, until = to_timestamp(since), to_timestamp(until)
+
+    # The heap holds the next line of each service: (timestamp, service order, service, line, lines iterator)
+    heap = []
+    for order, service in enumerate(sorted(services_logs)):
+        lines = iter_service_lines(read_segments(services_logs[service], encoding), since, until, test)
+        _push_next(heap, order, service, lines)
+
+    while heap:
+        timestamp, order, service, line, lines = heapq.heappop(heap)
+        yield MergedLine(timestamp=timestamp if timestamp != float("-inf") else None, service=service, line=line)
+        _push_next(heap, order, service, lines)
+
+
+def _push_next(heap, order, service, lines):
+    """Push the next line of the service into the heap, if there is one."""
+    for timestamp, line in lines:
+        heapq.heappush(heap, (timestamp, order, service, line, lines))
+        return
@@ -0,0 +1,163 @@
+"""Per service log quotas, protecting the test host from noisy containers.
+
+Each service log lines are admitted using token buckets - limiting the bytes and lines written per second
+(allowing a burst of one second worth of logs). Lines exceeding the quota are dropped and counted, except for
+a sample of them (every `sample_rate` dropped line is written anyway).
+
+The most recent dropped lines of each service are kept in a ring buffer of `tail_bytes`, written to the logs
+once the collection stops - so the logs always hold the service first lines (head) and its last lines (tail),
+which are usually the interesting ones when triaging a failure.
+"""
+import logging
+import threading
+from collections import deque
+from timeit import default_timer
+
+log = logging.getLogger(__name__)
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter, allowing a burst of one second worth of tokens."""
+
+    def __init__(self, rate, clock=default_timer):
+        """Initialize the bucket.
+
+        :param float rate: tokens added per second (and the bucket capacity).
+        :param callable clock: returns the current time in seconds.
+        """
+        self.rate = float(rate)
+        self.clock = clock
+        self.tokens = self.rate
+        self.updated = clock()
+
+    def consume(self, tokens):
+        """Consume the tokens, return False if there aren't enough tokens.
+
+        Requests larger than the bucket capacity are allowed once the bucket is full, putting it into debt.
+        """
+        now = self.clock()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < min(tokens, self.rate):
+            return False
+
+        self.tokens -= tokens
+        return True
+
+
+class ServiceQuota(object):
+    """The log quota state of a single service."""
+
+    def __init__(self, bytes_per_second, lines_per_second, clock):
+        self.buckets = [(TokenBucket(bytes_per_second, clock), True)] if bytes_per_second else []
+        self.buckets += [(TokenBucket(lines_per_second, clock), False)] if lines_per_second else []
+        self.written_lines = 0
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+        self.sampled_lines = 0
+        self.tail = deque()
+        self.tail_size = 0
+
+
+class LogQuota(object):
+    """Per service log quotas - rate limits, sampling of the lines exceeding the limits and their tail."""
+
+    def __init__(self, bytes_per_second=0, lines_per_second=0, sample_rate=0, tail_bytes=0, clock=default_timer):
+        """Initialize the log quota.
+
+        :param int bytes_per_second: max log bytes (measured in characters) written per second per service,
+            0 for unlimited.
+        :param int lines_per_second: max log lines written per second per service, 0 for unlimited.
+        :param int sample_rate: write every `sample_rate` line exceeding the quota, 0 for dropping them all.
+        :param int tail_bytes: size of the most recent dropped lines kept per service, written once collection stops.
+        :param callable clock: returns the current time in seconds.
+        """
+        self.bytes_per_second = int(bytes_per_second or 0)
+        self.lines_per_second = int(lines_per_second or 0)
+        self.sample_rate = int(sample_rate or 0)
+        self.tail_bytes = int(tail_bytes or 0)
+        self.clock = clock
+
+        self.services = {}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Whether or not any limit is set."""
+        return bool(self.bytes_per_second or self.lines_per_second)
+
+    def admit(self, service, line, stream=None):
+        """Return True if the service log line should be written, counting it as dropped otherwise.
+
+        :param str service: the service (or container) name.
+        :param str line: the log line.
+        :param str stream: the line stream (stdout/ stderr), kept along with the dropped lines.
+        """
+        size = len(line)
+        with self.lock:
+            quota = self.services.get(service)
+            if quota is None:
+                quota = self.services[service] = ServiceQuota(self.bytes_per_second, self.lines_per_second,
+                                                              self.clock)
+
+            # All the buckets are consumed, even if one of them is empty - keeping them in sync
+            if all([bucket.consume(size if by_size else 1) for bucket, by_size in quota.buckets]):
+                quota.written_lines += 1
+                return True
+
+            quota.dropped_lines += 1
+            quota.dropped_bytes += size
+            if self.sample_rate and quota.dropped_lines % self.sample_rate == 0:
+                quota.sampled_lines += 1
+                return True
+
+            if self.tail_bytes:
+                quota.tail.append((stream, line))
+                quota.tail_size += size
+                while quota.tail_size > self.tail_bytes:
+                    quota.tail_size -= len(quota.tail.popleft()[1])
+
+            return False
+
+    def reset(self):
+        """Forget the services counters and dropped lines, e.g. once the environment is set up again."""
+        with self.lock:
+            self.services = {}
+
+    def get_summary(self):
+        """Return the services which exceeded their quota, with their lines & bytes counters.
+
+        :return dict: service name to its written, dropped and sampled lines counters, and dropped bytes.
+        """
+        with self.lock:
+            return {
+                service: {
+                    "written_lines": quota.written_lines,
+                    "dropped_lines": quota.dropped_lines,
+                    "dropped_bytes": quota.dropped_bytes,
+                    "sampled_lines": quota.sampled_lines,
+                }
+                for service, quota in sorted(self.services.items()) if quota.dropped_lines
+            }
+
+    def drain(self):
+        """Return the lines to write once the collection stops, emptying the dropped lines tails.
+
+        :return dict: service name to a list of (stream, line) tuples - a drop summary line followed by the tail.
+        """
+        summary = self.get_summary()
+        drained = {}
+        with self.lock:
+            for service, counters in summary.items():
+                quota = self.services[service]
+                log.warning("Service %s exceeded its log quota: %d lines (%d bytes) were dropped",
+                            service, counters["dropped_lines"], counters["dropped_bytes"])
+                message = (
+                    "[docker-test-tools] log quota exceeded by {dropped_lines} lines ({dropped_bytes} bytes), "
+                    "{sampled_lines} of them were written as samples, the last {tail} dropped lines follow"
+                ).format(tail=len(quota.tail), **counters)
+                drained[service] = [(None, message)] + list(quota.tail)
+                quota.tail.clear()
+                quota.tail_size = 0
+
+        return drained
@@ -0,0 +1,215 @@
+"""Parallel splitting of a combined log file into a file per service.
+
+An offline counterpart of `LogCollector._split_logs`, for large combined logs (and for reprocessing old
+CI artifacts). The combined log file is memory-mapped and partitioned into line aligned chunks, which are
+split in a process pool - each worker writes its chunk lines into a fragment file per service. The fragments
+are then concatenated in order, so the services log files are identical to the ones `_split_logs` writes.
+
+Common log messages are written only to the services seen before them, which a worker can't know for the
+services seen in earlier chunks - so each worker also returns its chunk common messages and, per service,
+the number of common messages preceding its first line in the chunk. The merge writes the missing common
+messages of the services seen in earlier chunks before their chunk fragment.
+
+Usage:
+
+>>> split_logs('logs/docker-tests.log', encoding='utf-8', workers=8)
+"""
+import io
+import os
+import mmap
+import shutil
+import logging
+import tempfile
+import multiprocessing
+
+import six
+
+from docker_test_tools import log_index
+from docker_test_tools.logs import LogCollector
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def get_chunks(log_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Return line aligned (start, end) byte ranges covering the log file.
+
+    :param str log_path: the combined log file path.
+    :param int chunk_size: the approximate chunk size in bytes, each chunk ends at the end of a line.
+    """
+    size = os.path.getsize(log_path)
+    if size == 0:
+        return []
+
+    chunks = []
+    with io.open(log_path, "rb") as log_file:
+        mapped = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start = 0
+            while start < size:
+                newline = mapped.find(b"\n", min(start + chunk_size, size) - 1)
+                end = size if newline == -1 else newline + 1
+                chunks.append((start, end))
+                start = end
+        finally:
+            mapped.close()
+
+    return chunks
+
+
+def iter_chunk_blocks(log_path, start, end, encoding, block_size=BLOCK_SIZE):
+    """Iterate over the decoded line aligned blocks of the log file chunk, as lists of lines.
+
+    Lines are split the same way reading the file in text mode does - using universal newlines, so a lone
+    carriage return ends a line as well.
+    """
+    with io.open(log_path, "rb") as log_file:
+        mapped = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            while start < end:
+                newline = mapped.find(b"\n", min(start + block_size, end) - 1, end)
+                block_end = end if newline == -1 else newline + 1
+                text = mapped[start:block_end].decode(encoding)
+                start = block_end
+
+                if six.u("\r") in text:
+                    text = text.replace(six.u("\r\n"), six.u("\n")).replace(six.u("\r"), six.u("\n"))
+
+                lines = text.split(six.u("\n"))
+                last_line = lines.pop()
+                lines = [line + six.u("\n") for line in lines]
+                if last_line:
+                    lines.append(last_line)
+
+                yield lines
+        finally:
+            mapped.close()
+
+
+def split_chunk(task):
+    """Split a log file chunk into a fragment file per service, the process pool worker.
+
+    :param tuple task: (chunk index, log path, start, end, encoding, fragments directory).
+    :return dict: the chunk `commons` messages, the `services` in order of appearance, and per service the
+        number of common messages preceding its first line in the chunk (`first_common`).
+    """
+    index, log_path, start, end, encoding, fragments_dir = task
+    fragments = {}
+    services = []
+    first_common = {}
+    commons = []
+    try:
+        for lines in iter_chunk_blocks(log_path, start, end, encoding):
+            # The block lines are buffered per service, and written once per block
+            buffers = dict((service_name, []) for service_name in fragments)
+            for log_line in lines:
+                # Write common log lines to all the log files seen so far in the chunk
+                if log_line.startswith(LogCollector.COMMON_LOG_PREFIX):
+                    common = six.u("\n{log_line}\n").format(log_line=log_line)
+                    commons.append(common.encode(encoding))
+                    for buffer in buffers.values():
+                        buffer.append(common)
+                    continue
+
+                separator_location = log_line.find(LogCollector.SEPARATOR)
+                if separator_location == -1:
+                    continue
+
+                service_name = log_line[:separator_location].strip()
+                if service_name not in buffers:
+                    fragments[service_name] = io.open(
+                        os.path.join(fragments_dir, "{0}.{1}".format(index, len(services))), "wb"
+                    )
+                    services.append(service_name)
+                    first_common[service_name] = len(commons)
+                    buffers[service_name] = []
+
+                buffers[service_name].append(log_line[separator_location + 1:])
+
+            for service_name, buffer in buffers.items():
+                fragments[service_name].write(six.u("").join(buffer).encode(encoding))
+    finally:
+        for fragment in fragments.values():
+            fragment.close()
+
+    return {"commons": commons, "services": services, "first_common": first_common}
+
+
+def split_logs(log_path, encoding="utf-8", workers=None, chunk_size=DEFAULT_CHUNK_SIZE, index_logs=False):
+    """Split the combined log file into a file per service, next to it.
+
+    :param str log_path: the combined log file path, see `LogCollector`.
+    :param str encoding: the log file encoding, must encode a newline as a single byte (e.g. utf-8).
+    :param int workers: the number of worker processes, defaults to the number of CPUs.
+    :param int chunk_size: the approximate chunk size in bytes.
+    :param bool index_logs: whether or not to index the services log files (see `log_index`).
+    :return list: the services names, in order of appearance.
+    """
+    if six.u("\n").encode(encoding) != b"\n":
+        raise RuntimeError("Can't split log files encoded using %s, a newline must be a single byte" % encoding)
+
+    workers = workers or multiprocessing.cpu_count()
+    log_dir = os.path.dirname(os.path.abspath(log_path))
+    chunks = get_chunks(log_path, chunk_size)
+
+    log.debug("Splitting log file %s in %d chunks using %d workers", log_path, len(chunks), workers)
+    fragments_dir = tempfile.mkdtemp(prefix=".split-", dir=log_dir)
+    try:
+        tasks = [(index, log_path, start, end, encoding, fragments_dir) for index, (start, end) in enumerate(chunks)]
+        if workers > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(workers, len(tasks)))
+            try:
+                results = pool.map(split_chunk, tasks, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [split_chunk(task) for task in tasks]
+
+        services = _merge_fragments(log_dir, fragments_dir, results)
+    finally:
+        shutil.rmtree(fragments_dir, ignore_errors=True)
+
+    if index_logs:
+        _index_services_logs(log_path, log_dir, services, encoding)
+
+    return services
+
+
+def _merge_fragments(log_dir, fragments_dir, results):
+    """Concatenate the chunks fragments into the services log files, return the services names."""
+    services = []
+    services_log_files = {}
+    try:
+        for index, result in enumerate(results):
+            # Services seen in earlier chunks miss the chunk common messages preceding their first chunk line
+            for service_name in services:
+                missing = result["commons"][:result["first_common"].get(service_name, len(result["commons"]))]
+                services_log_files[service_name].write(b"".join(missing))
+
+            for order, service_name in enumerate(result["services"]):
+                if service_name not in services_log_files:
+                    services_log_files[service_name] = io.open(os.path.join(log_dir, service_name + ".log"), "wb")
+                    services.append(service_name)
+
+                with io.open(os.path.join(fragments_dir, "{0}.{1}".format(index, order)), "rb") as fragment:
+                    shutil.copyfileobj(fragment, services_log_files[service_name])
+    finally:
+        for services_log_file in services_log_files.values():
+            services_log_file.close()
+
+    return services
+
+
+def _index_services_logs(log_path, log_dir, services, encoding):
+    """Index the split services log files."""
+    indexer = log_index.LogIndexer(encoding=encoding, work_dir=log_dir)
+    for service_name in services:
+        file_id = indexer.add_file(service_name + ".log", service_name)
+        with io.open(os.path.join(log_dir, service_name + ".log"), "r", encoding=encoding, newline="") as log_file:
+            for line in log_file:
+                indexer.feed(file_id, line)
+
+    indexer.write(log_index.get_index_path(log_path))
@@ -1,10 +1,17 @@
 import io
 import logging
 import os
+import re
+import subprocess
+import threading
+import time
 
 import datetime
 import six
 
+from docker_test_tools import log_index, utils
+from docker_test_tools.startup import PROJECT_LABEL, SERVICE_LABEL
+
 log = logging.getLogger(__name__)
 
 
@@ -19,45 +26,121 @@ class LogCollector(object):
     )
 
     def __init__(
-        self, log_path, encoding, compose
+        self, log_path, encoding, compose, shared=False, index_logs=False, quota=None
     ):
-        """Initialize the log collector."""
+        """Initialize the log collector.
+
+        :param bool shared: whether other processes write messages to the log file as well,
+            in which case the log file is written in append mode.
+        :param bool index_logs: whether or not to index the services log files while they are written.
+        :param LogQuota quota: per service log quota, in which case the logs are written through the collector.
+        """
         self.log_path = log_path
         self.encoding = encoding
         self.compose = compose
+        self.shared = shared
+        self.index_logs = index_logs
+        self.quota = quota if quota and quota.enabled else None
 
         self.logs_file = None
         self.logs_process = None
+        self.reader_thread = None
+        self.lock = threading.Lock()
 
     def start(self):
         """Start a log collection process which writes docker-compose logs into a file."""
         log.debug("Starting logs collection from environment containers")
-        self.logs_file = io.open(self.log_path, "w", encoding=self.encoding)
-        self.compose.start_logs_collector(self.logs_file)
+        self.reader_thread = None
+        if self.quota:
+            self.quota.reset()
+
+        if self.shared:
+            self.logs_file = io.open(self.log_path, "a", encoding=self.encoding)
+            self.logs_file.truncate(0)
+        else:
+            self.logs_file = io.open(self.log_path, "w", encoding=self.encoding)
+
+        if not self.quota:
+            self.compose.start_logs_collector(self.logs_file)
+            return
+
+        # The logs pass through the collector, which writes only the lines within the services quota
+        logs_process = self.compose.start_logs_collector(subprocess.PIPE)
+        self.reader_thread = threading.Thread(target=self._read_logs, args=(logs_process.stdout,))
+        self.reader_thread.daemon = True
+        self.reader_thread.start()
+
+    def attach(self):
+        """Attach to logs collected by another process, allowing to write common log messages."""
+        log.debug("Attaching to the environment containers logs")
+        self.logs_file = io.open(self.log_path, "a", encoding=self.encoding)
+
+    def detach(self):
+        """Detach from logs collected by another process."""
+        log.debug("Detaching from the environment containers logs")
+        if self.logs_file:
+            self.logs_file.close()
 
     def stop(self):
         """Stop the log collection process and close the log file."""
         log.debug("Stopping logs collection from environment containers")
         self.compose.stop_logs_collector()
 
+        if self.reader_thread:
+            self.reader_thread.join()
+            self._write_dropped_tails()
+
         if self.logs_file:
             self.logs_file.close()
             self._split_logs()
 
     def update(self, message):
         """Write a common log message to the container logs."""
-        self.logs_file.write(self.COMMON_LOG_FORMAT.format(message=message))
-        self.logs_file.flush()
+        with self.lock:
+            self.logs_file.write(self.COMMON_LOG_FORMAT.format(message=message))
+            self.logs_file.flush()
+
+    def _read_logs(self, logs_stream):
+        """Write the docker-compose log lines within the services quota into the log file."""
+        for raw_line in iter(logs_stream.readline, b""):
+            line = raw_line.decode(self.encoding, "replace")
+            separator_location = line.find(self.SEPARATOR)
+            if separator_location != -1 and not self.quota.admit(line[:separator_location].strip(),
+                                                                 line[separator_location + 1:]):
+                continue
+
+            with self.lock:
+                self.logs_file.write(line)
+                self.logs_file.flush()
+
+    def _write_dropped_tails(self):
+        """Write the last lines dropped by the services quota into the log file."""
+        with self.lock:
+            for service, lines in self.quota.drain().items():
+                # The drop summary is followed by the dropped lines, as read (starting after the separator)
+                summary, tail = lines[0][1], [line for _, line in lines[1:]]
+                for line in [six.u(" ") + summary] + tail:
+                    self.logs_file.write(six.u("{service} {separator}{line}\n").format(
+                        service=service, separator=self.SEPARATOR, line=line.rstrip("\n")))
 
     def _split_logs(self):
         """Split the collected docker-compose log file into a file per service.
 
         Each line in the collected log file is in a format of: 'service.name_number  | message'
         This method writes each line to it's service log file amd keeps only the message.
+        The services log files are indexed while they are written, if `index_logs` is set.
         """
         log.debug("Splitting log file into separated files per service")
         services_log_files = {}
         log_dir = os.path.dirname(self.log_path)
+        indexer = log_index.LogIndexer(encoding=self.encoding, work_dir=log_dir) if self.index_logs else None
+        indexed_files = {}
+
+        def write(service_name, text):
+            services_log_files[service_name].write(text)
+            if indexer:
+                indexer.feed(indexed_files[service_name], text)
+
         try:
             with io.open(
                 self.log_path, "r", encoding=self.encoding
@@ -65,10 +148,8 @@ class LogCollector(object):
                 for log_line in combined_log_file.readlines():
                     # Write common log lines to all log files
                     if log_line.startswith(self.COMMON_LOG_PREFIX):
-                        for services_log_file in services_log_files.values():
-                            services_log_file.write(
-                                six.u("\n{log_line}\n").format(log_line=log_line)
-                            )
+                        for service_name in services_log_files:
+                            write(service_name, six.u("\n{log_line}\n").format(log_line=log_line))
 
                     else:
                         # Write each log message to the appropriate log file (by prefix)
@@ -85,8 +166,446 @@ class LogCollector(object):
                                     "w",
                                     encoding=self.encoding,
                                 )
+                                if indexer:
+                                    indexed_files[service_name] = indexer.add_file(service_name + ".log", service_name)
 
-                            services_log_files[service_name].write(message)
+                            write(service_name, message)
         finally:
             for services_log_file in services_log_files.values():
                 services_log_file.close()
+
+        if indexer:
+            indexer.write(log_index.get_index_path(self.log_path))
+
+
+class StreamingLogCollector(object):
+    """Utility for containers log collection, streaming each container logs using the docker api.
+
+    Each project container stdout & stderr are followed separately, and written directly to per service
+    files - `<service>.log` and `<service>.stderr.log`, so there's no need to split a combined log afterwards.
+    The combined log file holds all the services log lines (prefixed by the service name) and the common messages.
+
+    Containers started after the collection began (e.g. recreated by `container_down`) are followed as well.
+    """
+
+    SEPARATOR = LogCollector.SEPARATOR
+    COMMON_LOG_FORMAT = LogCollector.COMMON_LOG_FORMAT
+
+    # Followed container streams, and the log file suffix of each
+    STREAMS = (("stdout", ".log"), ("stderr", ".stderr.log"))
+
+    # Time to wait for the streaming threads to finish once their streams are closed
+    STOP_TIMEOUT = 5
+
+    def __init__(self, log_path, encoding, docker_client, project_name, shared=False, index_logs=False,
+                 quota=None):
+        """Initialize the log collector.
+
+        :param docker_client: docker api client.
+        :param str project_name: the compose project name, whose containers logs are collected.
+        :param bool shared: whether other processes write messages to the log file as well,
+            in which case the log file is written in append mode.
+        :param bool index_logs: whether or not to index the services log files while they are written.
+        :param LogQuota quota: per service log quota, limiting the lines written to the log files.
+        """
+        self.log_path = log_path
+        self.encoding = encoding
+        self.docker_client = docker_client
+        self.quota = quota if quota and quota.enabled else None
+        self.project_name = project_name
+        self.shared = shared
+        self.index_logs = index_logs
+        self.indexer = None
+        self.indexed_files = {}
+
+        self.logs_file = None
+        self.events = None
+        self.services_log_files = {}
+        self.seen_containers = set()
+        self.streams = []
+        self.threads = []
+        self.stopping = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start streaming the project containers logs into the log files.
+
+        The collector may be started again once stopped (e.g. a recycled pool environment), so its state is reset.
+        """
+        log.debug("Starting logs streaming from environment containers")
+        with self.lock:
+            self.stopping = False
+            self.seen_containers = set()
+            self.streams = []
+            self.threads = []
+            self.services_log_files = {}
+            self.indexed_files = {}
+            self.indexer = log_index.LogIndexer(
+                encoding=self.encoding, work_dir=os.path.dirname(self.log_path)
+            ) if self.index_logs else None
+            if self.quota:
+                self.quota.reset()
+
+        if self.shared:
+            self.logs_file = io.open(self.log_path, "a", encoding=self.encoding)
+            self.logs_file.truncate(0)
+        else:
+            self.logs_file = io.open(self.log_path, "w", encoding=self.encoding)
+
+        # Watch for started containers before listing the existing ones, so no container is missed
+        project_filter = "{0}={1}".format(PROJECT_LABEL, self.project_name)
+        self.events = self.docker_client.events(
+            decode=True, filters={"type": "container", "event": "start", "label": project_filter}
+        )
+        self._start_thread(self._watch_events, self.events)
+
+        for container in self.docker_client.containers(all=True, filters={"label": project_filter}):
+            self.follow(container["Id"], (container.get("Labels") or {}).get(SERVICE_LABEL))
+
+    def follow(self, container_id, service, since=None):
+        """Stream the container logs, unless it's already followed.
+
+        :param str container_id: the container id.
+        :param str service: the container service name.
+        :param float since: stream only logs written after this time, for containers which were restarted.
+        """
+        with self.lock:
+            if self.stopping or (container_id in self.seen_containers and since is None):
+                return
+
+            self.seen_containers.add(container_id)
+
+        log.debug("Streaming the logs of service %s container %s", service, container_id)
+        for stream_name, _ in self.STREAMS:
+            self._start_thread(self._stream_logs, container_id, service or container_id, stream_name, since)
+
+    def attach(self):
+        """Attach to logs collected by another process, allowing to write common log messages."""
+        log.debug("Attaching to the environment containers logs")
+        self.logs_file = io.open(self.log_path, "a", encoding=self.encoding)
+
+    def detach(self):
+        """Detach from logs collected by another process."""
+        log.debug("Detaching from the environment containers logs")
+        if self.logs_file:
+            self.logs_file.close()
+
+    def stop(self):
+        """Stop streaming the containers logs and close the log files."""
+        log.debug("Stopping logs streaming from environment containers")
+        with self.lock:
+            self.stopping = True
+            streams = [self.events] + self.streams if self.events else list(self.streams)
+
+        for stream in streams:
+            try:
+                stream.close()
+            except:
+                log.debug("Failed closing logs stream", exc_info=True)
+
+        # Threads may start following containers while others are joined
+        deadline = time.time() + self.STOP_TIMEOUT
+        index = 0
+        while index < len(self.threads):
+            self.threads[index].join(max(deadline - time.time(), 0))
+            index += 1
+
+        if self.quota:
+            for service, lines in self.quota.drain().items():
+                for stream_name, line in lines:
+                    self._write_lines(service, stream_name or "stdout", [line], encoded=False)
+
+        with self.lock:
+            for services_log_file in self.services_log_files.values():
+                services_log_file.close()
+            self.services_log_files = {}
+
+            if self.logs_file:
+                self.logs_file.close()
+
+            if self.indexer:
+                self.indexer.write(log_index.get_index_path(self.log_path))
+
+    def update(self, message):
+        """Write a common log message to the combined log and to the services log files."""
+        common_message = self.COMMON_LOG_FORMAT.format(message=message)
+        with self.lock:
+            self.logs_file.write(common_message)
+            self.logs_file.flush()
+            for key in self.services_log_files:
+                self._write_service_file(key, common_message)
+
+    def _write_service_file(self, key, text):
+        """Write the text to a service log file, indexing it if enabled. Called while holding the lock."""
+        self.services_log_files[key].write(text)
+        if self.indexer:
+            self.indexer.feed(self.indexed_files[key], text)
+
+    def _start_thread(self, target, *args):
+        """Run the target in a daemon thread, so it doesn't block the interpreter exit."""
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def _watch_events(self, events):
+        """Follow the project containers once they are started."""
+        try:
+            for event in events:
+                container_id = event.get("Actor", {}).get("ID", event.get("id"))
+                service = event.get("Actor", {}).get("Attributes", {}).get(SERVICE_LABEL)
+                # Restarted containers logs stream from the restart, avoiding writing their logs twice
+                since = None
+                if container_id in self.seen_containers:
+                    since = event["timeNano"] / 1e9 if "timeNano" in event else event.get("time")
+                self.follow(container_id, service, since=since)
+        except:
+            # Closing the events stream may raise while it's being read
+            log.debug("Stopped watching the environment containers events", exc_info=True)
+
+    def _stream_logs(self, container_id, service, stream_name, since=None):
+        """Write the container stream log lines to the service log file, until the container stops."""
+        try:
+            stream = self.docker_client.logs(
+                container_id,
+                stdout=stream_name == "stdout",
+                stderr=stream_name == "stderr",
+                stream=True,
+                follow=True,
+                timestamps=True,
+                since=since,
+            )
+            with self.lock:
+                self.streams.append(stream)
+                if self.stopping:
+                    stream.close()
+                    return
+
+            # Chunks aren't necessarily aligned to lines, keep the partial line until it's completed
+            pending = b""
+            for chunk in stream:
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                self._write_lines(service, stream_name, lines)
+
+            if pending:
+                self._write_lines(service, stream_name, [pending])
+        except:
+            # Closing the logs stream may raise while it's being read
+            log.debug("Stopped streaming the logs of container %s %s", container_id, stream_name, exc_info=True)
+
+    def _write_lines(self, service, stream_name, lines, encoded=True):
+        """Write the log lines to the service stream log file and to the combined log file.
+
+        :param bool encoded: whether the lines are encoded (as read from the stream) and subject to the quota.
+        """
+        if encoded:
+            lines = [line.decode(self.encoding, "replace") for line in lines]
+
+        if self.quota and encoded:
+            lines = [line for line in lines if self.quota.admit(service, line, stream_name)]
+
+        if not lines:
+            return
+
+        with self.lock:
+            if self.logs_file is None or self.logs_file.closed:
+                return
+
+            key = (service, stream_name)
+            if key not in self.services_log_files:
+                file_name = service + dict(self.STREAMS)[stream_name]
+                self.services_log_files[key] = io.open(
+                    os.path.join(os.path.dirname(self.log_path), file_name), "w", encoding=self.encoding
+                )
+                if self.indexer:
+                    self.indexed_files[key] = self.indexer.add_file(file_name, service, stream_name)
+
+            self._write_service_file(key, six.u("").join(line + six.u("\n") for line in lines))
+            self.logs_file.write(six.u("").join(
+                six.u("{service} {separator} {line}\n").format(service=service, separator=self.SEPARATOR, line=line)
+                for line in lines
+            ))
+            self.logs_file.flush()
+
+
+class LogWaiter(object):
+    """A log pattern awaited in a service log lines."""
+
+    def __init__(self, service, pattern, project_name=None):
+        """Initialize the log waiter.
+
+        :param str service: service name as it appears in the docker compose file.
+        :param pattern: regular expression (string or compiled) searched in the service log lines.
+        :param str project_name: the compose project name, which may prefix the service container names.
+        """
+        self.service = service
+        self.regex = re.compile(pattern) if isinstance(pattern, six.string_types) else pattern
+        self.service_regex = utils.get_container_name_regex(service, project_name)
+        self.match = None
+        self.event = threading.Event()
+
+    def feed(self, source, message):
+        """Match a log line, return True if it matches the waiter service & pattern.
+
+        :param str source: the log line prefix - the service or container name.
+        :param str message: the log line message.
+        """
+        if not self.service_regex.match(source) or not self.regex.search(message):
+            return False
+
+        self.match = message.strip()
+        self.event.set()
+        return True
+
+
+class LogTailer(object):
+    """Incremental reader of the combined log file, shared by concurrent log waiters.
+
+    Each read continues from where the previous one stopped, and the new lines are matched against the patterns
+    of all the registered waiters - so the log is read once, no matter how many waiters are waiting on it.
+    A waiter starting from an earlier marker scans the lines between its marker and the shared read position
+    once, before joining the shared reads.
+    """
+
+    # Interval (in seconds) between reads, while waiting for a log line
+    POLL_INTERVAL = 0.1
+
+    # Maximal number of bytes read at once, so large logs aren't loaded into memory
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, log_path, encoding, project_name=None):
+        """Initialize the log tailer.
+
+        :param str log_path: the combined log file path.
+        :param str project_name: the compose project name, which may prefix the service container names.
+        """
+        self.log_path = log_path
+        self.encoding = encoding
+        self.project_name = project_name
+
+        self.log_file = None
+        self.position = 0
+        self.pending = b""
+        self.waiters = []
+        self.lock = threading.Lock()
+
+    def get_marker(self):
+        """Return a marker of the current log position, to wait for lines written after it."""
+        with self.lock:
+            self._read()
+            return self.position - len(self.pending)
+
+    def watch(self, service, pattern, since=None):
+        """Register a waiter for a log line of the service matching the pattern.
+
+        :param str service: service name as it appears in the docker compose file.
+        :param pattern: regular expression (string or compiled) searched in the service log lines.
+        :param int since: log marker (see `get_marker`) to search from, the log start if not given.
+        :return LogWaiter: the registered waiter.
+        """
+        waiter = LogWaiter(service=service, pattern=pattern, project_name=self.project_name)
+        with self.lock:
+            self._read()
+            marker = self.position - len(self.pending)
+            since = since or 0
+            if since < marker:
+                self._scan(waiter, since, marker)
+
+            if not waiter.event.is_set():
+                self.waiters.append(waiter)
+
+        return waiter
+
+    def unwatch(self, waiter):
+        """Unregister the waiter."""
+        with self.lock:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def poll(self):
+        """Read the lines written since the previous read, and match them against the registered waiters."""
+        with self.lock:
+            self._read()
+
+    def wait(self, waiter, timeout, interval=POLL_INTERVAL):
+        """Wait for the waiter pattern to match, return the matching log message or None on timeout.
+
+        :param LogWaiter waiter: a registered waiter (see `watch`).
+        :param float timeout: timeout (in seconds) for the log line to be written.
+        :param float interval: interval (in seconds) between reads.
+        """
+        deadline = time.time() + timeout
+        try:
+            while not waiter.event.is_set():
+                self.poll()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+                waiter.event.wait(min(interval, remaining))
+        finally:
+            self.unwatch(waiter)
+
+        return waiter.match
+
+    def _read(self):
+        """Read the new log lines and dispatch them to the waiters."""
+        if self.log_file is None:
+            if not os.path.exists(self.log_path):
+                return
+
+            self.log_file = io.open(self.log_path, "rb")
+
+        # The log file is truncated when the environment is set up again
+        if os.fstat(self.log_file.fileno()).st_size < self.position:
+            self.position = 0
+            self.pending = b""
+            self.log_file.seek(0)
+
+        while True:
+            data = self.log_file.read(self.READ_SIZE)
+            if not data:
+                return
+
+            self.position += len(data)
+            lines = (self.pending + data).split(b"\n")
+            self.pending = lines.pop()
+            if self.waiters:
+                self.waiters = self._dispatch(lines, self.waiters)
+
+    def _scan(self, waiter, start, end):
+        """Match the log lines between the given positions against the waiter."""
+        waiters = [waiter]
+        pending = b""
+        with io.open(self.log_path, "rb") as log_file:
+            log_file.seek(start)
+            remaining = end - start
+            while remaining > 0 and waiters:
+                data = log_file.read(min(self.READ_SIZE, remaining))
+                if not data:
+                    break
+
+                remaining -= len(data)
+                lines = (pending + data).split(b"\n")
+                pending = lines.pop()
+                waiters = self._dispatch(lines, waiters)
+
+        if pending and waiters:
+            self._dispatch([pending], waiters)
+
+    def _dispatch(self, lines, waiters):
+        """Match the log lines against the waiters, return the waiters which are still waiting."""
+        for line in lines:
+            line = line.decode(self.encoding, "replace")
+            separator_location = line.find(LogCollector.SEPARATOR)
+            if line.startswith(LogCollector.COMMON_LOG_PREFIX) or separator_location == -1:
+                continue
+
+            source = line[:separator_location].strip()
+            message = line[separator_location + 1:]
+            waiters = [waiter for waiter in waiters if not waiter.feed(source, message)]
+            if not waiters:
+                break
+
+        return waiters
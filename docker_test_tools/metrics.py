@@ -0,0 +1,196 @@
+import json
+import bisect
+import logging
+import functools
+import threading
+from timeit import default_timer
+
+log = logging.getLogger(__name__)
+
+# Histogram buckets upper bounds (in seconds), the last bucket holds all the slower operations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MetricsObserver(object):
+    """Interface for observers of the controllers operations latency."""
+
+    def observe(self, operation, duration, success):
+        """Called after each measured operation finishes.
+
+        :param str operation: the operation name (e.g. kill_container).
+        :param float duration: the operation duration (in seconds).
+        :param bool success: whether or not the operation finished without raising.
+        """
+        raise NotImplementedError()
+
+
+class Metrics(object):
+    """Dispatches the controllers operations measurements to the registered observers.
+
+    Without observers, measured operations are called as is - without being timed.
+
+    Usage:
+
+    >>> histogram = HistogramObserver()
+    >>> controller = EnvironmentController.from_config(config, metrics=Metrics([histogram]))
+    >>> # run tests
+    >>> print(histogram.to_text())
+    """
+
+    def __init__(self, observers=None):
+        """Initialize the metrics dispatcher.
+
+        :param list observers: the metrics observers.
+        """
+        self.observers = list(observers or [])
+
+    def add_observer(self, observer):
+        """Register an observer.
+
+        :param MetricsObserver observer: the observer to notify on measured operations.
+        """
+        self.observers.append(observer)
+
+    def observe(self, operation, duration, success):
+        """Notify the observers of a measured operation."""
+        for observer in self.observers:
+            try:
+                observer.observe(operation=operation, duration=duration, success=success)
+            except:
+                log.warning("Metrics observer %s failed, skipping", observer, exc_info=True)
+
+
+def timed(operation):
+    """Decorate a controller method to measure its latency using the controller `metrics`.
+
+    :param str operation: the operation name reported to the observers.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.observers:
+                return method(self, *args, **kwargs)
+
+            start = default_timer()
+            try:
+                result = method(self, *args, **kwargs)
+            except:
+                metrics.observe(operation=operation, duration=default_timer() - start, success=False)
+                raise
+
+            metrics.observe(operation=operation, duration=default_timer() - start, success=True)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class HistogramObserver(MetricsObserver):
+    """In-memory latency histogram per operation."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize the histogram.
+
+        :param tuple buckets: sorted buckets upper bounds (in seconds).
+        """
+        self.buckets = tuple(buckets)
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, operation, duration, success):
+        """Add the operation duration to its histogram."""
+        with self.lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = {
+                    "counts": [0] * (len(self.buckets) + 1),
+                    "count": 0,
+                    "errors": 0,
+                    "sum": 0.0,
+                    "min": duration,
+                    "max": duration,
+                }
+
+            histogram["counts"][bisect.bisect_left(self.buckets, duration)] += 1
+            histogram["count"] += 1
+            histogram["errors"] += 0 if success else 1
+            histogram["sum"] += duration
+            histogram["min"] = min(histogram["min"], duration)
+            histogram["max"] = max(histogram["max"], duration)
+
+    def get_percentile(self, operation, percentile):
+        """Return the estimated operation duration percentile.
+
+        The estimation is the upper bound of the bucket holding the percentile (or the max duration
+        if it's lower), so it's as accurate as the buckets resolution.
+
+        :param str operation: the operation name.
+        :param float percentile: the percentile to estimate (0-100).
+        """
+        with self.lock:
+            histogram = self.histograms[operation]
+            rank = max(percentile / 100.0 * histogram["count"], 1)
+            total = 0
+            for index, count in enumerate(histogram["counts"]):
+                total += count
+                if total >= rank:
+                    break
+
+            upper_bound = self.buckets[index] if index < len(self.buckets) else histogram["max"]
+            return min(upper_bound, histogram["max"])
+
+    def get_summary(self):
+        """Return the operations latency summary.
+
+        :return dict: operation name to its count, errors, mean, min, max, percentiles and buckets counts.
+        """
+        summary = {}
+        for operation in sorted(self.histograms):
+            with self.lock:
+                histogram = dict(self.histograms[operation], counts=list(self.histograms[operation]["counts"]))
+
+            summary[operation] = {
+                "count": histogram["count"],
+                "errors": histogram["errors"],
+                "mean": histogram["sum"] / histogram["count"],
+                "min": histogram["min"],
+                "max": histogram["max"],
+                "p50": self.get_percentile(operation, 50),
+                "p90": self.get_percentile(operation, 90),
+                "p99": self.get_percentile(operation, 99),
+                "buckets": [
+                    {"le": bound, "count": count}
+                    for bound, count in zip(self.buckets + ("+Inf",), histogram["counts"])
+                ],
+            }
+
+        return summary
+
+    def to_json(self):
+        """Return the operations latency summary as JSON."""
+        return json.dumps(self.get_summary(), indent=2)
+
+    def to_text(self):
+        """Return the operations latency summary as a text table (durations in milliseconds)."""
+        lines = ["{0:<30} {1:>8} {2:>8} {3:>10} {4:>10} {5:>10} {6:>10} {7:>10}".format(
+            "operation", "count", "errors", "mean", "p50", "p90", "p99", "max"
+        )]
+        for operation, summary in sorted(self.get_summary().items()):
+            lines.append("{0:<30} {1:>8} {2:>8} {3:>10.2f} {4:>10.2f} {5:>10.2f} {6:>10.2f} {7:>10.2f}".format(
+                operation, summary["count"], summary["errors"], summary["mean"] * 1000, summary["p50"] * 1000,
+                summary["p90"] * 1000, summary["p99"] * 1000, summary["max"] * 1000
+            ))
+
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        """Write the operations latency summary as JSON to the given path."""
+        with open(path, "w") as target_file:
+            target_file.write(self.to_json())
+
+    def write_text(self, path):
+        """Write the operations latency summary as a text table to the given path."""
+        with open(path, "w") as target_file:
+            target_file.write(self.to_text() + "\n")
@@ -0,0 +1,282 @@
+"""OpenMetrics exporter of the collected containers stats, so long runs can be scraped live.
+
+The exporter tails the stats file while the stats are collected (by either stats backend), and exports the
+containers stats in the OpenMetrics text format - written to a file every `interval` seconds, and optionally
+served by a local `/metrics` HTTP endpoint while the environment is up:
+
+* `dtt_container_cpu_percent` and `dtt_container_memory_bytes` gauges - the last sample of each container.
+* `dtt_container_network_receive_bytes`, `dtt_container_network_transmit_bytes`, `dtt_container_block_read_bytes`
+  and `dtt_container_block_write_bytes` counters - the bytes received, transmitted, read & written by each container
+  while each test ran.
+
+The samples are labelled by their container, service and the test which ran while they were sampled (see the
+controller `update_plugins` test markers), empty outside of the tests.
+"""
+import os
+import re
+import logging
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+from docker_test_tools.log_index import WORKER_TAG_PATTERN, get_section_name
+from docker_test_tools.stats import StatsTail
+
+log = logging.getLogger(__name__)
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+METRICS_PATH = "/metrics"
+
+# Exported metric families - (name, type, unit, help, sample field)
+GAUGES = (
+    ("dtt_container_cpu_percent", "gauge", "percent", "Used CPU percentage, 100 per fully used CPU.", "cpu"),
+    ("dtt_container_memory_bytes", "gauge", "bytes", "Used memory, excluding the inactive page cache.", "ram"),
+)
+COUNTERS = (
+    ("dtt_container_network_receive_bytes", "counter", "bytes", "Network bytes received while the test ran.", "net"),
+    ("dtt_container_network_transmit_bytes", "counter", "bytes", "Network bytes transmitted while the test ran.",
+     "net_tx"),
+    ("dtt_container_block_read_bytes", "counter", "bytes", "Block device bytes read while the test ran.", "block"),
+    ("dtt_container_block_write_bytes", "counter", "bytes", "Block device bytes written while the test ran.",
+     "block_write"),
+)
+
+
+def get_metrics_file_path(target_dir_path):
+    """Return the path of the OpenMetrics file exported into the target directory."""
+    return os.path.join(target_dir_path, "stats", "metrics.txt")
+
+
+def get_service_name(container, project_name=None):
+    """Return the service name of the container (e.g. 'service' of 'project-service-1').
+
+    :param str container: the container name.
+    :param str project_name: the compose project name, which may prefix the service container names.
+    """
+    if project_name and re.match(r"^{0}[-_].".format(re.escape(project_name)), container):
+        container = container[len(project_name) + 1:]
+
+    return re.sub(r"[-_]\d+$", "", container)
+
+
+def escape_label_value(value):
+    """Escape the label value, as required by the OpenMetrics text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name, labels, value):
+    """Return an OpenMetrics sample line.
+
+    :param str name: the sample metric name.
+    :param list labels: the sample (label name, label value) pairs.
+    :param value: the sample numeric value.
+    """
+    return "{name}{{{labels}}} {value}".format(
+        name=name,
+        labels=",".join('{0}="{1}"'.format(label, escape_label_value(value)) for label, value in labels),
+        value=repr(float(value)) if isinstance(value, float) else int(value),
+    )
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """HTTP requests handler, serving the exporter metrics."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+
+        body = self.server.exporter.scrape().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log.debug("OpenMetrics request: " + format, *args)
+
+
+class MetricsServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server of the exporter metrics, handling each request in a daemon thread."""
+
+    daemon_threads = True
+
+
+class OpenMetricsExporter(object):
+    """Environment plugin exporting the live containers stats in the OpenMetrics text format."""
+
+    def __init__(self, stats_file_path, metrics_file_path=None, port=None, host="127.0.0.1", project_name=None,
+                 interval=1):
+        """Initialize the exporter.
+
+        :param str stats_file_path: the collected stats file path (see `StatsCollector`).
+        :param str metrics_file_path: the exported OpenMetrics file path, None for not writing a file.
+        :param int port: the `/metrics` HTTP endpoint port (0 for any free port), None for not serving it.
+        :param str host: the `/metrics` HTTP endpoint address.
+        :param str project_name: the compose project name, which may prefix the service container names.
+        :param float interval: interval (in seconds) between writes of the OpenMetrics file.
+        """
+        self.metrics_file_path = metrics_file_path
+        self.port = port
+        self.host = host
+        self.project_name = project_name
+        self.interval = float(interval)
+
+        self.test = ""
+        self.last_samples = {}
+        self.last_counters = {}
+        self.counters = {}
+
+        self.tail = StatsTail(stats_file_path)
+        self.server = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        """The `/metrics` HTTP endpoint url, None unless it's served."""
+        if not self.server:
+            return None
+
+        return "http://{0}:{1}{2}".format(self.host, self.port, METRICS_PATH)
+
+    def start(self):
+        """Start exporting the stats, from the beginning of the stats file."""
+        log.debug("Starting the environment stats OpenMetrics exporter")
+        self.tail.seek(0)
+        self.test = ""
+        self.last_samples = {}
+        self.last_counters = {}
+        self.counters = {}
+
+        if self.port is not None:
+            self.server = MetricsServer((self.host, self.port), MetricsHandler)
+            self.server.exporter = self
+            self.port = self.server.server_address[1]
+            self._start_thread(self.server.serve_forever)
+            log.info("Serving the environment %s stats OpenMetrics on %s", self.project_name or "", self.url)
+
+        self.stop_event.clear()
+        self.thread = self._start_thread(self._export)
+
+    def stop(self):
+        """Stop exporting the stats, writing the final OpenMetrics file."""
+        log.debug("Stopping the environment stats OpenMetrics exporter")
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        if self.metrics_file_path:
+            self.write()
+
+        with self.lock:
+            self.tail.close()
+
+    def attach(self):
+        """The stats are exported by the process which set the environment up."""
+
+    def detach(self):
+        """The stats are exported by the process which set the environment up."""
+
+    def update(self, message):
+        """Common stats messages are written by the stats collector, and read from the stats file."""
+
+    def poll(self):
+        """Read the new stats samples."""
+        with self.lock:
+            self._read()
+
+    def scrape(self):
+        """Read the new stats samples, and return the OpenMetrics text."""
+        with self.lock:
+            self._read()
+            return self.render()
+
+    def write(self):
+        """Write the current OpenMetrics text to the metrics file."""
+        text = self.scrape()
+        dir_path = os.path.dirname(self.metrics_file_path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+
+        # Write a temporary file and rename it, so scrapers never read a partially written file
+        temp_path = self.metrics_file_path + ".tmp"
+        with open(temp_path, "wb") as metrics_file:
+            metrics_file.write(text.encode("utf-8"))
+
+        os.rename(temp_path, self.metrics_file_path)
+
+    def render(self):
+        """Return the OpenMetrics text of the stats read so far. Called while holding the lock."""
+        lines = []
+        for name, metric_type, unit, description, field in GAUGES + COUNTERS:
+            lines.extend([
+                "# TYPE {0} {1}".format(name, metric_type),
+                "# UNIT {0} {1}".format(name, unit),
+                "# HELP {0} {1}".format(name, description),
+            ])
+            if metric_type == "gauge":
+                for container in sorted(self.last_samples):
+                    test, sample = self.last_samples[container]
+                    lines.append(format_sample(name, self._get_labels(container, test), sample[field]))
+
+            else:
+                for container, test in sorted(self.counters):
+                    lines.append(format_sample(name + "_total", self._get_labels(container, test),
+                                               self.counters[(container, test)][field]))
+
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _get_labels(self, container, test):
+        """Return the labels of the container samples, sampled while the test ran."""
+        return [
+            ("container", container),
+            ("service", get_service_name(container, self.project_name)),
+            ("test", test),
+        ]
+
+    def _read(self):
+        """Read the new stats samples into the metrics. Called while holding the lock."""
+        for entry in self.tail.read():
+            if "name" not in entry:
+                self.test = get_section_name(WORKER_TAG_PATTERN.sub("", entry["test"])) or ""
+                continue
+
+            container = entry["name"]
+            self.last_samples[container] = (self.test, entry)
+
+            # Counters accumulate the growth of the container cumulative stats, restarted containers start over
+            last_counters = self.last_counters.get(container, {})
+            counters = self.counters.setdefault((container, self.test), {})
+            for _, _, _, _, field in COUNTERS:
+                growth = entry[field] - last_counters.get(field, 0)
+                counters[field] = counters.get(field, 0) + (growth if growth >= 0 else entry[field])
+
+            self.last_counters[container] = {field: entry[field] for _, _, _, _, field in COUNTERS}
+
+    def _export(self):
+        """Read the stats samples (and write the OpenMetrics file) until stopped."""
+        while not self.stop_event.wait(self.interval):
+            try:
+                if self.metrics_file_path:
+                    self.write()
+                else:
+                    self.poll()
+            except Exception:
+                log.warning("Failed exporting the environment stats OpenMetrics", exc_info=True)
+
+    def _start_thread(self, target):
+        """Run the target in a daemon thread, so it doesn't block the interpreter exit."""
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -1,12 +1,24 @@
 # pylint: disable=unused-argument
+import os
+import sys
+import unittest
+
+from nose2 import result
 from nose2.events import Plugin
 
+from docker_test_tools import utils, workers
 from docker_test_tools.config import Config
 from docker_test_tools.environment import EnvironmentController
 
 
 class EnvironmentPlugin(Plugin):
-    """Nose2 plugin, used for managing docker environment operations."""
+    """Nose2 plugin, used for managing docker environment operations.
+
+    When `isolate-workers` is configured and tests run using the nose2 multiprocess plugin,
+    each test process sets up its own environment, under its own compose project.
+
+    When all the collected tests declare their `REQUIRED_SERVICES`, only the services they need are started.
+    """
     configSection = 'environment'
     commandLineSwitch = (None, 'environment', 'Enable docker test tools environment')
 
@@ -14,23 +26,64 @@ class EnvironmentPlugin(Plugin):
         self.controller = None
         super(EnvironmentPlugin, self).__init__(*args, **kwargs)
 
-    def startTestRun(self, event):
-        """Sets up the environment using docker commands."""
-        config = Config(
+    def get_config(self):
+        """Return the environment configuration."""
+        return Config(
             log_path=self.config.as_str('log-path', Config.DEFAULT_LOG_PATH),
             project_name=self.config.as_str('project-name', Config.DEFAULT_PROJECT_NAME),
             collect_stats=self.config.as_bool('collect-stats', Config.DEFAULT_COLLECT_STATS),
             reuse_containers=self.config.as_bool('reuse-containers', Config.DEFAULT_REUSE_CONTAINERS),
             docker_compose_path=self.config.as_str('docker-compose-path', Config.DEFAULT_DOCKER_COMPOSE_PATH),
-            docker_compose_command=self.config.as_str('docker-compose-command', Config.DEFAULT_DOCKER_COMPOSE_COMMAND)
+            compose_profiles=self.config.as_str('compose-profiles', Config.DEFAULT_COMPOSE_PROFILES),
+            docker_compose_command=self.config.as_str('docker-compose-command', Config.DEFAULT_DOCKER_COMPOSE_COMMAND),
+            isolate_workers=self.config.as_bool('isolate-workers', Config.DEFAULT_ISOLATE_WORKERS),
+            ordered_startup=self.config.as_bool('ordered-startup', Config.DEFAULT_ORDERED_STARTUP),
+            profile=self.config.as_bool('profile', Config.DEFAULT_PROFILE),
+            chrome_trace=self.config.as_bool('chrome-trace', Config.DEFAULT_CHROME_TRACE),
+            stream_logs=self.config.as_bool('stream-logs', Config.DEFAULT_STREAM_LOGS),
+            index_logs=self.config.as_bool('index-logs', Config.DEFAULT_INDEX_LOGS),
+            log_bytes_per_second=self.config.as_int('log-bytes-per-second', Config.DEFAULT_LOG_BYTES_PER_SECOND),
+            log_lines_per_second=self.config.as_int('log-lines-per-second', Config.DEFAULT_LOG_LINES_PER_SECOND),
+            log_sample_rate=self.config.as_int('log-sample-rate', Config.DEFAULT_LOG_SAMPLE_RATE),
+            log_tail_bytes=self.config.as_int('log-tail-bytes', Config.DEFAULT_LOG_TAIL_BYTES),
+            stats_backend=self.config.as_str('stats-backend', Config.DEFAULT_STATS_BACKEND),
+            stats_frequency=self.config.as_int('stats-frequency', Config.DEFAULT_STATS_FREQUENCY),
+            ram_leak_slope=self.config.as_int('ram-leak-slope', Config.DEFAULT_RAM_LEAK_SLOPE),
+            resource_limits=self.config.as_str('resource-limits', Config.DEFAULT_RESOURCE_LIMITS),
+            watchdog_interval=self.config.as_float('watchdog-interval', Config.DEFAULT_WATCHDOG_INTERVAL),
+            export_openmetrics=self.config.as_bool('export-openmetrics', Config.DEFAULT_EXPORT_OPENMETRICS),
+            openmetrics_port=self.config.as_int('openmetrics-port', Config.DEFAULT_OPENMETRICS_PORT),
         )
-        self.controller = EnvironmentController(
-            log_path=config.log_path,
-            project_name=config.project_name,
-            collect_stats=config.collect_stats,
-            compose_path=config.docker_compose_path,
-            compose_command=config.docker_compose_command,
-            reuse_containers=config.reuse_containers,
+
+    def is_multiprocess(self):
+        """Return True if the tests are run in subprocesses by the nose2 multiprocess plugin."""
+        return any(type(plugin).__name__ == 'MultiProcess' for plugin in self.session.plugins)
+
+    def startTestRun(self, event):
+        """Sets up the environment using docker commands."""
+        config = self.get_config()
+        if config.isolate_workers and self.is_multiprocess():
+            # Each test process sets up its own environment
+            return
+
+        self.controller = EnvironmentController.from_config(config)
+        self.controller.set_required_services(get_required_services(event.suite))
+        self.controller.setup()
+
+    def registerInSubprocess(self, event):
+        """Run the plugin in the test processes, in case each process sets up its own environment."""
+        if self.get_config().isolate_workers:
+            event.pluginClasses.append(self.__class__)
+
+    def startSubprocess(self, event):
+        """Sets up the test process isolated environment."""
+        config = self.get_config()
+        worker_id = 'mp{0}'.format(os.getpid())
+        self.controller = EnvironmentController.from_config(
+            config,
+            log_path=workers.get_isolated_log_path(config.log_path, worker_id),
+            project_name=workers.get_isolated_project_name(config.project_name, worker_id),
+            ephemeral_ports=True,
         )
         self.controller.setup()
 
@@ -39,12 +92,64 @@ class EnvironmentPlugin(Plugin):
 
         - Assign the controller object to the test.
         - Write a test started log message to the main log file.
+        - Reset the resource limits violations, the test fails on the violations found while it runs.
         """
+        if not self.controller:
+            return
+
         event.test.controller = self.controller
         test_name = event.test.id().split('.')[-1]
         self.controller.update_plugins(test_name)
 
+        # Resource limits violations found before the test started aren't reported to it
+        if self.controller.resource_watchdog:
+            self.controller.resource_watchdog.check()
+
+    def setTestOutcome(self, event):
+        """Fail the passed tests if the environment containers exceeded their resource limits while they ran.
+
+        Called before the outcome is reported, the violations are drained whatever the test outcome is.
+        """
+        if not self.controller or not self.controller.resource_watchdog or event.outcome == result.SUBTEST:
+            return
+
+        watchdog = self.controller.resource_watchdog
+        violations = watchdog.check()
+        if violations and event.outcome == result.PASS:
+            try:
+                raise AssertionError(watchdog.format_violations(violations))
+            except AssertionError:
+                event.exc_info = sys.exc_info()
+
+            event.outcome = result.FAIL
+            event.expected = False
+
+    def stopSubprocess(self, event):
+        """Tears down the test process isolated environment."""
+        if self.controller:
+            self.controller.teardown()
+
     def stopTestRun(self, event):
         """Tears down the environment using docker commands."""
         if self.controller:
             self.controller.teardown()
+
+
+def get_required_services(suite):
+    """Return the services required by the suite tests, None if all the services are required.
+
+    :param unittest.TestSuite suite: the tests suite.
+    """
+    return utils.get_required_services(
+        test.REQUIRED_SERVICES for test in _iter_tests(suite) if hasattr(test, 'REQUIRED_SERVICES')
+    )
+
+
+def _iter_tests(suite):
+    """Iterate over the test cases of a (nested) test suite."""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for sub_test in _iter_tests(test):
+                yield sub_test
+        else:
+            yield test
@@ -0,0 +1,156 @@
+import os
+import logging
+from multiprocessing.pool import ThreadPool
+
+from six.moves import queue
+
+from docker_test_tools import workers
+from docker_test_tools.environment import EnvironmentController
+
+log = logging.getLogger(__name__)
+
+
+class EnvironmentPool(object):
+    """Pool of pre-started environments, used for handing out fresh environments quickly.
+
+    The pool keeps `size` environments, each under its own compose project. Environments are set up
+    in the background, and recycled (torn down & set up again) in the background once released,
+    so consumers don't wait for a cold start as long as a ready environment is available.
+    Each set up (lease) of an environment collects its logs into its own 'lease<number>' sub directory.
+
+    Usage:
+
+    >>> pool = EnvironmentPool.from_config(config, size=2)
+    >>> pool.start()
+    >>> controller = pool.acquire()
+    >>> # use a fresh environment
+    >>> pool.release(controller)
+    >>> pool.close()
+    """
+
+    # Time (seconds) an environment may take to be torn down & set up, excluding its services checks
+    DEFAULT_SETUP_TIMEOUT = 10 * 60
+
+    def __init__(self, controllers, checks_interval=1, checks_timeout=60, setup_timeout=DEFAULT_SETUP_TIMEOUT):
+        """Initialize the environment pool.
+
+        :param list controllers: the pool environments controllers, each using a distinct project name.
+        :param int checks_interval: interval (in seconds) between services checks of an environment set up.
+        :param int checks_timeout: timeout (in seconds) for the services checks of an environment set up.
+        :param int setup_timeout: time (in seconds) an environment may take to be torn down & set up.
+        """
+        self.controllers = controllers
+        self.checks_interval = checks_interval
+        self.checks_timeout = checks_timeout
+        self.setup_timeout = setup_timeout
+        self.log_paths = {controller.project_name: controller.log_path for controller in controllers}
+        self.leases = dict.fromkeys(self.log_paths, 0)
+
+        self.ready = queue.Queue()
+        self.workers = ThreadPool(processes=len(controllers))
+
+    @classmethod
+    def from_config(cls, config, size, checks_interval=1, checks_timeout=60, setup_timeout=DEFAULT_SETUP_TIMEOUT):
+        """Return an environment pool based on the given config.
+
+        Each environment uses the '<project-name>-pool<index>' project name, ephemeral host ports,
+        and writes its logs to a '<log dir>/pool<index>/lease<number>' directory.
+
+        :param Config config: the environments configuration.
+        :param int size: the number of environments in the pool.
+        """
+        worker_id = workers.get_worker_id()
+        controllers = []
+        for index in range(size):
+            pool_id = "pool{0}".format(index) if not worker_id else "{0}-pool{1}".format(worker_id, index)
+            controllers.append(EnvironmentController.from_config(
+                config,
+                log_path=workers.get_isolated_log_path(config.log_path, pool_id),
+                project_name=workers.get_isolated_project_name(config.project_name, pool_id),
+                reuse_containers=False,
+                ephemeral_ports=True,
+            ))
+
+        return cls(controllers=controllers, checks_interval=checks_interval, checks_timeout=checks_timeout,
+                   setup_timeout=setup_timeout)
+
+    @property
+    def acquire_timeout(self):
+        """Time (in seconds) to wait for a ready environment, long enough for recycling an environment."""
+        return self.setup_timeout + self.checks_timeout
+
+    def start(self):
+        """Set up all the pool environments in the background."""
+        log.debug("Starting an environment pool of %s environments", len(self.controllers))
+        for controller in self.controllers:
+            self.workers.apply_async(self._prepare, (controller,))
+
+    def acquire(self, timeout=None):
+        """Return a ready environment controller, waiting for one to be ready if needed.
+
+        :param int timeout: timeout (in seconds) to wait for a ready environment, wait forever if None.
+        :raise RuntimeError: if no environment is ready within the timeout or the environment set up failed,
+            in which case the failed environment is recycled in the background.
+        """
+        try:
+            controller, error = self.ready.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError("No environment became ready within %s seconds" % timeout)
+
+        if error:
+            # Keep the pool size, the failed environment may be set up successfully by the next consumer
+            self.workers.apply_async(self._recycle, (controller,))
+            raise RuntimeError("Failed setting up environment %s: %s" % (controller.project_name, error))
+
+        log.debug("Acquired environment %s", controller.project_name)
+        return controller
+
+    def release(self, controller):
+        """Return an environment to the pool, it's recycled in the background.
+
+        :param EnvironmentController controller: controller previously returned by `acquire`.
+        """
+        log.debug("Releasing environment %s", controller.project_name)
+        self.workers.apply_async(self._recycle, (controller,))
+
+    def close(self):
+        """Wait for the background work to finish and tear down all the pool environments."""
+        log.debug("Closing the environment pool")
+        self.workers.close()
+        self.workers.join()
+        for controller in self.controllers:
+            try:
+                controller.teardown()
+            except:
+                log.exception("Failed tearing down environment %s", controller.project_name)
+
+    def _prepare(self, controller):
+        """Set up the environment, collecting its logs into a new lease directory, and mark it as ready."""
+        try:
+            self.leases[controller.project_name] += 1
+            log_path = self.log_paths[controller.project_name]
+            controller.set_log_path(os.path.join(
+                os.path.dirname(log_path), "lease{0}".format(self.leases[controller.project_name]),
+                os.path.basename(log_path),
+            ))
+            controller.setup()
+            if not controller.wait_for_services(interval=self.checks_interval, timeout=self.checks_timeout):
+                raise RuntimeError("Required checks didn't pass within timeout")
+
+        except Exception as error:
+            log.exception("Failed preparing environment %s", controller.project_name)
+            self.ready.put((controller, error))
+            return
+
+        log.debug("Environment %s is ready", controller.project_name)
+        self.ready.put((controller, None))
+
+    def _recycle(self, controller):
+        """Tear the environment down and set it up again."""
+        log.debug("Recycling environment %s", controller.project_name)
+        try:
+            controller.teardown()
+        except:
+            log.exception("Failed tearing down environment %s", controller.project_name)
+
+        self._prepare(controller)
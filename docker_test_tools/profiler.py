@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+
+class Profiler(object):
+    """Records timed spans of the environment operations.
+
+    The recorded spans may be written as a JSON timeline, or in the chrome trace event format
+    (viewable using chrome://tracing or https://ui.perfetto.dev).
+
+    A disabled profiler records nothing, so it may be used unconditionally.
+
+    Usage:
+
+    >>> profiler = Profiler()
+    >>> with profiler.span("setup", category="environment"):
+    >>>     # timed operation
+    >>> profiler.write_timeline("profile.json")
+    """
+
+    def __init__(self, enabled=True):
+        """Initialize the profiler.
+
+        :param bool enabled: whether or not to record spans.
+        """
+        self.enabled = enabled
+        self.spans = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, category, **args):
+        """Time the wrapped block and record it as a span.
+
+        :param str name: the span name.
+        :param str category: the span category (e.g. environment, compose, plugin).
+        :param args: additional span details.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name=name, category=category, start=start, end=time.time(), **args)
+
+    def add_span(self, name, category, start, end, **args):
+        """Record a span which was timed by the caller.
+
+        :param str name: the span name.
+        :param str category: the span category (e.g. environment, compose, plugin).
+        :param float start: the span start time (seconds since the epoch).
+        :param float end: the span end time (seconds since the epoch).
+        :param args: additional span details.
+        """
+        if not self.enabled:
+            return
+
+        span = {
+            "name": name,
+            "category": category,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "thread": threading.current_thread().name,
+            "thread_id": threading.current_thread().ident,
+            "args": args,
+        }
+        with self.lock:
+            self.spans.append(span)
+
+    def get_timeline(self):
+        """Return the recorded spans ordered by their start time."""
+        with self.lock:
+            return sorted(self.spans, key=lambda span: span["start"])
+
+    def get_chrome_trace(self):
+        """Return the recorded spans in the chrome trace event format."""
+        pid = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": span["name"],
+                    "cat": span["category"],
+                    "ph": "X",
+                    "ts": int(span["start"] * 1000000),
+                    "dur": int(span["duration"] * 1000000),
+                    "pid": pid,
+                    "tid": span["thread_id"],
+                    "args": span["args"],
+                }
+                for span in self.get_timeline()
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_timeline(self, path):
+        """Write the recorded spans as a JSON timeline.
+
+        :param str path: the target file path.
+        """
+        log.debug("Writing profiling timeline to %s", path)
+        self._write_json(path, {"spans": self.get_timeline()})
+
+    def write_chrome_trace(self, path):
+        """Write the recorded spans in the chrome trace event format.
+
+        :param str path: the target file path.
+        """
+        log.debug("Writing profiling chrome trace to %s", path)
+        self._write_json(path, self.get_chrome_trace())
+
+    @staticmethod
+    def _write_json(path, content):
+        """Write the content as JSON to the given path, creating its directory if needed."""
+        target_dir = os.path.dirname(path)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        with open(path, "w") as target_file:
+            json.dump(content, target_file, indent=2)
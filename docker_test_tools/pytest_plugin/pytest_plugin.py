@@ -2,7 +2,8 @@ import os
 
 import pytest
 
-from docker_test_tools import config, environment
+from docker_test_tools import config, environment, pool, utils, workers
+from docker_test_tools.config import Config
 
 
 CHECKS_TIMEOUT = (
@@ -10,6 +11,83 @@ CHECKS_TIMEOUT = (
 )  # Used by docker-test-tools for health checks that services are up
 CHECKS_INTERVAL = 1
 
+# Fixtures providing an environment controller, a test's `services` marker applies to the one it requested
+CONTROLLER_FIXTURES = ("controller", "pooled_controller", "class_pooled_controller")
+
+
+def pytest_addoption(parser):
+    """Add the docker test tools command line options."""
+    parser.addoption(
+        "--compose-profiles",
+        default=None,
+        help="Comma separated docker compose profiles to enable, overriding the configured profiles",
+    )
+
+
+def pytest_configure(config):
+    """Apply the command line options, as environment variables overriding the controller config."""
+    compose_profiles = config.getoption("--compose-profiles")
+    if compose_profiles is not None:
+        os.environ[Config.COMPOSE_PROFILES_ENV_VAR] = compose_profiles
+
+    config.addinivalue_line(
+        "markers", "services(*names): services the test requires, along with the services they depend on"
+    )
+    config.dtt_required_services = None
+    config.dtt_leak_suspects = []
+    config.dtt_resource_watchdog = None
+
+
+def pytest_sessionstart(session):
+    """Register the pytest-xdist worker, so the owner of a shared environment waits for it to finish."""
+    worker_id = workers.get_worker_id()
+    if worker_id:
+        workers.WorkersRegistry(workers.get_test_run_id()).start(worker_id)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_sessionfinish(session):
+    """Mark the pytest-xdist worker as finished once its session fixtures are torn down.
+
+    Every worker is marked, including workers whose tests didn't use the `controller` fixture.
+    """
+    yield
+
+    worker_id = workers.get_worker_id()
+    if worker_id:
+        workers.WorkersRegistry(workers.get_test_run_id()).finish(worker_id)
+
+
+def pytest_collection_modifyitems(session, config, items):
+    """Collect the services required by the tests using the environment.
+
+    When all of them declare their services (using the `services` marker, or a `REQUIRED_SERVICES`
+    class attribute), only the required services are started by the `controller` fixture.
+    """
+    config.dtt_required_services = utils.get_required_services(
+        get_item_required_services(item) for item in items if "controller" in getattr(item, "fixturenames", ())
+    )
+
+
+def get_marker(node, name):
+    """Return the node closest marker by the given name, None if it's not marked.
+
+    `get_closest_marker` was added in pytest 3.6, older versions have `get_marker`.
+    """
+    if hasattr(node, "get_closest_marker"):
+        return node.get_closest_marker(name)
+
+    return node.get_marker(name)
+
+
+def get_item_required_services(item):
+    """Return the services required by a test item, None if it requires all of them."""
+    marker = get_marker(item, "services")
+    if marker is not None:
+        return list(marker.args)
+
+    return getattr(item.cls, "REQUIRED_SERVICES", None) or None
+
 
 @pytest.fixture(scope="session", name="controller_config")
 def fixture_controller_config():
@@ -23,22 +101,149 @@ def fixture_controller_config():
 
 
 @pytest.fixture(scope="session", name="controller")
-def fixture_controller(controller_config):
-    controller = environment.EnvironmentController(
-        log_path=controller_config.log_path,
-        project_name=controller_config.project_name,
-        compose_path=controller_config.docker_compose_path,
-        compose_command=controller_config.docker_compose_command,
-        reuse_containers=controller_config.reuse_containers,
+def fixture_controller(controller_config, request):
+    """Docker test tools environment controller.
+
+    When running under pytest-xdist, the environment is set up once and shared by all the workers,
+    unless `isolate_workers` is configured - in which case each worker sets up its own environment.
+
+    Only the services required by the collected tests are started (see `pytest_collection_modifyitems`).
+    """
+    worker_id = workers.get_worker_id()
+    if worker_id and controller_config.isolate_workers:
+        controller = environment.EnvironmentController.from_config(
+            controller_config,
+            log_path=workers.get_isolated_log_path(controller_config.log_path, worker_id),
+            project_name=workers.get_isolated_project_name(controller_config.project_name, worker_id),
+            ephemeral_ports=True,
+        )
+        shared_environment = None
+
+    else:
+        controller = environment.EnvironmentController.from_config(controller_config, shared=worker_id is not None)
+        shared_environment = workers.SharedEnvironment(
+            controller=controller,
+            worker_id=worker_id,
+            worker_count=workers.get_worker_count(),
+            test_run_id=workers.get_test_run_id(),
+        ) if worker_id else None
+
+    controller.set_required_services(getattr(request.config, "dtt_required_services", None))
+    if shared_environment:
+        shared_environment.setup()
+    else:
+        controller.setup()
+
+    controller.update_plugins(workers.tag_message("========= PYTEST SESSION BEGINNING ========="))
+    request.config.dtt_resource_watchdog = controller.resource_watchdog
+
+    yield controller
+
+    request.config.dtt_resource_watchdog = None
+    controller.update_plugins(workers.tag_message("========= PYTEST SESSION END ========="))
+    if shared_environment:
+        shared_environment.teardown()
+    else:
+        controller.teardown()
+
+    report_leak_suspects(request.config, controller.get_leak_suspects())
+
+
+def report_leak_suspects(config, suspects):
+    """Keep the containers suspected of leaking memory for the session report.
+
+    Under pytest-xdist, the suspects found by a worker are passed to the controlling process.
+    """
+    config.dtt_leak_suspects.extend(suspects)
+    if hasattr(config, "workeroutput"):
+        config.workeroutput["dtt_leak_suspects"] = config.dtt_leak_suspects
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Collect the resource limits violations found while the test ran (see `resource-limits`)."""
+    watchdog = getattr(item.config, "dtt_resource_watchdog", None)
+    if watchdog:
+        # Violations found before the test started aren't reported to it
+        watchdog.check()
+
+    yield
+
+    if watchdog:
+        violations = watchdog.check()
+        if violations:
+            item.dtt_resource_violations = watchdog.format_violations(violations)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_makereport(item, call):
+    """Fail the tests which passed while the environment containers exceeded their resource limits."""
+    outcome = yield
+    report = outcome.get_result()
+    violations = getattr(item, "dtt_resource_violations", None)
+    if report.when == "call" and report.passed and violations:
+        report.outcome = "failed"
+        report.longrepr = violations
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    """Collect the containers suspected of leaking memory by a finished pytest-xdist worker."""
+    node.config.dtt_leak_suspects.extend(getattr(node, "workeroutput", {}).get("dtt_leak_suspects", []))
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Report the containers suspected of leaking memory during the session (see `ram-leak-slope`)."""
+    suspects = getattr(terminalreporter.config, "dtt_leak_suspects", None)
+    if not suspects:
+        return
+
+    from docker_test_tools.stats import format_signed_size
+
+    terminalreporter.write_sep("=", "containers suspected of leaking memory")
+    for suspect in suspects:
+        terminalreporter.write_line("{name}: RAM grew by {slope} per minute (r2 {r2:.2f}, {samples} samples)".format(
+            name=suspect["name"], slope=format_signed_size(suspect["slope"]), r2=suspect["r2"],
+            samples=suspect["samples"],
+        ))
+
+
+@pytest.fixture(scope="session", name="environment_pool")
+def fixture_environment_pool(controller_config):
+    """Pool of pre-started environments, sized by the `pool_size` configuration."""
+    environment_pool = pool.EnvironmentPool.from_config(
+        config=controller_config,
+        size=max(int(controller_config.pool_size), 1),
+        checks_interval=CHECKS_INTERVAL,
+        checks_timeout=CHECKS_TIMEOUT,
     )
+    environment_pool.start()
+
+    yield environment_pool
+
+    environment_pool.close()
+
+
+@pytest.fixture(scope="module")
+def pooled_controller(environment_pool):
+    """Controller of a fresh environment taken from the pool, for the tests of a single module."""
+    controller = environment_pool.acquire(timeout=environment_pool.acquire_timeout)
+    controller.update_plugins(workers.tag_message("========= POOLED ENVIRONMENT ACQUIRED ========="))
+
+    yield controller
+
+    environment_pool.release(controller)
+
 
-    controller.setup()
-    controller.update_plugins("========= PYTEST SESSION BEGINNING =========")
+@pytest.fixture(scope="class")
+def class_pooled_controller(environment_pool):
+    """Controller of a fresh environment taken from the pool, for the tests of a single class."""
+    controller = environment_pool.acquire(timeout=environment_pool.acquire_timeout)
+    controller.update_plugins(workers.tag_message("========= POOLED ENVIRONMENT ACQUIRED ========="))
 
     yield controller
 
-    controller.update_plugins("========= PYTEST SESSION END =========")
-    controller.teardown()
+    environment_pool.release(controller)
 
 
 @pytest.fixture(scope="session")
@@ -49,13 +254,43 @@ def wait_for_services(controller):
     )
 
 
+def get_requested_controller(request):
+    """Return the controller of the environment the test uses, None if it doesn't use any.
+
+    The controller fixture is resolved only if the test (or one of its fixtures) requested it,
+    so environments the test doesn't use aren't set up.
+    """
+    for name in CONTROLLER_FIXTURES:
+        if name in request.fixturenames:
+            return request.getfixturevalue(name)
+
+    return None
+
+
+@pytest.fixture(autouse=True)
+def start_required_services(request):
+    """Start the services required by a `services` marked test, in case they weren't started yet."""
+    marker = get_marker(request.node, "services")
+    if marker is None:
+        return
+
+    controller = get_requested_controller(request)
+    if controller is None:
+        return
+
+    if controller.ensure_services(list(marker.args)):
+        assert controller.wait_for_services(
+            services=controller.resolve_services(list(marker.args)), interval=CHECKS_INTERVAL, timeout=CHECKS_TIMEOUT
+        )
+
+
 @pytest.fixture
 def log_test_start_end(controller, request):
     """Write a test started/end log message to the main log file."""
     start_message = "========= TEST BEGINNING: {0} =========".format(request.node.nodeid)
-    controller.update_plugins(start_message)
+    controller.update_plugins(workers.tag_message(start_message))
 
     yield
 
     end_message = "========= TEST END: {0} =========".format(request.node.nodeid)
-    controller.update_plugins(end_message)
+    controller.update_plugins(workers.tag_message(end_message))
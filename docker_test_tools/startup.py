@@ -0,0 +1,147 @@
+import time
+import logging
+import threading
+from multiprocessing.pool import ThreadPool
+
+log = logging.getLogger(__name__)
+
+PROJECT_LABEL = "com.docker.compose.project"
+SERVICE_LABEL = "com.docker.compose.service"
+
+
+class StartupScheduler(object):
+    """Start the environment services ordered by their dependency graph.
+
+    The services images, containers and the project networks & volumes are created once first (`up --no-start`),
+    so the parallel startups don't race creating shared resources. Then each service is started as soon as all the
+    services it depends on are ready, so independent services start in parallel. A service readiness is checked
+    (using the given `is_ready`) whenever its containers events are received, and periodically - e.g. for services
+    which are ready once they log a ready log pattern.
+
+    Running the scheduler returns a startup report, holding each service timing and the critical path -
+    the chain of services which determined the total startup time.
+    """
+
+    def __init__(self, compose, docker_client, project_name, dependencies, is_ready, timeout=120, interval=1):
+        """Initialize the startup scheduler.
+
+        :param Compose compose: the environment compose.
+        :param docker_client: docker api client.
+        :param str project_name: the compose project name.
+        :param dict dependencies: service name to the list of service names it depends on.
+        :param callable is_ready: callable returning True if the given service is ready.
+        :param int timeout: timeout (in seconds) for each service to become ready.
+        :param float interval: interval (in seconds) between readiness checks of a started service.
+        """
+        self.compose = compose
+        self.docker_client = docker_client
+        self.project_name = project_name
+        self.dependencies = dependencies
+        self.is_ready = is_ready
+        self.timeout = timeout
+        self.interval = interval
+
+        self.ready = {service: threading.Event() for service in dependencies}
+        self.start_times = {}
+        self.ready_times = {}
+        self.start_time = None
+
+    def run(self):
+        """Start all the services, return the startup report.
+
+        :raise RuntimeError: if a service failed starting or didn't become ready within the timeout.
+        """
+        self.start_time = time.time()
+        self.compose.create(services=list(self.dependencies))
+
+        events = self.docker_client.events(
+            decode=True, filters={"type": "container", "label": "{0}={1}".format(PROJECT_LABEL, self.project_name)}
+        )
+        events_thread = threading.Thread(target=self._watch_events, args=(events,))
+        events_thread.daemon = True
+        events_thread.start()
+
+        pool = ThreadPool(processes=len(self.dependencies) or 1)
+        try:
+            async_results = [pool.apply_async(self._start_service, (service,)) for service in self.dependencies]
+            for async_result in async_results:
+                async_result.get()
+        finally:
+            pool.close()
+            events.close()
+
+        report = self.get_report()
+        log.info("Environment started in %.3f seconds, critical path: %s",
+                 report["total"], " -> ".join(report["critical_path"]))
+        for service, timing in sorted(report["services"].items(), key=lambda item: item[1]["ready"]):
+            log.info("Service %s: waited %.3f seconds for dependencies, ready %.3f seconds after start",
+                     service, timing["waited"], timing["startup"])
+
+        return report
+
+    def get_report(self):
+        """Return the startup timing breakdown.
+
+        :return dict: the services timings (seconds since the startup began), the critical path and total time.
+        """
+        services = {
+            service: {
+                "waited": self.start_times[service],
+                "startup": self.ready_times[service] - self.start_times[service],
+                "ready": self.ready_times[service],
+            }
+            for service in self.start_times if service in self.ready_times
+        }
+
+        critical_path = []
+        service = max(services, key=lambda name: services[name]["ready"]) if services else None
+        while service:
+            critical_path.insert(0, service)
+            dependencies = [dependency for dependency in self.dependencies[service] if dependency in services]
+            service = max(dependencies, key=lambda name: services[name]["ready"]) if dependencies else None
+
+        total = services[critical_path[-1]]["ready"] if critical_path else 0
+        return {"services": services, "critical_path": critical_path, "total": total}
+
+    def _start_service(self, service):
+        """Wait for the service dependencies to be ready, start it and wait for it to be ready."""
+        for dependency in self.dependencies[service]:
+            if dependency in self.ready and not self.ready[dependency].wait(self.timeout):
+                raise RuntimeError("Service %s dependency %s didn't become ready within timeout" %
+                                   (service, dependency))
+
+        self.start_times[service] = time.time() - self.start_time
+        log.debug("Starting service %s", service)
+        self.compose.start(services=[service])
+
+        deadline = time.time() + self.timeout
+        while not self.ready[service].is_set():
+            if self.is_ready(service):
+                self._mark_ready(service)
+
+            elif time.time() >= deadline:
+                raise RuntimeError("Service %s didn't become ready within timeout" % service)
+
+            else:
+                self.ready[service].wait(min(self.interval, deadline - time.time()))
+
+    def _mark_ready(self, service):
+        """Record the time the service became ready, and release the services depending on it."""
+        if not self.ready[service].is_set():
+            self.ready_times[service] = time.time() - self.start_time
+            self.ready[service].set()
+
+    def _watch_events(self, events):
+        """Mark services as ready based on their containers events."""
+        try:
+            for event in events:
+                service = event.get("Actor", {}).get("Attributes", {}).get(SERVICE_LABEL)
+                if service not in self.ready:
+                    continue
+
+                action = event.get("Action", event.get("status"))
+                if action in ("start", "health_status: healthy") and self.is_ready(service):
+                    self._mark_ready(service)
+        except:
+            # Closing the events stream may raise while it's being read
+            log.debug("Stopped watching the environment containers events", exc_info=True)
@@ -4,16 +4,39 @@ import sys
 import json
 import logging
 import subprocess
+from collections import OrderedDict
+
 import humanfriendly
 import six
 
 from docker_test_tools import utils
+from docker_test_tools.log_index import WORKER_TAG_PATTERN, get_section_name
 
 log = logging.getLogger(__name__)
 
 COMMON_STATS_PREFIX = ">>>"
 COMMON_STATS_FORMAT = six.u("{prefix} {{message}}\n").format(prefix=COMMON_STATS_PREFIX)
 
+# RAM growth (bytes per minute) above which a container is suspected of leaking memory
+DEFAULT_LEAK_SLOPE = 1024 * 1024
+
+# A leak suspect RAM growth must fit a linear trend (coefficient of determination), over enough samples
+LEAK_MIN_R2 = 0.5
+LEAK_MIN_SAMPLES = 10
+
+
+def get_stats_file_path(target_dir_path):
+    """Return the path of the stats file collected into the target directory."""
+    return os.path.join(target_dir_path, "stats", "stats.json")
+
+
+def format_signed_size(num_bytes):
+    """Format a (possibly negative) number of bytes in a human readable format, None if it's unknown."""
+    if num_bytes is None:
+        return None
+
+    return ("-" if num_bytes < 0 else "") + humanfriendly.format_size(abs(num_bytes))
+
 
 class StatsCollector(object):
     """Utility for containers stats collection."""
@@ -28,18 +51,28 @@ class StatsCollector(object):
         "}"
     )
 
-    def __init__(self, target_dir_path, project, encoding, environment_variables):
-        """Initialize the stats collector."""
+    def __init__(self, target_dir_path, project, encoding, environment_variables, shared=False,
+                 leak_slope=DEFAULT_LEAK_SLOPE):
+        """Initialize the stats collector.
+
+        :param bool shared: whether other processes write messages to the stats file as well,
+            in which case the stats file is written in append mode.
+        :param int leak_slope: RAM growth (bytes per minute) above which a container is suspected of leaking
+            memory, 0 for not suspecting any container.
+        """
         logging.debug("Stats monitor initializing")
         self.project = project
         self.encoding = encoding
         self.environment_variables = environment_variables
+        self.shared = shared
+        self.leak_slope = leak_slope
+        self.leak_suspects = []
 
         self.work_dir = os.path.join(target_dir_path, "stats")
         if not os.path.exists(self.work_dir):
             os.makedirs(self.work_dir)
 
-        self.stats_file_path = os.path.join(self.work_dir, "stats.json")
+        self.stats_file_path = get_stats_file_path(target_dir_path)
         self.stats_summary_path = os.path.join(self.work_dir, "summary.json")
 
         self.stats_file = None
@@ -48,7 +81,7 @@ class StatsCollector(object):
     def start(self):
         """Start a stats collection process which writes docker-compose stats into a file."""
         log.debug("Starting stats collection from environment containers")
-        self.stats_file = io.open(self.stats_file_path, "w", encoding=self.encoding)
+        self._open_stats_file()
         self.stats_process = subprocess.Popen(
             ["docker", "stats", "--format", self.FORMAT] + self._get_filters(),
             stdout=self.stats_file,
@@ -65,11 +98,35 @@ class StatsCollector(object):
         if self.stats_file:
             self.stats_file.close()
 
+            cluster_stats = ClusterStats(
+                stat_file_path=self.stats_file_path, encoding=self.encoding, leak_slope=self.leak_slope
+            )
             with open(self.stats_summary_path, "w") as target:
-                cluster_stats = ClusterStats(
-                    stat_file_path=self.stats_file_path, encoding=self.encoding
-                ).to_dict()
-                json.dump(cluster_stats, target, sort_keys=True, indent=2)
+                json.dump(cluster_stats.to_dict(), target, sort_keys=True, indent=2)
+
+            self.leak_suspects = cluster_stats.get_leak_suspects()
+            for suspect in self.leak_suspects:
+                log.warning("Container %s is suspected of leaking memory: its RAM grew by %s per minute",
+                            suspect["name"], humanfriendly.format_size(suspect["slope"]))
+
+    def _open_stats_file(self):
+        """Open the stats file for writing, truncating it."""
+        if self.shared:
+            self.stats_file = io.open(self.stats_file_path, "a", encoding=self.encoding)
+            self.stats_file.truncate(0)
+        else:
+            self.stats_file = io.open(self.stats_file_path, "w", encoding=self.encoding)
+
+    def attach(self):
+        """Attach to stats collected by another process, allowing to write common stats messages."""
+        log.debug("Attaching to the environment containers stats")
+        self.stats_file = io.open(self.stats_file_path, "a", encoding=self.encoding)
+
+    def detach(self):
+        """Detach from stats collected by another process."""
+        log.debug("Detaching from the environment containers stats")
+        if self.stats_file:
+            self.stats_file.close()
 
     def _get_filters(self):
         """Return the docker-compose project containers."""
@@ -99,9 +156,25 @@ class ClusterStats(object):
 
     SAMPLE_PREFIX = "\x1b[2J\x1b[H"
 
-    def __init__(self, stat_file_path, encoding):
+    # Stats lines fields, lines may also hold the sample "time" (seconds since epoch), and the transmitted network
+    # & written block device bytes - which are the second `docker stats` NET I/O & BLOCK I/O values otherwise
+    FIELDS = {"name", "cpu", "ram", "net", "block"}
+    OPTIONAL_FIELDS = {"time", "net_tx", "block_write"}
+
+    # Interval (seconds) between docker stats samples, for samples without a time
+    SAMPLE_INTERVAL = 1
+
+    def __init__(self, stat_file_path, encoding, leak_slope=DEFAULT_LEAK_SLOPE):
+        """Parse the collected stats file.
+
+        :param int leak_slope: RAM growth (bytes per minute) above which a container is suspected of leaking
+            memory, 0 for not suspecting any container.
+        """
         self.encoding = encoding
+        self.leak_slope = leak_slope
         self.summary_data = {}
+        self.sample_number = 0
+        self.test = None
         self._split_logs(stat_file_path)
 
     def parse_file(self, stat_file_path):
@@ -126,11 +199,16 @@ class ClusterStats(object):
                 stat_file_path, "r", encoding=self.encoding
             ) as combined_stats_file:
                 for raw_line in combined_stats_file.readlines():
+                    # Each docker stats sample starts with the escape characters prefix
+                    if raw_line.startswith(self.SAMPLE_PREFIX):
+                        self.sample_number += 1
+
                     # Cleanup escape characters prefix
                     raw_line = raw_line.lstrip(self.SAMPLE_PREFIX)
 
                     if raw_line.startswith(COMMON_STATS_PREFIX):
                         value = {"test": raw_line.lstrip(COMMON_STATS_PREFIX).strip()}
+                        self.test = get_section_name(WORKER_TAG_PATTERN.sub("", value["test"]))
                         common_stats.append(value)
                         for service_stats in services_stats.values():
                             service_stats.append(value)
@@ -159,6 +237,32 @@ class ClusterStats(object):
         - Extract the line data from the raw string.
         - Add the data to the stats summary info.
         """
+        components = self.parse_sample(line)
+        if not components:
+            return
+
+        name = components["name"]
+        if name not in self.summary_data:
+            self.summary_data[name] = ContainerStats(name=name, leak_slope=self.leak_slope)
+
+        self.summary_data[name].update(
+            cpu_used=components["cpu"],
+            ram_used=components["ram"],
+            net_io_used=components["net"],
+            block_io_used=components["block"],
+            sample_time=components.get("time", self.sample_number * self.SAMPLE_INTERVAL),
+            test=self.test,
+        )
+
+        return components
+
+    @classmethod
+    def parse_sample(cls, line):
+        """Extract the stats line data from the raw string, None if it's not a valid stats sample.
+
+        :return dict: the container name, used CPU percentage, used ram bytes, received & transmitted network bytes
+            (`net` & `net_tx`), read & written block device bytes (`block` & `block_write`), and the sample time.
+        """
         try:
             # Split the stat data to it's raw components
             components = json.loads(line)
@@ -169,64 +273,204 @@ class ClusterStats(object):
 
             # Handle bad stats metrics
             for key, val in components.items():
-                if "--" in val:
+                if isinstance(val, six.string_types) and "--" in val:
                     components[key] = 0
 
             # Skip bad stats metrics
-            if len(components) != 5:
+            if set(components) - cls.OPTIONAL_FIELDS != cls.FIELDS:
                 return
 
-            name = components["name"]
-
-            if not isinstance(components["cpu"], int):
+            if not isinstance(components["cpu"], (six.integer_types, float)):
                 # Get the used CPU percentage as a floating number
                 components["cpu"] = float(components["cpu"][:-1])
 
             # Get the used stats numbers as used bytes number
-            components["ram"] = self.get_bytes(components["ram"])
-            components["net"] = self.get_bytes(components["net"])
-            components["block"] = self.get_bytes(components["block"])
-
-            if name not in self.summary_data:
-                self.summary_data[name] = ContainerStats(name=name)
-
-            self.summary_data[name].update(
-                cpu_used=components["cpu"],
-                ram_used=components["ram"],
-                net_io_used=components["net"],
-                block_io_used=components["block"],
-            )
+            components["ram"] = cls.get_bytes(components["ram"])
+            for field, second_field in (("net", "net_tx"), ("block", "block_write")):
+                if second_field in components:
+                    components[second_field] = cls.get_bytes(components[second_field])
+                elif isinstance(components[field], six.string_types):
+                    components[second_field] = cls.get_bytes(components[field], index=1)
+                else:
+                    components[second_field] = 0
+
+                components[field] = cls.get_bytes(components[field])
 
             return components
         except:
             logging.debug("Failed parsing line: %r", line)
 
     @staticmethod
-    def get_bytes(raw_value):
-        """Get the number as used bytes number"""
-        if isinstance(raw_value, int):
+    def get_bytes(raw_value, index=0):
+        """Get the number as used bytes number.
+
+        :param int index: index of the value in a `docker stats` pair of values (e.g. '1kB / 2kB' NET I/O),
+            missing values are 0. Numbers are returned as is.
+        """
+        if isinstance(raw_value, (six.integer_types, float)):
             return raw_value
 
-        return humanfriendly.parse_size(raw_value.split("/")[0], binary=True)
+        values = raw_value.split("/")
+        return humanfriendly.parse_size(values[index], binary=True) if index < len(values) else 0
 
     def __str__(self):
         """Return a string representation of the collected stats."""
         return str(self.to_dict())
 
     def to_dict(self):
-        """Return a dictionary representation of the collected stats."""
-        return {
+        """Return a dictionary representation of the collected stats.
+
+        The containers summaries are keyed by their names, and `leak_suspects` lists the containers suspected
+        of leaking memory - as reported at the end of the session (see `get_leak_suspects`).
+        """
+        summary = {
             container_summary.name: container_summary.to_dict()
             for container_summary in self.summary_data.values()
         }
+        summary["leak_suspects"] = [
+            dict(suspect, slope_per_minute=format_signed_size(suspect["slope"])) for suspect in self.get_leak_suspects()
+        ]
+        return summary
+
+    def get_leak_suspects(self):
+        """Return the containers suspected of leaking memory, the fastest growing first.
+
+        :return list: dictionaries of the container name, its RAM growth `slope` (bytes per minute), the
+            trend `r2` (coefficient of determination) and the number of `samples`.
+        """
+        suspects = [
+            {
+                "name": container_summary.name,
+                "slope": container_summary.ram_slope,
+                "r2": container_summary.ram_trend.r2,
+                "samples": container_summary.ram_trend.count,
+            }
+            for container_summary in self.summary_data.values() if container_summary.is_leak_suspect()
+        ]
+        return sorted(suspects, key=lambda suspect: -suspect["slope"])
+
+
+class StatsTail(object):
+    """Incremental reader of the stats file, following it while the stats are collected."""
+
+    def __init__(self, stats_file_path):
+        """Initialize the reader, reading the stats file from its beginning.
+
+        :param str stats_file_path: the collected stats file path (see `get_stats_file_path`).
+        """
+        self.stats_file_path = stats_file_path
+        self.stats_file = None
+        self.position = 0
+        self.pending = b""
+
+    def seek(self, position=0):
+        """Read the stats file from the given position on."""
+        self.position = position
+        self.pending = b""
+
+    def seek_end(self):
+        """Read only the stats written to the stats file from now on."""
+        self.seek(os.path.getsize(self.stats_file_path) if os.path.exists(self.stats_file_path) else 0)
+
+    def read(self):
+        """Return the stats written since the last read, up to the last complete line.
+
+        :return list: the parsed samples (see `ClusterStats.parse_sample`), and {"test": message} for the
+            common messages, in their order in the stats file.
+        """
+        if self.stats_file is None:
+            if not os.path.exists(self.stats_file_path):
+                return []
+
+            self.stats_file = io.open(self.stats_file_path, "rb")
+
+        # The stats file is truncated when the environment is set up again
+        if os.fstat(self.stats_file.fileno()).st_size < self.position:
+            self.seek(0)
+
+        self.stats_file.seek(self.position)
+        data = self.stats_file.read()
+        self.position += len(data)
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+
+        entries = []
+        for raw_line in lines:
+            line = raw_line.decode("utf-8", "replace").lstrip(ClusterStats.SAMPLE_PREFIX)
+            if line.startswith(COMMON_STATS_PREFIX):
+                entries.append({"test": line.lstrip(COMMON_STATS_PREFIX).strip()})
+
+            elif line.strip():
+                sample = ClusterStats.parse_sample(line)
+                if sample:
+                    entries.append(sample)
+
+        return entries
+
+    def close(self):
+        """Close the stats file, it's opened again by the next read."""
+        if self.stats_file:
+            self.stats_file.close()
+            self.stats_file = None
+
+
+class LinearTrend(object):
+    """Least squares linear regression, calculated in an iterative manner."""
+
+    def __init__(self):
+        """Initialize the trend, values are kept relative to the first point, avoiding a loss of precision."""
+        self.count = 0
+        self.origin = None
+        self.x_sum = self.y_sum = self.xy_sum = self.xx_sum = self.yy_sum = 0.0
+
+    def update(self, x, y):
+        """Add a point to the trend."""
+        if self.origin is None:
+            self.origin = (x, y)
+
+        x, y = float(x - self.origin[0]), float(y - self.origin[1])
+        self.count += 1
+        self.x_sum += x
+        self.y_sum += y
+        self.xy_sum += x * y
+        self.xx_sum += x * x
+        self.yy_sum += y * y
+
+    @property
+    def slope(self):
+        """The trend slope (y units per x unit), None if there aren't enough distinct points."""
+        x_variance = self.count * self.xx_sum - self.x_sum ** 2
+        if self.count < 2 or x_variance <= 0:
+            return None
+
+        return (self.count * self.xy_sum - self.x_sum * self.y_sum) / x_variance
+
+    @property
+    def r2(self):
+        """The trend coefficient of determination (how well the points fit it, 0 to 1), None if undefined."""
+        x_variance = self.count * self.xx_sum - self.x_sum ** 2
+        y_variance = self.count * self.yy_sum - self.y_sum ** 2
+        if self.count < 2 or x_variance <= 0 or y_variance <= 0:
+            return None
+
+        return (self.count * self.xy_sum - self.x_sum * self.y_sum) ** 2 / (x_variance * y_variance)
 
 
 class ContainerStats(object):
     """Parse and calculate a single container session stats."""
 
-    def __init__(self, name):
-        """Initialize container stats summary."""
+    def __init__(self, name, leak_slope=DEFAULT_LEAK_SLOPE):
+        """Initialize container stats summary.
+
+        :param int leak_slope: RAM growth (bytes per minute) above which the container is suspected of leaking
+            memory, 0 for never suspecting it.
+        """
         self.name = name
+        self.leak_slope = leak_slope
+
+        # RAM over time (seconds), and the RAM sum & count of each test window
+        self.ram_trend = LinearTrend()
+        self.test_windows = OrderedDict()
 
         self.count = 0
 
@@ -234,9 +478,21 @@ class ContainerStats(object):
         self.cpu_max = self.ram_max = self.net_io_max = self.block_io_max = 0
         self.cpu_min = self.ram_min = self.net_io_min = self.block_io_min = sys.maxsize
 
-    def update(self, cpu_used, ram_used, net_io_used, block_io_used):
-        """Update container stats summary in an iterative manner."""
+    def update(self, cpu_used, ram_used, net_io_used, block_io_used, sample_time=None, test=None):
+        """Update container stats summary in an iterative manner.
+
+        :param float sample_time: the sample time (seconds), for the RAM trend.
+        :param str test: the test running while the sample was taken, for the RAM trend across tests.
+        """
         self.count += 1
+        if sample_time is not None:
+            self.ram_trend.update(sample_time, ram_used)
+
+        if test is not None:
+            window = self.test_windows.setdefault(test, [0, 0])
+            window[0] += ram_used
+            window[1] += 1
+
         self.cpu_sum += cpu_used
         self.ram_sum += ram_used
         self.net_io_sum += net_io_used
@@ -298,12 +554,46 @@ class ContainerStats(object):
 
         return self.block_io_sum / self.count
 
+    @property
+    def ram_slope(self):
+        """The RAM growth (bytes per minute), None if there aren't enough samples."""
+        slope = self.ram_trend.slope
+        return slope * 60 if slope is not None else None
+
+    def get_test_windows_trend(self):
+        """Return the RAM average of each test window, and their trend - the RAM growth per test."""
+        averages = OrderedDict((test, ram_sum / count) for test, (ram_sum, count) in self.test_windows.items())
+        windows_trend = LinearTrend()
+        for index, average in enumerate(averages.values()):
+            windows_trend.update(index, average)
+
+        return averages, windows_trend.slope
+
+    def is_leak_suspect(self):
+        """Whether or not the container RAM grows steadily faster than the leak slope."""
+        slope = self.ram_slope
+        return bool(
+            self.leak_slope and slope is not None and slope > self.leak_slope and
+            self.ram_trend.count >= LEAK_MIN_SAMPLES and (self.ram_trend.r2 or 0) >= LEAK_MIN_R2
+        )
+
     def __str__(self):
         """Return a string representation of the collected container stats."""
         return str(self.to_dict())
 
     def to_dict(self):
+        averages, test_slope = self.get_test_windows_trend()
+        ram_slope = self.ram_slope
         return {
+            "ram_trend": {
+                "slope_per_minute": format_signed_size(ram_slope),
+                "slope_bytes_per_minute": ram_slope,
+                "r2": self.ram_trend.r2,
+                "samples": self.ram_trend.count,
+                "slope_per_test": format_signed_size(test_slope),
+                "tests": OrderedDict((test, humanfriendly.format_size(average)) for test, average in averages.items()),
+                "leak_suspect": self.is_leak_suspect(),
+            },
             "cpu": {
                 "min": "%.2f" % self.cpu_min,
                 "max": "%.2f" % self.cpu_max,
@@ -1,7 +1,12 @@
+import os
+import re
+import json
 import logging
+import functools
+import tempfile
+import threading
 
 import waiting
-import requests
 
 from six.moves import http_client
 from multiprocessing.pool import ThreadPool
@@ -37,6 +42,8 @@ def is_responsive(address, expected_status=http_client.OK):
     :param int expected_status: expected response status code.
     :return bool: True is the address is responsive, False otherwise.
     """
+    import requests
+
     try:
         return requests.get(address, timeout=5).status_code == expected_status
     except:
@@ -77,5 +84,104 @@ def to_str(value):
     raise RuntimeError("Type {} was not converted to string".format(type(value)))
 
 
+class lazy_property(object):
+    """Decorator for properties computed on first access and cached on the instance.
+
+    Used for deferring expensive initialization (e.g. docker client creation) until it's needed.
+    The computation is thread safe - it's done once per instance even if accessed concurrently.
+    """
+
+    def __init__(self, method):
+        self.method = method
+        functools.update_wrapper(self, method)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        # Once computed, the instance attribute shadows this (non-data) descriptor
+        with instance.__dict__.setdefault("_lazy_property_lock", threading.RLock()):
+            if self.__name__ not in instance.__dict__:
+                instance.__dict__[self.__name__] = self.method(instance)
+
+        return instance.__dict__[self.__name__]
+
+
+def to_list(value):
+    """Return the value as a list of strings.
+
+    Used for options which may be given as a list, or as a comma (or newline) separated string.
+
+    :param value: list, comma separated string or None.
+    """
+    if not value:
+        return []
+
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return [item.strip() for item in value.replace("\n", ",").split(",") if item.strip()]
+
+
+def get_container_name_regex(service, project_name=None):
+    """Return a regular expression matching the names of the service containers (e.g. 'project-service-1').
+
+    :param str service: service name as it appears in the docker compose file.
+    :param str project_name: the compose project name, which may prefix the service container names.
+    """
+    return re.compile(r"^({project}[-_])?{service}([-_]\d+)?$".format(
+        project=re.escape(project_name) if project_name else "",
+        service=re.escape(service),
+    ))
+
+
+def get_required_services(requirements):
+    """Return the union of the services required by a set of tests.
+
+    :param list requirements: per test, the list of services it requires - empty or None if it requires all of them.
+    :return list: the sorted service names, or None if all the services are required.
+    """
+    requirements = list(requirements)
+    if not requirements or not all(requirements):
+        return None
+
+    return sorted(set(service for services in requirements for service in services))
+
+
+def read_json_file(path):
+    """Return the JSON file content, None if the file is missing or invalid.
+
+    :param str path: the JSON file path.
+    """
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_json_file(path, content):
+    """Write the content to a JSON file, replacing the file atomically.
+
+    Used for cache files shared by concurrent processes - failures are logged and ignored.
+
+    :param str path: the JSON file path.
+    :param content: JSON serializable content.
+    """
+    try:
+        target_dir = os.path.dirname(path)
+        if target_dir and not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+
+        file_descriptor, temp_path = tempfile.mkstemp(dir=target_dir or None)
+        with os.fdopen(file_descriptor, "w") as temp_file:
+            json.dump(content, temp_file)
+        os.rename(temp_path, path)
+
+    except (IOError, OSError):
+        log.debug("Failed writing %s", path, exc_info=True)
+
+
 # For backward compatibility
 get_curl_health_check = get_health_check
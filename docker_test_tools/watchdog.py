@@ -0,0 +1,288 @@
+"""Live watchdog of the containers resources, failing the running test once a service exceeds its budget.
+
+The watchdog tails the stats file while the stats are collected (by either stats backend), reading the new
+samples every `interval` seconds, and evaluates each container against the limits of its service:
+
+* Absolute limits - `cpu` (percent), `ram`, `net` and `block` (bytes).
+* Rate of change limits - `cpu_rate` (percent per second), `ram_rate`, `net_rate` and `block_rate` (bytes per
+  second), measured over the last `RATE_WINDOW` seconds.
+
+Absolute limits are evaluated against all the new samples, rates against the last sample of each read - so a
+longer interval lowers the overhead without missing spikes. Violations are logged once found, and kept until the
+test framework plugins collect them (see `drain`), failing the test which was running.
+
+Limits are given per service (or `*` for all the services), as a dictionary or a string:
+
+>>> parse_limits('consul.service: ram=512MB, cpu=150; *: ram_rate=5MB')
+{'consul.service': {'ram': 512000000, 'cpu': 150.0}, '*': {'ram_rate': 5000000}}
+"""
+import time
+import logging
+import threading
+from collections import deque
+
+import six
+import humanfriendly
+
+from docker_test_tools import utils
+from docker_test_tools.stats import StatsTail, format_signed_size
+
+log = logging.getLogger(__name__)
+
+METRICS = ("cpu", "ram", "net", "block")
+RATE_SUFFIX = "_rate"
+
+
+def parse_limit(metric, value):
+    """Return the metric limit as a number - a percentage for cpu metrics, bytes otherwise.
+
+    :param str metric: the limited metric, e.g. `ram` or `ram_rate`.
+    :param value: the limit, a number or a string (e.g. '150%' or '512MB').
+    """
+    if metric not in METRICS and metric[:-len(RATE_SUFFIX)] not in METRICS:
+        raise RuntimeError("Unknown resource metric: %s, expected one of %s (or their %s)" % (
+            metric, ", ".join(METRICS), RATE_SUFFIX))
+
+    if isinstance(value, (six.integer_types, float)):
+        return value
+
+    if metric.startswith("cpu"):
+        return float(value.strip().rstrip("%"))
+
+    return humanfriendly.parse_size(value.strip())
+
+
+def parse_limits(limits):
+    """Parse the services resource limits.
+
+    :param limits: service name (or `*`) to its limits dictionary, or a string in the format of
+        'service: metric=limit, metric=limit; service: metric=limit' (services may be newline separated).
+    :return dict: service name (or `*`) to its limits - metric name to a number.
+    """
+    if not limits:
+        return {}
+
+    if isinstance(limits, dict):
+        return {
+            service: {metric: parse_limit(metric, value) for metric, value in service_limits.items()}
+            for service, service_limits in limits.items()
+        }
+
+    parsed = {}
+    for service_spec in limits.replace("\n", ";").split(";"):
+        if not service_spec.strip():
+            continue
+
+        service, _, metrics_spec = service_spec.partition(":")
+        if not metrics_spec.strip():
+            raise RuntimeError("Invalid resource limits: %r, expected 'service: metric=limit, ...'" % service_spec)
+
+        for metric_spec in metrics_spec.split(","):
+            metric, _, value = metric_spec.partition("=")
+            parsed.setdefault(service.strip(), {})[metric.strip()] = parse_limit(metric.strip(), value)
+
+    return parsed
+
+
+class ResourceViolation(object):
+    """A container metric which exceeded its limit."""
+
+    def __init__(self, container, metric, value, limit):
+        self.container = container
+        self.metric = metric
+        self.value = value
+        self.limit = limit
+
+    @staticmethod
+    def format_value(metric, value):
+        """Format a metric value in a human readable format."""
+        suffix = " per second" if metric.endswith(RATE_SUFFIX) else ""
+        if metric.startswith("cpu"):
+            return "{0:.1f}%{1}".format(value, suffix)
+
+        return format_signed_size(value) + suffix
+
+    def __str__(self):
+        return "{container} {metric} {value} exceeds its {limit} limit".format(
+            container=self.container,
+            metric=self.metric,
+            value=self.format_value(self.metric, self.value),
+            limit=self.format_value(self.metric, self.limit),
+        )
+
+
+class ResourceWatchdog(object):
+    """Environment plugin evaluating the live containers stats against their services resource limits."""
+
+    # Time (seconds) over which rates of change are measured
+    RATE_WINDOW = 10
+
+    def __init__(self, stats_file_path, limits, project_name=None, interval=1, clock=time.time):
+        """Initialize the watchdog.
+
+        :param str stats_file_path: the collected stats file path (see `StatsCollector`).
+        :param limits: the services resource limits, see `parse_limits`.
+        :param str project_name: the compose project name, which may prefix the service container names.
+        :param float interval: interval (in seconds) between reads of the new stats samples.
+        :param callable clock: returns the current time (seconds since epoch), for samples without a time.
+        """
+        self.stats_file_path = stats_file_path
+        self.limits = parse_limits(limits)
+        self.project_name = project_name
+        self.interval = float(interval)
+        self.clock = clock
+
+        self.service_regexes = [
+            (service, utils.get_container_name_regex(service, project_name))
+            for service in self.limits if service != "*"
+        ]
+        self.containers_limits = {}
+        self.history = {}
+        self.violations = {}
+
+        self.tail = StatsTail(stats_file_path)
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start watching the stats file, from its beginning."""
+        log.debug("Starting the environment resources watchdog")
+        self.tail.seek(0)
+        self._start()
+
+    def attach(self):
+        """Start watching stats collected by another process, from their current end."""
+        log.debug("Attaching the environment resources watchdog")
+        self.tail.seek_end()
+        self._start()
+
+    def stop(self):
+        """Stop watching the stats file."""
+        log.debug("Stopping the environment resources watchdog")
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+        with self.lock:
+            self.tail.close()
+
+    def detach(self):
+        """Stop watching stats collected by another process."""
+        self.stop()
+
+    def update(self, message):
+        """Common stats messages are written by the stats collector."""
+
+    def poll(self):
+        """Read & evaluate the new stats samples."""
+        with self.lock:
+            self._read()
+
+    def drain(self):
+        """Return the violations found since the last drain, the worst violation of each container metric.
+
+        :return list: `ResourceViolation` objects, ordered by container & metric.
+        """
+        with self.lock:
+            violations, self.violations = self.violations, {}
+
+        return [violations[key] for key in sorted(violations)]
+
+    def check(self):
+        """Read the new stats samples, and return the violations found since the last drain."""
+        self.poll()
+        return self.drain()
+
+    def get_limits(self, container):
+        """Return the limits of the container service, merged with the limits of all the services."""
+        if container not in self.containers_limits:
+            limits = dict(self.limits.get("*", {}))
+            for service, regex in self.service_regexes:
+                if regex.match(container):
+                    limits.update(self.limits[service])
+
+            self.containers_limits[container] = limits
+
+        return self.containers_limits[container]
+
+    def evaluate(self, container, samples, now):
+        """Evaluate the container new samples against its limits.
+
+        :param str container: the container name.
+        :param list samples: the container new samples, see `ClusterStats.parse_sample`.
+        :param float now: the current time, for samples without a time.
+        """
+        limits = self.get_limits(container)
+        if not limits:
+            return
+
+        for metric in METRICS:
+            if metric in limits:
+                self._report(container, metric, max(sample[metric] for sample in samples), limits[metric])
+
+        # Rates are measured between the last sample and the oldest sample within the rate window
+        last_sample = samples[-1]
+        sample_time = last_sample.get("time", now)
+        history = self.history.setdefault(container, deque())
+        history.append((sample_time, last_sample))
+        while sample_time - history[0][0] > self.RATE_WINDOW:
+            history.popleft()
+
+        first_time, first_sample = history[0]
+        if sample_time - first_time < self.RATE_WINDOW / 2.0:
+            return
+
+        for metric in METRICS:
+            if metric + RATE_SUFFIX in limits:
+                rate = (last_sample[metric] - first_sample[metric]) / float(sample_time - first_time)
+                self._report(container, metric + RATE_SUFFIX, rate, limits[metric + RATE_SUFFIX])
+
+    def _report(self, container, metric, value, limit):
+        """Keep the violation if the value exceeds the limit, logging it once per drain."""
+        if value <= limit:
+            return
+
+        key = (container, metric)
+        violation = self.violations.get(key)
+        if violation is None:
+            self.violations[key] = violation = ResourceViolation(container, metric, value, limit)
+            log.warning("Resource limit exceeded: %s", violation)
+
+        violation.value = max(violation.value, value)
+
+    def _start(self):
+        """Start the watching thread."""
+        self.stop_event.clear()
+        self.history = {}
+        self.violations = {}
+        self.thread = threading.Thread(target=self._watch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _watch(self):
+        """Poll the stats file until stopped."""
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                log.warning("Failed evaluating the environment containers stats", exc_info=True)
+
+    def _read(self):
+        """Read the new stats samples and evaluate them. Called while holding the lock."""
+        containers_samples = {}
+        for entry in self.tail.read():
+            if "name" in entry:
+                containers_samples.setdefault(entry["name"], []).append(entry)
+
+        now = self.clock()
+        for container, samples in containers_samples.items():
+            self.evaluate(container, samples, now)
+
+    @staticmethod
+    def format_violations(violations):
+        """Return a message describing the violations."""
+        return "Environment containers exceeded their resource limits:\n" + "\n".join(
+            "  {0}".format(violation) for violation in violations
+        )
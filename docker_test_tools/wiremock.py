@@ -13,6 +13,8 @@ import warnings
 import requests
 from six.moves import http_client
 
+from docker_test_tools.metrics import Metrics, timed
+
 log = logging.getLogger(__name__)
 
 
@@ -30,15 +32,17 @@ class WiremockController(object):
     >>> controller.reset_mapping()
     """
 
-    def __init__(self, url):
+    def __init__(self, url, metrics=None):
         warnings.warn("WiremockController is deprecated, please use official Wiremock SDK instead. "
                       "More info at: https://wiremock.readthedocs.io/en/latest", DeprecationWarning)
 
         """Initialize the wiremock controller.
 
         :param str url: wiremock service url.
+        :param Metrics metrics: metrics to report the wiremock operations latency to.
         """
         self.url = url
+        self.metrics = metrics if metrics else Metrics()
         self.admin_url = os.path.join(url, "__admin")
         self.admin_mapping_url = os.path.join(self.admin_url, "mappings")
         self.mapping_reset_url = os.path.join(self.admin_mapping_url, "reset")
@@ -83,6 +87,7 @@ class WiremockController(object):
             json_object = json.load(json_file)
         return self.set_mapping_from_json(json_object)
 
+    @timed("wiremock_set_mapping")
     def set_mapping_from_json(self, json_object):
         """Set wiremock service mapping based on given json object.
 
@@ -109,6 +114,7 @@ class WiremockController(object):
 
         return resp.json()["uuid"]
 
+    @timed("wiremock_reset_mapping")
     def reset_mapping(self):
         """Reset wiremock service mapping.
 
@@ -121,6 +127,7 @@ class WiremockController(object):
             log.exception("Failed resetting %s wiremock mapping", self.url)
             raise WiremockError("Failed resetting %s wiremock mapping" % self.url)
 
+    @timed("wiremock_get_request_journal")
     def get_request_journal(self):
         """Get the wiremock service request journal.
 
@@ -150,6 +157,7 @@ class WiremockController(object):
 
         return matching_requests
 
+    @timed("wiremock_delete_request_journal")
     def delete_request_journal(self):
         """Delete all entries from the service request journal."""
         requests.delete(self.requests_url).raise_for_status()
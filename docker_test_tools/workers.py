@@ -0,0 +1,234 @@
+"""Utilities for running tests in several worker processes (e.g. using pytest-xdist)."""
+import os
+import json
+import errno
+import fcntl
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+
+import waiting
+
+log = logging.getLogger(__name__)
+
+WORKER_ID_ENV_VAR = "PYTEST_XDIST_WORKER"
+WORKER_COUNT_ENV_VAR = "PYTEST_XDIST_WORKER_COUNT"
+TEST_RUN_ID_ENV_VAR = "PYTEST_XDIST_TESTRUNUID"
+
+# Time (seconds) the owner of a shared environment waits for the other workers to finish their tests
+DEFAULT_FINISH_TIMEOUT = 10 * 60
+
+
+def get_worker_id():
+    """Return the current worker id (e.g. 'gw0'), None if not running as a worker."""
+    return os.environ.get(WORKER_ID_ENV_VAR)
+
+
+def get_worker_count():
+    """Return the number of workers in the test run."""
+    return int(os.environ.get(WORKER_COUNT_ENV_VAR, 1))
+
+
+def get_test_run_id():
+    """Return an id shared by all the workers of the test run.
+
+    Falls back to the parent process id, for xdist versions which don't expose the test run id.
+    """
+    return os.environ.get(TEST_RUN_ID_ENV_VAR, str(os.getppid()))
+
+
+def get_isolated_project_name(project_name, worker_id):
+    """Return the compose project name of a worker's isolated environment."""
+    return "{project_name}-{worker_id}".format(project_name=project_name, worker_id=worker_id)
+
+
+def get_isolated_log_path(log_path, worker_id):
+    """Return the log path of a worker's isolated environment, placed in a per-worker sub directory."""
+    return os.path.join(os.path.dirname(log_path), worker_id, os.path.basename(log_path))
+
+
+def tag_message(message, worker_id=None):
+    """Return the message tagged by the worker id, the message is returned as is if there's no worker id."""
+    worker_id = worker_id if worker_id else get_worker_id()
+    if not worker_id:
+        return message
+
+    return "[{worker_id}] {message}".format(worker_id=worker_id, message=message)
+
+
+def is_process_alive(pid):
+    """Return True if a process with the given id is running."""
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        return error.errno == errno.EPERM
+
+    return True
+
+
+class WorkersRegistry(object):
+    """Registry of the test run workers, shared through a file per worker in a test run directory.
+
+    Each worker registers once its session starts, and is marked as finished once its session ends - whether
+    or not it used the environment. A registered worker whose process is gone (e.g. crashed) counts as finished.
+    """
+
+    def __init__(self, test_run_id, root_dir=None):
+        """Initialize the workers registry.
+
+        :param str test_run_id: an id shared by all the workers of the test run.
+        :param str root_dir: directory to keep the test run directory in, the temporary directory by default.
+        """
+        self.run_dir = os.path.join(root_dir or tempfile.gettempdir(), "dtt-run-{0}".format(test_run_id))
+
+    def start(self, worker_id):
+        """Register the current process as the given worker."""
+        if not os.path.exists(self.run_dir):
+            try:
+                os.makedirs(self.run_dir)
+            except OSError:
+                # Created by another worker meanwhile
+                pass
+
+        self._write(worker_id, {"pid": os.getpid(), "finished": False})
+
+    def finish(self, worker_id):
+        """Mark the worker as finished, unless it isn't registered (e.g. the registry was already removed)."""
+        state = self._read(worker_id)
+        if state:
+            self._write(worker_id, dict(state, finished=True))
+
+    def all_finished(self, worker_count):
+        """Return True if the given number of workers registered and finished, or their process is gone."""
+        finished = 0
+        for file_name in os.listdir(self.run_dir) if os.path.exists(self.run_dir) else []:
+            state = self._read(os.path.splitext(file_name)[0]) if file_name.endswith(".json") else None
+            if state and (state["finished"] or not is_process_alive(state["pid"])):
+                finished += 1
+
+        return finished >= worker_count
+
+    def remove(self):
+        """Remove the test run directory."""
+        shutil.rmtree(self.run_dir, ignore_errors=True)
+
+    def _read(self, worker_id):
+        """Return the worker state, None if it isn't registered."""
+        try:
+            with open(os.path.join(self.run_dir, worker_id + ".json")) as state_file:
+                return json.load(state_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, worker_id, state):
+        """Write the worker state atomically, so it's never read partially written."""
+        path = os.path.join(self.run_dir, worker_id + ".json")
+        try:
+            with open(path + ".tmp", "w") as state_file:
+                json.dump(state, state_file)
+            os.rename(path + ".tmp", path)
+        except (IOError, OSError):
+            log.debug("Failed writing worker %s state", worker_id, exc_info=True)
+
+
+class SharedEnvironment(object):
+    """Share a single environment between the worker processes of a test run.
+
+    The first worker to call `setup` sets the environment up, while holding a file lock.
+    The other workers wait for the lock and attach to the running environment.
+    The worker which set the environment up owns the log & stats collection, it tears the
+    environment down once every worker has finished (see `WorkersRegistry`).
+
+    The workers coordinate through a lock file & a state file next to the environment logs.
+    """
+
+    def __init__(self, controller, worker_id, worker_count, test_run_id, finish_timeout=DEFAULT_FINISH_TIMEOUT,
+                 interval=1, registry=None):
+        """Initialize the shared environment.
+
+        :param EnvironmentController controller: the current worker controller, created with `shared=True`.
+        :param str worker_id: the current worker id.
+        :param int worker_count: the number of workers in the test run.
+        :param str test_run_id: an id shared by all the workers of the test run.
+        :param int finish_timeout: timeout (in seconds) for the owner to wait for the other workers to finish.
+        :param int interval: interval (in seconds) between checks of the other workers state.
+        :param WorkersRegistry registry: the test run workers registry, the default test run registry if not given.
+        """
+        self.controller = controller
+        self.worker_id = worker_id
+        self.worker_count = worker_count
+        self.test_run_id = test_run_id
+        self.finish_timeout = finish_timeout
+        self.interval = interval
+        self.is_owner = False
+        self.registry = registry if registry else WorkersRegistry(test_run_id)
+
+        state_dir = os.path.dirname(os.path.abspath(controller.log_path))
+        if not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+
+        self.lock_path = os.path.join(state_dir, ".{0}.dtt.lock".format(controller.project_name))
+        self.state_path = os.path.join(state_dir, ".{0}.dtt.json".format(controller.project_name))
+
+    def setup(self):
+        """Set the environment up, or attach to it if another worker already did."""
+        self.registry.start(self.worker_id)
+        with self._locked():
+            state = self._read_state()
+            if state and state["test_run_id"] == self.test_run_id:
+                log.debug("Worker %s attaching to environment set up by %s", self.worker_id, state["owner"])
+                self.controller.attach()
+                return
+
+            log.debug("Worker %s setting up the shared environment", self.worker_id)
+            self.controller.setup()
+            self.is_owner = True
+            self._write_state({"test_run_id": self.test_run_id, "owner": self.worker_id})
+
+    def teardown(self):
+        """Mark the current worker as finished, the owner tears the environment down once all workers finished."""
+        self.registry.finish(self.worker_id)
+        if not self.is_owner:
+            self.controller.detach()
+            return
+
+        log.debug("Waiting for all workers to finish before tearing down the shared environment")
+        try:
+            waiting.wait(self._all_finished, sleep_seconds=self.interval, timeout_seconds=self.finish_timeout)
+        except waiting.TimeoutExpired:
+            log.warning("Not all workers finished within %s seconds, tearing down anyway", self.finish_timeout)
+
+        with self._locked():
+            try:
+                self.controller.teardown()
+            finally:
+                os.remove(self.state_path)
+                self.registry.remove()
+
+    def _all_finished(self):
+        """Return True if all the workers finished."""
+        return self.registry.all_finished(self.worker_count)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the workers file lock within the context."""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_state(self):
+        """Return the workers shared state, must be called while holding the lock."""
+        if not os.path.exists(self.state_path):
+            return {}
+
+        with open(self.state_path) as state_file:
+            return json.load(state_file)
+
+    def _write_state(self, state):
+        """Write the workers shared state, must be called while holding the lock."""
+        with open(self.state_path, "w") as state_file:
+            json.dump(state, state_file)
@@ -0,0 +1,120 @@
+"""Benchmark of the parallel log splitting throughput versus the log collector splitting.
+
+Generates a synthetic combined log file, splits it using `LogCollector._split_logs` and `log_split.split_logs`,
+validates both wrote the same services log files and prints their throughput.
+
+Usage:
+
+    python tests/benchmarks/benchmark_log_split.py [--size-mb 4096] [--services 20] [--workers 8]
+"""
+import io
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+# Run as a plain script from a source checkout, so the repository root isn't on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from docker_test_tools import log_split, logs  # noqa: E402
+
+LINE_FORMAT = u"{service:<12}| 2024-01-01T10:{minute:02d}:{second:02d}.{micros:06d}Z {level} {message}\n"
+COMMON_FORMAT = u"\n>>> 2024-01-01T10:{minute:02d}:00 ========= TEST {stage}: test_{number} =========\n\n"
+MESSAGES = [
+    u"request handled in 12ms",
+    u"connection from 10.0.0.1:5432 accepted",
+    u"cache miss for key user:1234, loading from the database",
+    u"health check passed",
+    u"retrying the operation, attempt 3 out of 5 - the remote service did not respond in time",
+]
+
+
+def generate_log(log_path, size, services, seed=0):
+    """Write a synthetic combined log file of (about) the given size, return its size."""
+    rand = random.Random(seed)
+    names = ["service{0}-1".format(index) for index in range(services)]
+    written = 0
+    test_number = 0
+    with io.open(log_path, "w", encoding="utf-8") as log_file:
+        while written < size:
+            test_number += 1
+            lines = [COMMON_FORMAT.format(minute=test_number % 60, stage="BEGINNING", number=test_number)]
+            for index in range(10000):
+                lines.append(LINE_FORMAT.format(
+                    service=rand.choice(names), minute=test_number % 60, second=index % 60, micros=index,
+                    level=rand.choice([u"INFO", u"DEBUG", u"WARN"]), message=rand.choice(MESSAGES),
+                ))
+
+            lines.append(COMMON_FORMAT.format(minute=test_number % 60, stage="END", number=test_number))
+            chunk = u"".join(lines)
+            log_file.write(chunk)
+            written += len(chunk.encode("utf-8"))
+
+    return os.path.getsize(log_path)
+
+
+def digest_services_logs(log_dir, log_path):
+    """Return the services log files digests, removing them."""
+    digests = {}
+    for file_name in os.listdir(log_dir):
+        path = os.path.join(log_dir, file_name)
+        if file_name.endswith(".log") and path != log_path:
+            digest = hashlib.md5()
+            with io.open(path, "rb") as log_file:
+                for block in iter(lambda: log_file.read(1024 * 1024), b""):
+                    digest.update(block)
+
+            digests[file_name] = digest.hexdigest()
+            os.remove(path)
+
+    return digests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=4096, help="the synthetic log file size (MB)")
+    parser.add_argument("--services", type=int, default=20, help="the number of services in the log file")
+    parser.add_argument("--workers", type=int, default=0, help="number of worker processes (default: CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=log_split.DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                        help="the size (MB) of the log file chunks split by each worker")
+    parser.add_argument("--dir", help="directory for the synthetic log file (default: a temporary directory)")
+    args = parser.parse_args()
+
+    log_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        log_path = os.path.join(log_dir, "docker-tests.log")
+        start = time.time()
+        size = generate_log(log_path, args.size_mb * 1024 * 1024, args.services)
+        print("generated {0:.0f} MB log file in {1:.1f} seconds".format(size / 1024.0 / 1024, time.time() - start))
+
+        start = time.time()
+        logs.LogCollector(log_path=log_path, encoding="utf-8", compose=None)._split_logs()
+        serial_time = time.time() - start
+        expected = digest_services_logs(log_dir, log_path)
+
+        start = time.time()
+        log_split.split_logs(log_path, encoding="utf-8", workers=args.workers,
+                             chunk_size=args.chunk_size * 1024 * 1024)
+        parallel_time = time.time() - start
+        actual = digest_services_logs(log_dir, log_path)
+
+        megabytes = size / 1024.0 / 1024
+        print("LogCollector._split_logs: {0:.1f} seconds, {1:.1f} MB/s".format(serial_time, megabytes / serial_time))
+        print("log_split.split_logs: {0:.1f} seconds, {1:.1f} MB/s ({2:.1f}x)".format(
+            parallel_time, megabytes / parallel_time, serial_time / parallel_time))
+
+        if actual != expected:
+            print("the split services log files differ")
+            return 1
+
+        return 0
+    finally:
+        shutil.rmtree(log_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Benchmark of the docker_test_tools import time and EnvironmentController construction time.
+
+Guards against startup regressions - exits with a non-zero status if a measurement exceeds its limit.
+
+Usage:
+
+    python tests/benchmarks/benchmark_startup.py [--import-limit 0.15] [--construct-limit 0.005]
+"""
+import sys
+import time
+import argparse
+import subprocess
+
+IMPORT_SCRIPT = (
+    "import time\n"
+    "start = time.time()\n"
+    "import docker_test_tools.environment\n"
+    "print(time.time() - start)\n"
+)
+
+CONSTRUCT_SCRIPT = (
+    "import time\n"
+    "from docker_test_tools.environment import EnvironmentController\n"
+    "start = time.time()\n"
+    "for _ in range({repeat}):\n"
+    "    EnvironmentController(project_name='project', compose_path='docker-compose.yml',\n"
+    "                          compose_command='docker-compose', log_path='logs/docker.log', collect_stats=True)\n"
+    "print((time.time() - start) / {repeat})\n"
+)
+
+
+def measure(script, rounds):
+    """Run the script in fresh interpreters, return the best (lowest) reported duration."""
+    return min(float(subprocess.check_output([sys.executable, "-c", script])) for _ in range(rounds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="number of fresh interpreters to measure in")
+    parser.add_argument("--repeat", type=int, default=100, help="number of controllers created per round")
+    parser.add_argument("--import-limit", type=float, default=0.15, help="max import time (seconds)")
+    parser.add_argument("--construct-limit", type=float, default=0.005, help="max construction time (seconds)")
+    args = parser.parse_args()
+
+    start = time.time()
+    import_time = measure(IMPORT_SCRIPT, args.rounds)
+    construct_time = measure(CONSTRUCT_SCRIPT.format(repeat=args.repeat), args.rounds)
+
+    print("import docker_test_tools.environment: {0:.2f} ms (limit {1:.2f} ms)".format(
+        import_time * 1000, args.import_limit * 1000))
+    print("EnvironmentController(): {0:.3f} ms (limit {1:.3f} ms)".format(
+        construct_time * 1000, args.construct_limit * 1000))
+    print("benchmark took {0:.1f} seconds".format(time.time() - start))
+
+    if import_time > args.import_limit or construct_time > args.construct_limit:
+        print("startup regression detected")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import api_version
+
+
+class TestApiVersion(unittest.TestCase):
+    """Test for the docker server api version discovery."""
+
+    def setUp(self):
+        """Use a temporary cache and a clean docker environment."""
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.cache_path = os.path.join(self.cache_dir, "cache", "versions.json")
+
+        for patcher in [mock.patch.object(api_version, "CACHE_PATH", self.cache_path),
+                        mock.patch.dict(os.environ, {"DOCKER_HOST": "tcp://docker-host:2375"})]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        os.environ.pop("DOCKER_API_VERSION", None)
+
+    def test_negotiate_and_cache(self):
+        """Validate the negotiated version is cached per docker host."""
+        client = mock.MagicMock(api_version="1.41")
+        self.assertEqual(api_version.get_server_api_version(client), "1.41")
+
+        with open(self.cache_path) as cache_file:
+            self.assertEqual(json.load(cache_file)["tcp://docker-host:2375"]["version"], "1.41")
+
+        # Cached - the client isn't used
+        client = mock.MagicMock(api_version="1.43")
+        self.assertEqual(api_version.get_server_api_version(client), "1.41")
+
+        # Other docker hosts negotiate their own version
+        os.environ["DOCKER_HOST"] = "tcp://other-host:2375"
+        self.assertEqual(api_version.get_server_api_version(client), "1.43")
+
+    def test_cache_expired(self):
+        """Validate the version is negotiated again once the cached version expires."""
+        api_version.get_server_api_version(mock.MagicMock(api_version="1.41"))
+        with mock.patch.object(api_version, "CACHE_TTL", 0):
+            self.assertIsNone(api_version.get_known_api_version())
+            self.assertEqual(api_version.get_server_api_version(mock.MagicMock(api_version="1.43")), "1.43")
+
+    def test_invalid_cache(self):
+        """Validate an invalid cache file is ignored."""
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, "w") as cache_file:
+            cache_file.write("not json")
+
+        self.assertIsNone(api_version.get_known_api_version())
+        self.assertEqual(api_version.get_server_api_version(mock.MagicMock(api_version="1.41")), "1.41")
+
+    def test_pinned_version(self):
+        """Validate negotiation is skipped when the version is pinned."""
+        client = mock.MagicMock()
+        with mock.patch.dict(os.environ, {"DOCKER_API_VERSION": "1.40"}):
+            self.assertEqual(api_version.get_server_api_version(client), "1.40")
+
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    @mock.patch("docker.APIClient")
+    def test_create_client(self, client_mock):
+        """Validate the client connects to the DOCKER_HOST, using the known version if any."""
+        api_version.create_client()
+        client_mock.assert_called_once_with(version="auto", base_url="tcp://docker-host:2375")
+
+        client_mock.reset_mock()
+        with mock.patch.dict(os.environ, {"DOCKER_API_VERSION": "1.40"}):
+            api_version.create_client()
+        client_mock.assert_called_once_with(version="1.40", base_url="tcp://docker-host:2375")
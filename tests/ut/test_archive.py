@@ -0,0 +1,86 @@
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from docker_test_tools import archive
+
+
+class TestArchive(unittest.TestCase):
+    """Test for the streaming archive utilities."""
+
+    def setUp(self):
+        """Create source & target temporary directories."""
+        self.source_dir = tempfile.mkdtemp()
+        self.target_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directories."""
+        shutil.rmtree(self.source_dir)
+        shutil.rmtree(self.target_dir)
+
+    def create_file(self, relative_path, content):
+        """Create a file under the source directory and return its path."""
+        path = os.path.join(self.source_dir, relative_path)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with open(path, "wb") as target:
+            target.write(content)
+
+        return path
+
+    def read_target(self, relative_path):
+        """Return the content of a file under the target directory."""
+        with open(os.path.join(self.target_dir, relative_path), "rb") as source:
+            return source.read()
+
+    def test_round_trip(self):
+        """Validate files & directories survive archiving and extraction in small chunks."""
+        single_file = self.create_file("single.bin", os.urandom(1500))
+        self.create_file(os.path.join("fixtures", "a.txt"), b"a" * 512)
+        self.create_file(os.path.join("fixtures", "nested", "b.txt"), b"")
+        fixtures_dir = os.path.join(self.source_dir, "fixtures")
+
+        chunks = list(archive.iter_tar([single_file, fixtures_dir], chunk_size=100))
+        self.assertTrue(all(len(chunk) <= 1024 for chunk in chunks))
+
+        extracted = archive.extract_tar(chunks=iter(chunks), target_dir=self.target_dir)
+        self.assertIn("single.bin", extracted)
+        self.assertIn(os.path.join("fixtures", "nested", "b.txt"), extracted)
+
+        with open(single_file, "rb") as source:
+            self.assertEqual(self.read_target("single.bin"), source.read())
+
+        self.assertEqual(self.read_target(os.path.join("fixtures", "a.txt")), b"a" * 512)
+        self.assertEqual(self.read_target(os.path.join("fixtures", "nested", "b.txt")), b"")
+
+    def test_archive_is_readable_by_tarfile(self):
+        """Validate the generated archive is a valid tar archive."""
+        self.create_file("file.txt", b"content")
+        data = b"".join(archive.iter_tar([os.path.join(self.source_dir, "file.txt")]))
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(tar.getnames(), ["file.txt"])
+            self.assertEqual(tar.extractfile("file.txt").read(), b"content")
+
+    def test_extract_outside_target(self):
+        """Validate members escaping the target directory are rejected."""
+        data = io.BytesIO()
+        with tarfile.open(fileobj=data, mode="w") as tar:
+            info = tarfile.TarInfo("../escape.txt")
+            info.size = 4
+            tar.addfile(info, io.BytesIO(b"evil"))
+
+        with self.assertRaises(RuntimeError):
+            archive.extract_tar(chunks=[data.getvalue()], target_dir=self.target_dir)
+
+    def test_chunks_reader(self):
+        """Validate the chunks reader returns the requested sizes across chunks."""
+        reader = archive.ChunksReader([b"abc", b"", b"defg", b"h"])
+        self.assertEqual(reader.read(2), b"ab")
+        self.assertEqual(reader.read(4), b"cdef")
+        self.assertEqual(reader.read(), b"gh")
+        self.assertEqual(reader.read(1), b"")
@@ -0,0 +1,229 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import cgroup_stats, stats
+
+NET_DEV = (
+    u"Inter-|   Receive                            |  Transmit\n"
+    u" face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets\n"
+    u"    lo:    1000      10    0    0    0     0          0         0     1000      10\n"
+    u"  eth0:    2048      20    0    0    0     0          0         0      512       5\n"
+    u"  eth1:    1024      20    0    0    0     0          0         0      512       5\n"
+)
+
+
+class FakeClock(object):
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCgroupStats(unittest.TestCase):
+    """Test for the cgroup stats sampling, using fake cgroup & proc file systems."""
+
+    CONTAINER_ID = "0123456789abcdef"
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.cgroup_root = os.path.join(self.root, "cgroup")
+        self.proc_root = os.path.join(self.root, "proc")
+        self.write(os.path.join(self.proc_root, "100", "net", "dev"), NET_DEV)
+
+    def write(self, path, content):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        with io.open(path, "w") as target:
+            target.write(content)
+
+    def create_v2_tree(self, usage_usec=1000000, memory=10 * 1024 * 1024):
+        container_dir = os.path.join(self.cgroup_root, "system.slice", "docker-%s.scope" % self.CONTAINER_ID)
+        self.write(os.path.join(self.cgroup_root, "cgroup.controllers"), u"cpu io memory pids\n")
+        self.write(os.path.join(self.proc_root, "100", "cgroup"),
+                   u"0::/system.slice/docker-%s.scope\n" % self.CONTAINER_ID)
+        self.write(os.path.join(container_dir, "cpu.stat"),
+                   u"usage_usec %d\nuser_usec 600000\nsystem_usec 400000\n" % usage_usec)
+        self.write(os.path.join(container_dir, "memory.current"), u"%d\n" % memory)
+        self.write(os.path.join(container_dir, "memory.stat"), u"anon 4096\ninactive_file 1048576\n")
+        self.write(os.path.join(container_dir, "io.stat"),
+                   u"8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n8:16 rbytes=4096 wbytes=0\n")
+        return container_dir
+
+    def create_v1_tree(self):
+        self.write(os.path.join(self.proc_root, "100", "cgroup"), (
+            u"12:memory:/docker/{0}\n"
+            u"11:cpu,cpuacct:/docker/{0}\n"
+            u"10:blkio:/docker/{0}\n"
+            u"1:name=systemd:/docker/{0}\n"
+        ).format(self.CONTAINER_ID))
+        self.write(os.path.join(self.cgroup_root, "cpu,cpuacct", "docker", self.CONTAINER_ID, "cpuacct.usage"),
+                   u"2500000000\n")
+        memory_dir = os.path.join(self.cgroup_root, "memory", "docker", self.CONTAINER_ID)
+        self.write(os.path.join(memory_dir, "memory.usage_in_bytes"), u"20971520\n")
+        self.write(os.path.join(memory_dir, "memory.stat"), u"cache 2097152\ntotal_inactive_file 1048576\n")
+        self.write(os.path.join(self.cgroup_root, "blkio", "docker", self.CONTAINER_ID,
+                                "blkio.throttle.io_service_bytes"),
+                   u"8:0 Read 4096\n8:0 Write 8192\n8:0 Sync 0\n8:0 Total 12288\nTotal 12288\n")
+
+    def test_read_v2(self):
+        """Validate reading the container stats from the cgroup v2 files."""
+        self.create_v2_tree()
+        container = cgroup_stats.ContainerCgroup("service1", 100, self.cgroup_root, self.proc_root)
+        self.addCleanup(container.close)
+        self.assertEqual(container.read(), (1.0, 9 * 1024 * 1024, 3072, 1024, 8192, 8192))
+
+    def test_read_v1(self):
+        """Validate reading the container stats from the cgroup v1 files."""
+        self.create_v1_tree()
+        container = cgroup_stats.ContainerCgroup("service1", 100, self.cgroup_root, self.proc_root)
+        self.addCleanup(container.close)
+        self.assertEqual(container.read(), (2.5, 19 * 1024 * 1024, 3072, 1024, 4096, 8192))
+
+    def test_find_by_container_id(self):
+        """Validate the container cgroup is found by its id when its process isn't visible."""
+        self.create_v2_tree()
+        shutil.rmtree(os.path.join(self.proc_root, "100"))
+        container = cgroup_stats.ContainerCgroup("service1", 100, self.cgroup_root, self.proc_root,
+                                                 container_id=self.CONTAINER_ID)
+        self.addCleanup(container.close)
+        self.assertEqual(container.read(), (1.0, 9 * 1024 * 1024, 0, 0, 8192, 8192))
+
+        with self.assertRaises(IOError):
+            cgroup_stats.ContainerCgroup("service1", 100, self.cgroup_root, self.proc_root, container_id="other")
+
+        # The pid may belong to an unrelated process, when the container runs in another pid namespace
+        self.write(os.path.join(self.proc_root, "100", "cgroup"), u"0::/user.slice/session-1.scope\n")
+        self.write(os.path.join(self.proc_root, "100", "net", "dev"), NET_DEV)
+        container = cgroup_stats.ContainerCgroup("service1", 100, self.cgroup_root, self.proc_root,
+                                                 container_id=self.CONTAINER_ID)
+        self.addCleanup(container.close)
+        self.assertEqual(container.read(), (1.0, 9 * 1024 * 1024, 0, 0, 8192, 8192))
+
+        shutil.rmtree(self.cgroup_root)
+        self.create_v1_tree()
+        self.assertEqual(cgroup_stats.find_container_cgroup_dirs(self.CONTAINER_ID, self.cgroup_root), {
+            "memory": os.path.join(self.cgroup_root, "memory", "docker", self.CONTAINER_ID),
+            "cpu": os.path.join(self.cgroup_root, "cpu,cpuacct", "docker", self.CONTAINER_ID),
+            "cpuacct": os.path.join(self.cgroup_root, "cpu,cpuacct", "docker", self.CONTAINER_ID),
+            "blkio": os.path.join(self.cgroup_root, "blkio", "docker", self.CONTAINER_ID),
+        })
+
+    def test_unresolved_cgroup(self):
+        """Validate a warning is logged once when the containers cgroups can't be resolved."""
+        docker_client = mock.MagicMock()
+        docker_client.containers.return_value = [{"Id": self.CONTAINER_ID, "Names": ["/project-service1-1"]}]
+        docker_client.inspect_container.return_value = {"State": {"Pid": 200, "Running": True}}
+        collector = cgroup_stats.CgroupStatsCollector(
+            target_dir_path=self.root, project="project", encoding="utf-8", environment_variables={},
+            docker_client=docker_client, cgroup_root=self.cgroup_root, proc_root=self.proc_root,
+        )
+
+        with mock.patch.object(cgroup_stats.log, "warning") as warning:
+            collector.refresh()
+            collector.refresh()
+
+        self.assertEqual(collector.containers, {})
+        self.assertEqual(warning.call_count, 1)
+
+    def test_collector(self):
+        """Validate the sampled stats are written to the stats file, and summarized."""
+        container_dir = self.create_v2_tree()
+        docker_client = mock.MagicMock()
+        docker_client.containers.return_value = [{"Id": self.CONTAINER_ID, "Names": ["/project-service1-1"]}]
+        docker_client.inspect_container.return_value = {"State": {"Pid": 100}}
+        clock = FakeClock()
+
+        collector = cgroup_stats.CgroupStatsCollector(
+            target_dir_path=self.root, project="project", encoding="utf-8", environment_variables={},
+            docker_client=docker_client, frequency=100, cgroup_root=self.cgroup_root, proc_root=self.proc_root,
+            clock=clock,
+        )
+        self.assertEqual(collector.interval, 0.01)
+        collector._open_stats_file()
+        collector.refresh()
+        docker_client.containers.assert_called_once_with(filters={"label": "com.docker.compose.project=project"})
+
+        collector.sample()
+        collector.update("test_one")
+        for usage_usec in [1500000, 1600000]:
+            clock.now += 1
+            self.write(os.path.join(container_dir, "cpu.stat"), u"usage_usec %d\n" % usage_usec)
+            collector.sample()
+
+        collector.stop()
+
+        with io.open(collector.stats_file_path) as stats_file:
+            lines = stats_file.readlines()
+
+        self.assertEqual(lines[0], u">>> test_one\n")
+        samples = [json.loads(line) for line in lines[1:]]
+        self.assertEqual([(sample["name"], sample["cpu"], sample["ram"]) for sample in samples],
+                         [("project-service1-1", 50.0, 9437184), ("project-service1-1", 10.0, 9437184)])
+
+        with io.open(collector.stats_summary_path) as summary_file:
+            summary = json.load(summary_file)
+        self.assertEqual(summary["project-service1-1"]["cpu"], {"min": "10.00", "max": "50.00", "avg": "30.00"})
+        self.assertEqual(summary["project-service1-1"]["ram"]["max"], "9.44 MB")
+
+        with io.open(os.path.join(collector.work_dir, "project-service1-1.json")) as service_file:
+            service_stats = json.load(service_file)
+        self.assertEqual(service_stats[0], {"test": "test_one"})
+        self.assertEqual(service_stats[1]["time"], samples[0]["time"])
+
+    def test_stopped_container(self):
+        """Validate containers whose cgroup was removed are no longer sampled."""
+        self.create_v2_tree()
+        collector = cgroup_stats.CgroupStatsCollector(
+            target_dir_path=self.root, project="project", encoding="utf-8", environment_variables={},
+            docker_client=mock.MagicMock(), cgroup_root=self.cgroup_root, proc_root=self.proc_root,
+        )
+        collector.stats_file = mock.MagicMock()
+        collector.containers["id"] = container = mock.MagicMock()
+        container.read.side_effect = IOError("No such device")
+
+        collector.sample()
+        self.assertEqual(collector.containers, {})
+        container.close.assert_called_once_with()
+
+    def test_parse_numeric_line(self):
+        """Validate stats lines with numbers (and the sample time) are parsed as docker stats lines."""
+        stats_path = os.path.join(self.root, "stats.json")
+        self.write(stats_path, u"")
+        cluster_stats = stats.ClusterStats(stat_file_path=stats_path, encoding="utf-8")
+        parsed = cluster_stats.parse_line(json.dumps({
+            "name": "service1", "cpu": 12.5, "ram": 1024, "net": 0, "block": 2048, "time": 1700000000.5,
+        }))
+        self.assertEqual(parsed["cpu"], 12.5)
+        self.assertEqual(parsed["time"], 1700000000.5)
+        self.assertEqual((parsed["net_tx"], parsed["block_write"]), (0, 0))
+
+        parsed = cluster_stats.parse_line(json.dumps({
+            "name": "service1", "cpu": 12.5, "ram": 1024, "net": 1, "net_tx": 2, "block": 3, "block_write": 4,
+        }))
+        self.assertEqual([parsed[field] for field in ["net", "net_tx", "block", "block_write"]], [1, 2, 3, 4])
+
+        parsed = cluster_stats.parse_line(json.dumps({
+            "name": "service1", "cpu": "1.50%", "ram": "1KiB / 2GiB", "net": "1KiB / 2KiB", "block": "3KiB / 4KiB",
+        }))
+        self.assertEqual([parsed[field] for field in ["net", "net_tx", "block", "block_write"]],
+                         [1024, 2048, 3072, 4096])
+        self.assertIsNone(cluster_stats.parse_line(json.dumps({"name": "service1", "cpu": 12.5, "ram": 1024})))
+        self.assertEqual(cluster_stats.parse_line(json.dumps({
+            "name": "service1", "cpu": "1.50%", "ram": "1KiB / 2GiB", "net": "--", "block": "0B / 0B",
+        }))["ram"], 1024)
@@ -13,6 +13,11 @@ class TestCompose(unittest.TestCase):
     def setUp(self):
         self.compose = Compose("path", "project", "env", "command")
 
+    def test_multiple_files_and_profiles(self):
+        compose = Compose(["base.yml", "override.yml"], "project", "env", "docker compose", profiles="db, cache")
+        self.assertEqual(compose.command, ["docker", "compose", "-f", "base.yml", "-f", "override.yml",
+                                           "--profile", "db", "--profile", "cache", "-p", "project"])
+
     @patch("subprocess.check_output")
     def test_get_services(self, mock_check_output):
         mock_check_output.return_value = "service1\nservice2\n"
@@ -26,6 +31,14 @@ class TestCompose(unittest.TestCase):
         self.compose.up()
         mock_check_output.assert_called_once()
 
+    @patch("subprocess.check_output")
+    def test_create_and_start(self, mock_check_output):
+        mock_check_output.return_value = ""
+        self.compose.create(services=["service1"])
+        self.compose.start(services=["service1"])
+        self.assertEqual([call[0][0][-4:] for call in mock_check_output.call_args_list],
+                         [["up", "--build", "--no-start", "service1"], ["-p", "project", "start", "service1"]])
+
     @patch("subprocess.check_output")
     def test_down(self, mock_check_output):
         mock_check_output.return_value = ""
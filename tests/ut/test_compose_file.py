@@ -0,0 +1,154 @@
+import os
+import shutil
+import tempfile
+import unittest
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import compose_file
+
+
+class TestComposeFile(unittest.TestCase):
+    """Test for the compose file utilities."""
+
+    COMPOSE_CONFIG = {
+        "version": "2.1",
+        "services": {
+            "service1": {
+                "image": "image1",
+                "container_name": "fixed-name",
+                "ports": [
+                    "8500:8500",
+                    "127.0.0.1:8080:80/udp",
+                    "9000",
+                    {"target": 5000, "published": 5000, "protocol": "tcp"},
+                ],
+            },
+            "service2": {"image": "image2"},
+        },
+    }
+
+    METADATA_COMPOSE = """
+version: '3.4'
+services:
+  db:
+    image: postgres
+    healthcheck:
+      test: ["CMD-SHELL", "pg_isready -U $${USER}"]
+  app:
+    image: app
+    ports:
+      - "${APP_PORT:-8080}:80"
+    depends_on:
+      - db
+  debug:
+    image: busybox
+    profiles: ["debug"]
+"""
+
+    def setUp(self):
+        """Create a temporary directory, used for the metadata cache as well."""
+        self.test_dir = tempfile.mkdtemp()
+        cache_patcher = mock.patch.object(compose_file, "CACHE_DIR", os.path.join(self.test_dir, "cache"))
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+
+    def write_file(self, name, content):
+        """Write a file to the test directory, return its path."""
+        path = os.path.join(self.test_dir, name)
+        with open(path, "w") as target_file:
+            target_file.write(content)
+        return path
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_dir)
+
+    def test_dump_and_load(self):
+        """Validate a compose config survives writing & reading."""
+        compose_path = os.path.join(self.test_dir, "docker-compose.yml")
+        compose_file.dump(self.COMPOSE_CONFIG, compose_path)
+        self.assertEqual(compose_file.load(compose_path), self.COMPOSE_CONFIG)
+
+    def test_with_ephemeral_ports(self):
+        """Validate host ports & container names are removed from the services."""
+        rewritten = compose_file.with_ephemeral_ports(self.COMPOSE_CONFIG)
+
+        self.assertEqual(rewritten["services"]["service1"]["ports"],
+                         ["8500", "127.0.0.1::80/udp", "9000", {"target": 5000, "protocol": "tcp"}])
+        self.assertNotIn("container_name", rewritten["services"]["service1"])
+        self.assertEqual(rewritten["services"]["service2"], {"image": "image2"})
+
+        # The original config is left untouched
+        self.assertEqual(self.COMPOSE_CONFIG["services"]["service1"]["ports"][0], "8500:8500")
+
+    def test_get_metadata(self):
+        """Validate the services metadata, including variables interpolation & profiles."""
+        compose_path = self.write_file("docker-compose.yml", self.METADATA_COMPOSE)
+
+        metadata = compose_file.get_metadata([compose_path], environment={})
+        self.assertEqual(metadata["services"], ["app", "db"])
+        self.assertEqual(metadata["depends_on"], {"app": ["db"], "db": []})
+        self.assertEqual(metadata["ports"], {"app": ["8080:80"], "db": []})
+        self.assertEqual(metadata["healthchecks"]["db"]["test"], ["CMD-SHELL", "pg_isready -U ${USER}"])
+        self.assertIsNone(metadata["healthchecks"]["app"])
+
+        # Variables are taken from the '.env' file, overridden by the environment
+        self.write_file(".env", "APP_PORT=9090\n")
+        metadata = compose_file.get_metadata([compose_path], environment={"COMPOSE_PROFILES": "debug"})
+        self.assertEqual(metadata["services"], ["app", "db", "debug"])
+        self.assertEqual(metadata["ports"]["app"], ["9090:80"])
+        metadata = compose_file.get_metadata([compose_path], environment={"APP_PORT": "7070"})
+        self.assertEqual(metadata["ports"]["app"], ["7070:80"])
+
+    def test_get_metadata_override(self):
+        """Validate later compose files override earlier ones."""
+        compose_path = self.write_file("docker-compose.yml", self.METADATA_COMPOSE)
+        override_path = self.write_file("docker-compose.override.yml", """
+services:
+  app:
+    ports: ["9000:9000"]
+    healthcheck:
+      test: ["CMD", "true"]
+  worker:
+    image: worker
+""")
+
+        metadata = compose_file.get_metadata([compose_path, override_path], environment={})
+        self.assertEqual(metadata["services"], ["app", "db", "worker"])
+        self.assertEqual(metadata["ports"]["app"], ["8080:80", "9000:9000"])
+        self.assertEqual(metadata["healthchecks"]["app"], {"test": ["CMD", "true"]})
+        self.assertEqual(metadata["depends_on"]["app"], ["db"])
+
+    def test_get_metadata_cache(self):
+        """Validate the metadata is cached by the files content & the variables they use."""
+        compose_path = self.write_file("docker-compose.yml", self.METADATA_COMPOSE)
+        compose_file.get_metadata([compose_path], environment={})
+
+        with mock.patch.object(compose_file, "_parse_metadata", return_value={"services": []}) as parse_mock:
+            compose_file.get_metadata([compose_path], environment={"UNUSED": "value"})
+            parse_mock.assert_not_called()
+
+            compose_file.get_metadata([compose_path], environment={"APP_PORT": "7070"})
+            self.assertEqual(parse_mock.call_count, 1)
+
+            self.write_file("docker-compose.yml", self.METADATA_COMPOSE + "  cache:\n    image: redis\n")
+            compose_file.get_metadata([compose_path], environment={})
+            self.assertEqual(parse_mock.call_count, 2)
+
+    def test_get_metadata_unsupported(self):
+        """Validate None is returned for missing files and unsupported features."""
+        self.assertIsNone(compose_file.get_metadata([os.path.join(self.test_dir, "missing.yml")]))
+
+        compose_path = self.write_file("docker-compose.yml", """
+services:
+  app:
+    extends:
+      file: common.yml
+      service: base
+""")
+        self.assertIsNone(compose_file.get_metadata([compose_path], environment={}))
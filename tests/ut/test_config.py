@@ -33,16 +33,28 @@ class TestConfig(unittest.TestCase):
         self.assertEquals(config.project_name, Config.DEFAULT_PROJECT_NAME)
         self.assertEquals(config.reuse_containers, Config.DEFAULT_REUSE_CONTAINERS)
         self.assertEquals(config.docker_compose_path, Config.DEFAULT_DOCKER_COMPOSE_PATH)
+        self.assertEquals(config.isolate_workers, Config.DEFAULT_ISOLATE_WORKERS)
 
     def test_happy_flow_using_file(self):
         """Parse a valid config file and validate operation success."""
         test_config = {Config.REUSE_CONTAINERS_OPTION: True,
                        Config.LOG_PATH_OPTION: 'test-log-path',
                        Config.PROJECT_NAME_OPTION: 'test-project',
-                       Config.DOCKER_COMPOSE_PATH_OPTION: 'test-docker-compose-path'}
+                       Config.DOCKER_COMPOSE_PATH_OPTION: 'test-docker-compose-path',
+                       Config.ISOLATE_WORKERS_OPTION: True,
+                       Config.COMPOSE_PROFILES_OPTION: 'db,cache',
+                       Config.STREAM_LOGS_OPTION: True,
+                       Config.INDEX_LOGS_OPTION: True,
+                       Config.LOG_LINES_PER_SECOND_OPTION: 100}
 
         test_config_path = self.create_config_file(config_input=test_config)
         config = Config(config_path=test_config_path)
+        self.assertTrue(config.isolate_workers)
+        self.assertEquals(config.compose_profiles, 'db,cache')
+        self.assertTrue(config.stream_logs)
+        self.assertTrue(config.index_logs)
+        self.assertEqual(config.log_lines_per_second, 100)
+        self.assertEqual(config.log_bytes_per_second, Config.DEFAULT_LOG_BYTES_PER_SECOND)
 
         self.assertEquals(config.log_path, test_config[Config.LOG_PATH_OPTION])
         self.assertEquals(config.project_name, test_config[Config.PROJECT_NAME_OPTION])
@@ -65,6 +77,22 @@ class TestConfig(unittest.TestCase):
             self.assertEquals(config.reuse_containers, test_config[Config.REUSE_CONTAINERS_ENV_VAR])
             self.assertEquals(config.docker_compose_path, test_config[Config.DOCKER_COMPOSE_PATH_ENV_VAR])
 
+    def test_env_flags(self):
+        """Validate flag env vars are parsed as booleans."""
+        test_config = {Config.EXPORT_OPENMETRICS_ENV_VAR: '0',
+                       Config.ISOLATE_WORKERS_ENV_VAR: 'False',
+                       Config.INDEX_LOGS_ENV_VAR: 'true',
+                       Config.PROFILE_ENV_VAR: '1'}
+
+        with mock.patch('os.environ.get', test_config.get):
+            config = Config(export_openmetrics=True, isolate_workers=True, stream_logs=True)
+
+        self.assertIs(config.export_openmetrics, False)
+        self.assertIs(config.isolate_workers, False)
+        self.assertIs(config.index_logs, True)
+        self.assertIs(config.profile, True)
+        self.assertIs(config.stream_logs, True)
+
     def test_missing_optional_option(self):
         """Parse a valid config file, with missing optional options and validate operation success."""
         test_config = {Config.DOCKER_COMPOSE_PATH_OPTION: 'test-docker-compose-path'}
@@ -1,5 +1,9 @@
 import os
+import sys
+import json
+import shutil
 import docker
+import tempfile
 import unittest
 import subprocess
 from waiting import TimeoutExpired
@@ -10,7 +14,8 @@ if PY3:
 else:
     import mock
 
-from docker_test_tools import environment, compose
+from docker_test_tools import environment, compose, metrics
+from docker_test_tools.pytest_plugin import pytest_plugin
 
 SERVICE_NAMES = ["consul.service", "mocked.service"]
 
@@ -35,6 +40,16 @@ services:
         self.compose_path = "test-compose-path"
         self.log_path = "/tmp/test-target-log-path"
 
+        # Keep the negotiated api versions & parsed compose files out of the user cache
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        for cache_patcher in [
+            mock.patch("docker_test_tools.api_version.CACHE_PATH", os.path.join(cache_dir, "versions.json")),
+            mock.patch("docker_test_tools.compose_file.CACHE_DIR", os.path.join(cache_dir, "compose")),
+        ]:
+            cache_patcher.start()
+            self.addCleanup(cache_patcher.stop)
+
         self.controller = self.get_controller()
 
     def tearDown(self):
@@ -160,6 +175,67 @@ services:
             ):
                 self.assertFalse(self.controller.is_container_ready("test"))
 
+    def test_metrics(self):
+        """Validate the container operations latency is reported to the metrics observers."""
+        histogram = metrics.HistogramObserver()
+        self.controller.metrics.add_observer(histogram)
+
+        with mock.patch(
+            "docker_test_tools.compose.Compose.get_service_container_id",
+            mock.MagicMock(return_value="container-id"),
+        ):
+            with mock.patch.object(docker.APIClient, "kill"):
+                self.controller.kill_container("service1")
+
+            with mock.patch.object(docker.APIClient, "inspect_container", side_effect=docker.errors.NotFound("")):
+                with self.assertRaises(docker.errors.NotFound):
+                    self.controller.inspect_container("service1")
+
+        summary = histogram.get_summary()
+        self.assertEqual(sorted(summary), ["get_container_id", "inspect_container", "kill_container"])
+        self.assertEqual(summary["get_container_id"]["count"], 2)
+        self.assertEqual(summary["inspect_container"]["errors"], 1)
+
+    def test_get_host_port(self):
+        """Validate the host port lookup of published container ports."""
+        inspect_output = {"NetworkSettings": {"Ports": {"8500/tcp": [{"HostIp": "0.0.0.0", "HostPort": "32768"}],
+                                                        "53/udp": None}}}
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.inspect_container", return_value=inspect_output
+        ):
+            self.assertEqual(self.controller.get_host_port("service1", 8500), 32768)
+
+            with self.assertRaises(RuntimeError):
+                self.controller.get_host_port("service1", 53, protocol="udp")
+
+    @mock.patch(
+        "docker_test_tools.environment.EnvironmentController._get_environment_variables",
+        mock.MagicMock(return_value=ENVIRONMENT_VARIABLES),
+    )
+    def test_ephemeral_ports(self):
+        """Validate the controller runs a rewritten compose file when using ephemeral ports."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        compose_path = os.path.join(test_dir, "docker-compose.yml")
+        with open(compose_path, "w") as compose_file:
+            compose_file.write(self.COMPOSE_CONTENT)
+
+        with mock.patch("subprocess.check_output", return_value="service1\nservice2\n"):
+            controller = environment.EnvironmentController(
+                log_path=os.path.join(test_dir, "logs", "docker.log"),
+                compose_path=compose_path,
+                project_name=self.project_name,
+                compose_command="docker-compose",
+                ephemeral_ports=True,
+            )
+
+        rewritten_path = os.path.join(test_dir, "logs", self.project_name + ".docker-compose.yml")
+        self.assertEqual(
+            controller.compose.command,
+            ["docker-compose", "--project-directory", test_dir, "-f", rewritten_path, "-p", self.project_name],
+        )
+        self.assertTrue(os.path.exists(rewritten_path))
+
     @mock.patch(
         "subprocess.check_output",
         mock.MagicMock(side_effect=subprocess.CalledProcessError(1, "", "")),
@@ -234,13 +310,42 @@ services:
             "docker_test_tools.environment.EnvironmentController.get_container_id",
             return_value=test_id,
         ):
-            with mock.patch.object(docker.APIClient, "kill") as mock_kill:
-                with mock.patch.object(docker.APIClient, "restart") as mock_restart:
-                    with self.controller.container_down("service1"):
-                        mock_kill.assert_called_with(test_id)
+            with mock.patch.object(docker.APIClient, "kill") as mock_kill, \
+                    mock.patch.object(docker.APIClient, "start") as mock_start, \
+                    mock.patch.object(docker.APIClient, "restart") as mock_restart, \
+                    mock.patch.object(docker.APIClient, "inspect_container",
+                                      return_value={"State": {"Status": "exited"}}):
+                with self.controller.container_down("service1"):
+                    mock_kill.assert_called_with(test_id)
+
+                mock_is_ready.assert_called_with("service1")
+                mock_start.assert_called_with(test_id)
+                mock_restart.assert_not_called()
 
-                    mock_is_ready.assert_called_with("service1")
-                    mock_restart.assert_called_with(test_id)
+        self.assertEqual(len(self.controller.recovery_times["service1"]), 1)
+
+    @mock.patch(
+        "docker_test_tools.environment.EnvironmentController.is_container_ready"
+    )
+    def test_container_down_not_exited(self, mock_is_ready):
+        """Validate container_down restarts a container which didn't exit after the kill."""
+        test_id = "222222"
+        mock_is_ready.return_value = True
+
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.get_container_id",
+            return_value=test_id,
+        ):
+            with mock.patch.object(docker.APIClient, "kill"), \
+                    mock.patch.object(docker.APIClient, "start") as mock_start, \
+                    mock.patch.object(docker.APIClient, "restart") as mock_restart, \
+                    mock.patch.object(docker.APIClient, "inspect_container",
+                                      return_value={"State": {"Status": "running"}}):
+                with self.controller.container_down("service1"):
+                    pass
+
+                mock_restart.assert_called_with(test_id)
+                mock_start.assert_not_called()
 
     @mock.patch(
         "docker_test_tools.environment.EnvironmentController.is_container_ready"
@@ -282,6 +387,113 @@ services:
                     mock_is_ready.assert_called_with("service1")
                     mock_start.assert_called_with(test_id)
 
+    def test_stream_exec_in_container(self):
+        """Validate streamed command execution in containers."""
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.get_container_id",
+            side_effect=lambda name: name + "-id",
+        ), mock.patch.object(
+            docker.APIClient, "exec_create", side_effect=lambda container_id, command: {"Id": container_id + "-exec"}
+        ), mock.patch.object(
+            docker.APIClient, "exec_start", side_effect=lambda exec_id, **kwargs: iter([(exec_id.encode(), None)])
+        ) as mock_exec_start, mock.patch.object(
+            docker.APIClient, "exec_inspect", return_value={"ExitCode": 0}
+        ):
+            stream = self.controller.stream_exec_in_container("service1", "ls")
+            self.assertEqual(list(stream), [(b"service1-id-exec", None)])
+            self.assertEqual(stream.exit_code, 0)
+            mock_exec_start.assert_called_with("service1-id-exec", stream=True, demux=True)
+
+            results = self.controller.run_exec_in_containers(["service1", "service2"], "ls")
+            self.assertEqual(results["service1"].stdout, b"service1-id-exec")
+            self.assertEqual(results["service2"].stdout, b"service2-id-exec")
+            self.assertEqual(results["service2"].exit_code, 0)
+
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.get_container_id", return_value="test-id"
+        ), mock.patch.object(docker.APIClient, "exec_create", return_value={}):
+            with self.assertRaises(RuntimeError):
+                self.controller.stream_exec_in_container("service1", "ls")
+
+    @mock.patch("docker_test_tools.archive.extract_tar", return_value=["file"])
+    @mock.patch("docker_test_tools.archive.iter_tar", return_value="archive-stream")
+    def test_copy_files(self, mock_iter_tar, mock_extract_tar):
+        """Validate copying files into and out of containers."""
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.get_container_id", return_value="test-id"
+        ), mock.patch.object(docker.APIClient, "put_archive", return_value=True) as mock_put_archive, \
+                mock.patch.object(docker.APIClient, "get_archive", return_value=("chunks", {})) as mock_get_archive:
+            self.controller.copy_to_container("service1", "local-path", "/target")
+            mock_iter_tar.assert_called_once_with(paths=["local-path"], chunk_size=mock.ANY)
+            mock_put_archive.assert_called_once_with("test-id", "/target", "archive-stream")
+
+            target_dir = os.path.join(os.path.dirname(self.log_path), "test-copy-target")
+            self.addCleanup(os.rmdir, target_dir)
+            copied = self.controller.copy_from_container("service1", ["/a", "/b"], target_dir)
+            self.assertEqual(copied, ["file", "file"])
+            mock_get_archive.assert_called_with("test-id", "/b", chunk_size=mock.ANY)
+            mock_extract_tar.assert_called_with(chunks="chunks", target_dir=target_dir)
+
+            mock_put_archive.return_value = False
+            with self.assertRaises(RuntimeError):
+                self.controller.copy_to_container("service1", ["local-path"], "/target")
+
+    @mock.patch("docker_test_tools.environment.EnvironmentController.wait_for_health")
+    def test_snapshot_and_restore(self, mock_wait_for_health):
+        """Validate containers are restored from their snapshot image."""
+        test_id = "444444"
+        container_info = {
+            "Name": "/test-project_service1_1",
+            "Config": {"Image": "image1", "Labels": {"com.docker.compose.service": "service1"}},
+            "HostConfig": {"NetworkMode": "first-network"},
+            "NetworkSettings": {"Networks": {
+                "first-network": {"Aliases": ["service1", "444444"]},
+                "second-network": {"Aliases": None},
+            }},
+        }
+
+        with self.assertRaises(RuntimeError):
+            self.controller.restore("service1")
+
+        with mock.patch(
+            "docker_test_tools.environment.EnvironmentController.get_container_id", return_value=test_id
+        ), mock.patch.object(docker.APIClient, "commit") as mock_commit, \
+                mock.patch.object(docker.APIClient, "inspect_container", return_value=container_info), \
+                mock.patch.object(docker.APIClient, "remove_container") as mock_remove, \
+                mock.patch.object(docker.APIClient, "create_container_from_config",
+                                  return_value={"Id": "new-id"}) as mock_create, \
+                mock.patch.object(docker.APIClient, "connect_container_to_network") as mock_connect, \
+                mock.patch.object(docker.APIClient, "start") as mock_start, \
+                mock.patch.object(docker.APIClient, "remove_image") as mock_remove_image:
+            self.controller.snapshot(["service1"])
+            mock_commit.assert_called_once_with(test_id, repository="dtt-snapshot/test-project_service1", tag="latest")
+
+            self.controller.restore("service1")
+            mock_remove.assert_called_once_with(test_id, force=True)
+            mock_create.assert_called_once_with(
+                {
+                    "Image": "dtt-snapshot/test-project_service1:latest",
+                    "Labels": {"com.docker.compose.service": "service1"},
+                    "HostConfig": {"NetworkMode": "first-network"},
+                    "NetworkingConfig": {"EndpointsConfig": {"first-network": {"Aliases": ["service1"]}}},
+                },
+                name="test-project_service1_1",
+            )
+            mock_connect.assert_called_once_with("new-id", "second-network", aliases=[])
+            mock_start.assert_called_once_with("new-id")
+            mock_wait_for_health.assert_called_once_with(name="service1", health_check=None, interval=1, timeout=60)
+            self.assertEqual(len(self.controller.restore_times["service1"]), 1)
+
+            self.controller.remove_snapshots()
+            mock_remove_image.assert_called_once_with("dtt-snapshot/test-project_service1:latest", force=True)
+            self.assertEqual(self.controller.snapshots, {})
+
+            # Only the started services are snapshot by default
+            mock_commit.reset_mock()
+            self.controller.required_services = ["service2"]
+            self.controller.snapshot()
+            mock_commit.assert_called_once_with(test_id, repository="dtt-snapshot/test-project_service2", tag="latest")
+
     @mock.patch("docker_test_tools.environment.EnvironmentController.down")
     @mock.patch("docker_test_tools.environment.EnvironmentController.up")
     @mock.patch("docker_test_tools.logs.LogCollector.start")
@@ -317,6 +529,38 @@ services:
         down_mock.assert_called_once_with()
         stop_collection_mock.assert_called_once_with()
 
+    @mock.patch("docker_test_tools.logs.LogCollector.stop", mock.MagicMock())
+    @mock.patch("docker_test_tools.logs.LogCollector.start", mock.MagicMock())
+    def test_profile(self):
+        """Validate the setup & teardown timeline is written when profiling is enabled."""
+        target_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, target_dir)
+
+        with mock.patch("subprocess.check_output", return_value="service1\nservice2\n"):
+            controller = environment.EnvironmentController(
+                log_path=os.path.join(target_dir, "docker.log"),
+                compose_path=self.compose_path,
+                project_name=self.project_name,
+                compose_command="docker-compose",
+                profile=True,
+                chrome_trace=True,
+            )
+
+            with mock.patch.object(controller, "inspect_container",
+                                   return_value={"State": {"Status": "running"}}):
+                controller.setup()
+                self.assertTrue(controller.wait_for_services(services=["service1"]))
+                controller.teardown()
+
+        with open(os.path.join(target_dir, self.project_name + ".profile.json")) as timeline_file:
+            spans = json.load(timeline_file)["spans"]
+        self.assertEqual(
+            sorted(span["name"] for span in spans),
+            ["compose config", "compose down", "compose down", "compose up", "ready service1",
+             "setup", "start LogCollector", "stop LogCollector", "teardown"]
+        )
+        self.assertTrue(os.path.exists(os.path.join(target_dir, self.project_name + ".trace.json")))
+
     @mock.patch(
         "docker_test_tools.environment.EnvironmentController.get_services",
         mock.MagicMock(),
@@ -374,6 +618,223 @@ services:
         )
         self.assertFalse(controller.wait_for_services())
 
+    def test_get_services_in_process(self):
+        """Validate the services are parsed from the compose file, without running docker compose."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        compose_path = os.path.join(test_dir, "docker-compose.yml")
+        with open(compose_path, "w") as compose_file:
+            compose_file.write(self.COMPOSE_CONTENT)
+
+        controller = environment.EnvironmentController(
+            log_path=self.log_path,
+            compose_path=compose_path,
+            project_name=self.project_name,
+            compose_command="docker-compose",
+        )
+        with mock.patch("subprocess.check_output") as mock_check_output:
+            self.assertEqual(controller.services, ["service1", "service2"])
+            self.assertEqual(controller.services_metadata["healthchecks"]["service2"], {"test": "test"})
+
+        mock_check_output.assert_not_called()
+
+    @mock.patch(
+        "docker_test_tools.environment.EnvironmentController._get_environment_variables",
+        mock.MagicMock(return_value=ENVIRONMENT_VARIABLES),
+    )
+    def test_multiple_compose_files_and_profiles(self):
+        """Validate the controller uses all the compose files, and only the services of the enabled profiles."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        compose_paths = [os.path.join(test_dir, "docker-compose.yml"), os.path.join(test_dir, "override.yml")]
+        with open(compose_paths[0], "w") as compose_file:
+            compose_file.write(self.COMPOSE_CONTENT)
+        with open(compose_paths[1], "w") as compose_file:
+            compose_file.write("services:\n  debug:\n    image: busybox\n    profiles: [debug]\n"
+                               "  tools:\n    image: busybox\n    profiles: [tools]\n")
+
+        controller = environment.EnvironmentController(
+            log_path=os.path.join(test_dir, "logs", "docker.log"),
+            compose_path=",".join(compose_paths),
+            project_name=self.project_name,
+            compose_command="docker-compose",
+            profiles=["debug"],
+            ephemeral_ports=True,
+        )
+
+        self.assertEqual(controller.services, ["debug", "service1", "service2"])
+        self.assertEqual(
+            controller.compose.command,
+            ["docker-compose", "--project-directory", test_dir,
+             "-f", os.path.join(test_dir, "logs", self.project_name + ".docker-compose.yml"),
+             "-f", os.path.join(test_dir, "logs", self.project_name + ".1.docker-compose.yml"),
+             "--profile", "debug", "-p", self.project_name],
+        )
+
+    def test_required_services(self):
+        """Validate only the required services (and their dependencies) are started, and the rest on demand."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        compose_path = os.path.join(test_dir, "docker-compose.yml")
+        with open(compose_path, "w") as compose_file:
+            compose_file.write("services:\n"
+                               "  db:\n    image: db\n"
+                               "  api:\n    image: api\n    depends_on: [db]\n"
+                               "  web:\n    image: web\n    depends_on: [api]\n"
+                               "  worker:\n    image: worker\n")
+
+        controller = environment.EnvironmentController(
+            log_path=self.log_path,
+            compose_path=compose_path,
+            project_name=self.project_name,
+            compose_command="docker-compose",
+        )
+        self.assertEqual(controller.resolve_services(["web"]), ["api", "db", "web"])
+        self.assertRaises(RuntimeError, controller.resolve_services, ["missing"])
+        self.assertEqual(controller.ensure_services(["worker"]), [])
+
+        controller.set_required_services(["api"])
+        self.assertEqual(controller.active_services, ["api", "db"])
+        with mock.patch.object(controller.compose, "up") as mock_up:
+            controller.up()
+            mock_up.assert_called_once_with(services=["api", "db"])
+
+            mock_up.reset_mock()
+            self.assertEqual(controller.ensure_services(["db"]), [])
+            self.assertEqual(controller.ensure_services(["web", "worker"]), ["web", "worker"])
+            mock_up.assert_called_once_with(services=["web", "worker"])
+            self.assertEqual(controller.active_services, ["api", "db", "web", "worker"])
+
+        controller.set_required_services(None)
+        self.assertEqual(controller.active_services, ["api", "db", "web", "worker"])
+
+    def test_required_services_markers(self):
+        """Validate the tests required services are read from their markers, with pytest versions before 3.6."""
+        marker = mock.MagicMock(args=("api", "db"))
+        item = mock.MagicMock(spec=["get_closest_marker", "cls"], **{"get_closest_marker.return_value": marker})
+        self.assertEqual(pytest_plugin.get_item_required_services(item), ["api", "db"])
+        item.get_closest_marker.assert_called_once_with("services")
+
+        old_item = mock.MagicMock(spec=["get_marker", "cls"], **{"get_marker.return_value": marker})
+        self.assertEqual(pytest_plugin.get_item_required_services(old_item), ["api", "db"])
+        old_item.get_marker.assert_called_once_with("services")
+
+        old_item.get_marker.return_value = None
+        old_item.cls.REQUIRED_SERVICES = ["web"]
+        self.assertEqual(pytest_plugin.get_item_required_services(old_item), ["web"])
+
+    def test_requested_controller(self):
+        """Validate the services of a marked test are started only in the environment the test requested."""
+        request = mock.MagicMock(fixturenames=["request", "pooled_controller"])
+        self.assertIs(pytest_plugin.get_requested_controller(request), request.getfixturevalue.return_value)
+        request.getfixturevalue.assert_called_once_with("pooled_controller")
+
+        request = mock.MagicMock(fixturenames=["request", "consul", "controller"])
+        pytest_plugin.get_requested_controller(request)
+        request.getfixturevalue.assert_called_once_with("controller")
+
+        request = mock.MagicMock(fixturenames=["request"])
+        self.assertIsNone(pytest_plugin.get_requested_controller(request))
+        request.getfixturevalue.assert_not_called()
+
+    def test_wait_for_log(self):
+        """Validate waiting for service log lines, and services readiness based on their logs."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        controller = environment.EnvironmentController(
+            log_path=os.path.join(test_dir, "docker.log"),
+            compose_path=self.compose_path,
+            project_name=self.project_name,
+            compose_command="docker-compose",
+            ready_log_patterns={"service1": "listening on port \\d+"},
+        )
+        with open(controller.log_path, "w") as log_file:
+            log_file.write("service1-1  | starting\n")
+
+        marker = controller.get_log_marker()
+        self.assertRaises(TimeoutExpired, controller.wait_for_log, "service1", "listening", timeout=0)
+
+        with mock.patch.object(controller, "inspect_container", return_value={"State": {"Status": "running"}}):
+            self.assertFalse(controller.is_container_ready("service1"))
+            self.assertTrue(controller.is_container_ready("service2"))
+
+            with open(controller.log_path, "a") as log_file:
+                log_file.write("service1-1  | listening on port 80\n")
+
+            self.assertTrue(controller.is_container_ready("service1"))
+            self.assertEqual(controller.wait_for_log("service1", "port (80)", timeout=1, since=marker),
+                             "listening on port 80")
+
+            # A restarted service is ready once it logs its ready log pattern again
+            controller._reset_ready_log("service1")
+            self.assertFalse(controller.is_container_ready("service1"))
+
+    def test_set_log_path(self):
+        """Validate the logs are collected into the new log path, and readiness is checked against them."""
+        test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, test_dir)
+        controller = environment.EnvironmentController(
+            log_path=os.path.join(test_dir, "docker.log"),
+            compose_path=self.compose_path,
+            project_name=self.project_name,
+            compose_command="docker-compose",
+            ready_log_patterns={"service1": "listening"},
+        )
+        with open(controller.log_path, "w") as log_file:
+            log_file.write("service1-1  | listening\n")
+
+        with mock.patch.object(controller, "inspect_container", return_value={"State": {"Status": "running"}}):
+            self.assertTrue(controller.is_container_ready("service1"))
+            logs_collector = controller.logs_collector
+
+            controller.set_log_path(os.path.join(test_dir, "lease1", "docker.log"))
+            self.assertTrue(os.path.isdir(os.path.join(test_dir, "lease1")))
+            self.assertEqual(controller.work_dir, os.path.join(test_dir, "lease1"))
+            self.assertIsNot(controller.logs_collector, logs_collector)
+            self.assertEqual(controller.logs_collector.log_path, controller.log_path)
+            self.assertEqual(controller.log_tailer.log_path, controller.log_path)
+            self.assertFalse(controller.is_container_ready("service1"))
+
+    def test_lazy_construction(self):
+        """Validate creating a controller runs no commands and doesn't create a docker client."""
+        with mock.patch("subprocess.check_output") as mock_check_output, \
+                mock.patch("docker.APIClient") as mock_client:
+            environment.EnvironmentController(
+                log_path=self.log_path,
+                compose_path=self.compose_path,
+                project_name=self.project_name,
+                compose_command="docker-compose",
+                collect_stats=True,
+            )
+
+        mock_check_output.assert_not_called()
+        mock_client.assert_not_called()
+
+    def test_stats_exporter_port(self):
+        """Validate environments with ephemeral ports serve their stats OpenMetrics on any free port."""
+        def get_exporter(**kwargs):
+            return environment.EnvironmentController(
+                log_path=self.log_path, compose_path=self.compose_path, project_name=self.project_name,
+                compose_command="docker-compose", collect_stats=True, **kwargs
+            ).stats_exporter
+
+        self.assertIsNone(get_exporter())
+        self.assertEqual(get_exporter(openmetrics_port=9400).port, 9400)
+        self.assertEqual(get_exporter(openmetrics_port=9400, ephemeral_ports=True).port, 0)
+        self.assertIsNone(get_exporter(export_openmetrics=True, ephemeral_ports=True).port)
+
+    def test_lazy_imports(self):
+        """Validate importing the package and creating a controller don't import the optional subsystems."""
+        script = (
+            "import sys\n"
+            "from docker_test_tools.environment import EnvironmentController\n"
+            "EnvironmentController(project_name='project', compose_path='compose.yml',\n"
+            "                      compose_command='docker-compose', log_path='docker.log')\n"
+            "print(' '.join(sorted(set(sys.modules) & {'docker', 'humanfriendly', 'yaml', 'requests'})))\n"
+        )
+        imported = subprocess.check_output([sys.executable, "-c", script])
+        self.assertEqual(imported.strip(), b"")
+
     def test_from_file(self):
         """ "Validate the environment from_file method."""
         mocked_config = mock.MagicMock(
@@ -401,9 +862,12 @@ services:
     def get_controller(self):
         """Returns a new EnvironmentController."""
         with mock.patch("subprocess.check_output", return_value="service1\nservice2\n"):
-            return environment.EnvironmentController(
+            controller = environment.EnvironmentController(
                 log_path=self.log_path,
                 compose_path=self.compose_path,
                 project_name=self.project_name,
                 compose_command="docker-compose",
             )
+            # Resolve the lazily created compose & services while the commands are mocked
+            self.assertEqual(controller.services, ["service1", "service2"])
+            return controller
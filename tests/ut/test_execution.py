@@ -0,0 +1,61 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import execution
+
+
+class TestExecStream(unittest.TestCase):
+    """Test for the exec stream class."""
+
+    CHUNKS = [(b"out-1\n", None), (None, b"err-1\n"), (b"out-2\n", None)]
+
+    def setUp(self):
+        """Create a stream over mocked exec output."""
+        self.test_dir = tempfile.mkdtemp()
+        self.docker_client = mock.MagicMock()
+        self.docker_client.exec_inspect.return_value = {"ExitCode": 3}
+        self.stream = execution.ExecStream(docker_client=self.docker_client,
+                                           exec_id="exec-id",
+                                           chunks=iter(self.CHUNKS))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_dir)
+
+    def test_iterate(self):
+        """Validate the stream yields the output chunks as they arrive."""
+        self.assertEqual(list(self.stream), self.CHUNKS)
+        self.assertEqual(self.stream.exit_code, 3)
+        self.docker_client.exec_inspect.assert_called_once_with("exec-id")
+
+    def test_read(self):
+        """Validate the stream can be read into an exec result."""
+        result = self.stream.read()
+        self.assertEqual(result, execution.ExecResult(exit_code=3, stdout=b"out-1\nout-2\n", stderr=b"err-1\n"))
+
+    def test_write_to_stdout_only(self):
+        """Validate stderr is written to stdout when no stderr stream is given."""
+        stdout = io.BytesIO()
+        self.assertEqual(self.stream.write_to(stdout), 3)
+        self.assertEqual(stdout.getvalue(), b"out-1\nerr-1\nout-2\n")
+
+    def test_write_to_file(self):
+        """Validate the stream can be written to separated files."""
+        stdout_path = os.path.join(self.test_dir, "stdout")
+        stderr_path = os.path.join(self.test_dir, "stderr")
+        self.assertEqual(self.stream.write_to_file(stdout_path, stderr_path), 3)
+
+        with open(stdout_path, "rb") as stdout_file:
+            self.assertEqual(stdout_file.read(), b"out-1\nout-2\n")
+
+        with open(stderr_path, "rb") as stderr_file:
+            self.assertEqual(stderr_file.read(), b"err-1\n")
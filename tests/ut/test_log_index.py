@@ -0,0 +1,121 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import cli, log_index
+
+SERVICE1_LOGS = [
+    u"2024-01-01T10:00:00.000000000Z starting service1\n",
+    u"\n>>> 2024-01-01T10:00:01 ========= TEST BEGINNING: tests/test_a.py::test_one =========\n\n",
+    u"2024-01-01T10:00:02.500000000Z connection refused by service2\n",
+    u"2024-01-01T10:00:03.000000000Z Request handled\n",
+    u"\n>>> 2024-01-01T10:00:04 ========= TEST END: tests/test_a.py::test_one =========\n\n",
+    u"\n>>> 2024-01-01T10:00:05 [gw0] test_two\n\n",
+    u"2024-01-01T10:00:06.000000000Z connection refused again\n",
+]
+SERVICE2_LOGS = [
+    u"2024-01-01T10:00:02.000000000Z connection accepted\n",
+    u"2024-01-01T10:00:07.000000000Z connection refused, ünicode\n",
+]
+
+
+class TestLogIndex(unittest.TestCase):
+    """Test for the logs index."""
+
+    def setUp(self):
+        """Write & index the services log files in a temporary directory."""
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.index_path = log_index.get_index_path(os.path.join(self.log_dir, "docker-tests.log"))
+
+        indexer = log_index.LogIndexer()
+        indexer.TIME_INDEX_INTERVAL = 1
+        for service, chunks in [("service1", SERVICE1_LOGS), ("service2", SERVICE2_LOGS)]:
+            file_id = indexer.add_file(service + ".log", service)
+            with io.open(os.path.join(self.log_dir, service + ".log"), "w", encoding="utf-8") as log_file:
+                for chunk in chunks:
+                    log_file.write(chunk)
+                    # Feed partial lines, as written by the collectors
+                    indexer.feed(file_id, chunk[:10])
+                    indexer.feed(file_id, chunk[10:])
+
+        indexer.write(self.index_path)
+        self.index = log_index.LogIndex.load(self.index_path)
+
+    def search(self, **kwargs):
+        return [(match.service, match.line.split("Z ", 1)[1]) for match in self.index.search(**kwargs)]
+
+    def test_search_terms(self):
+        """Validate searching lines containing all the terms, using the inverted index."""
+        self.assertEqual(self.search(terms=["Connection", "refused"]), [
+            ("service1", "connection refused by service2"),
+            ("service1", "connection refused again"),
+            ("service2", u"connection refused, ünicode"),
+        ])
+        self.assertEqual(self.search(terms=["ünicode"]), [("service2", u"connection refused, ünicode")])
+        self.assertEqual(self.search(terms=["connection", "missing"]), [])
+        self.assertEqual(self.search(terms=["connection"], service="service2"), [
+            ("service2", "connection accepted"),
+            ("service2", u"connection refused, ünicode"),
+        ])
+
+    def test_search_test(self):
+        """Validate searching lines written while a test was running."""
+        self.assertEqual(self.index.tests, ["test_two", "tests/test_a.py::test_one"])
+        self.assertEqual(self.search(test="test_one"), [
+            ("service1", "connection refused by service2"),
+            ("service1", "Request handled"),
+        ])
+        self.assertEqual(self.search(terms=["refused"], test="test_two"), [("service1", "connection refused again")])
+
+    def test_search_time_range(self):
+        """Validate searching lines logged within a time range."""
+        self.assertEqual(self.search(since="2024-01-01T10:00:02Z", until="2024-01-01T10:00:06Z"), [
+            ("service1", "connection refused by service2"),
+            ("service1", "Request handled"),
+            ("service1", "connection refused again"),
+            ("service2", "connection accepted"),
+        ])
+        since = log_index.parse_timestamp("2024-01-01T12:00:06.5+02:00")
+        self.assertEqual(self.search(terms=["connection"], since=since), [
+            ("service2", u"connection refused, ünicode"),
+        ])
+
+    def test_segments(self):
+        """Validate postings flushed to segment files are merged into the same index, and the segments removed."""
+        indexer = log_index.LogIndexer(work_dir=self.log_dir)
+        indexer.SEGMENT_POSTINGS = 3
+        for service, chunks in [("service1", SERVICE1_LOGS), ("service2", SERVICE2_LOGS)]:
+            file_id = indexer.add_file(service + ".log", service)
+            for chunk in chunks:
+                indexer.feed(file_id, chunk)
+
+        self.assertGreater(len(indexer.segments), 1)
+        segmented_index_path = os.path.join(self.log_dir, "segmented" + log_index.INDEX_SUFFIX)
+        indexer.write(segmented_index_path)
+        self.assertEqual(sorted(os.listdir(self.log_dir)),
+                         sorted(["docker-tests" + log_index.INDEX_SUFFIX, "segmented" + log_index.INDEX_SUFFIX,
+                                 "service1.log", "service2.log"]))
+
+        segmented_index = log_index.LogIndex.load(segmented_index_path)
+        self.assertEqual(segmented_index.tokens, self.index.tokens)
+        self.assertEqual(segmented_index.sections, self.index.sections)
+
+    def test_cli(self):
+        """Validate the logs search command line."""
+        with mock.patch("sys.stdout") as mock_stdout:
+            self.assertEqual(cli.main(["search", "--index", self.index_path, "-s", "service1", "accepted"]), 1)
+            self.assertEqual(cli.main(["search", "--index", self.index_path, "-s", "service1", "handled"]), 0)
+
+        mock_stdout.write.assert_any_call("service1 | 2024-01-01T10:00:03.000000000Z Request handled")
+        with mock.patch("sys.stderr"):
+            self.assertEqual(cli.main(["search", "--index", os.path.join(self.log_dir, "missing.gz")]), 2)
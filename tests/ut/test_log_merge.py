@@ -0,0 +1,130 @@
+import io
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import cli, log_index, log_merge
+
+
+class TestLogMerge(unittest.TestCase):
+    """Test for the services logs merge."""
+
+    def setUp(self):
+        """Write rotated & compressed services log segments into a temporary directory."""
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_path = os.path.join(self.log_dir, "docker-tests.log")
+
+        self.write("docker-tests.log", u"service1 | 2024-01-01T10:00:00Z combined log line\n")
+        self.write("service1.log.2.gz", u"2024-01-01T10:00:00Z service1 first\n", compress=True)
+        self.write("service1.log.1", u"2024-01-01T10:00:03Z service1 second\n  continued\n")
+        self.write("service1.log", u"\n>>> 2024-01-01T10:00:00 ========= TEST BEGINNING: test_one =========\n\n"
+                                   u"2024-01-01T10:00:05Z service1 third\n"
+                                   u"\n>>> 2024-01-01T10:00:00 ========= TEST END: test_one =========\n\n"
+                                   u"2024-01-01T10:00:09Z service1 fourth\n")
+        self.write("service2.log", u"2024-01-01T10:00:01Z service2 first\n"
+                                   u"2024-01-01T10:00:03Z service2 second\n"
+                                   u"2024-01-01T10:00:08Z service2 third\n")
+        self.write("service2.stderr.log", u"2024-01-01T10:00:04Z service2 error\n")
+        self.write("pytest-debug.log", u"2024-01-01T10:00:02Z unrelated log\n")
+
+    def write(self, file_name, content, compress=False):
+        path = os.path.join(self.log_dir, file_name)
+        with (gzip.open(path, "wb") if compress else io.open(path, "wb")) as log_file:
+            log_file.write(content.encode("utf-8"))
+
+    def merge(self, **kwargs):
+        services_logs = log_merge.find_service_logs(self.log_dir, services=["service1", "service2"],
+                                                    exclude=[self.log_path])
+        return [(line.service, line.line.split("Z ", 1)[-1].strip())
+                for line in log_merge.merge_logs(services_logs, **kwargs)]
+
+    def test_find_service_logs(self):
+        """Validate the services log segments are found, oldest first."""
+        services_logs = log_merge.find_service_logs(self.log_dir, services=["service1", "service2"],
+                                                    exclude=[self.log_path])
+        self.assertEqual(services_logs, {
+            "service1": [os.path.join(self.log_dir, name) for name in ["service1.log.2.gz", "service1.log.1",
+                                                                        "service1.log"]],
+            "service2": [os.path.join(self.log_dir, "service2.log")],
+            "service2.stderr": [os.path.join(self.log_dir, "service2.stderr.log")],
+        })
+
+        # Without a services list, every log file but the excluded ones is considered a service log
+        self.assertEqual(sorted(log_merge.find_service_logs(self.log_dir, exclude=[self.log_path])),
+                         ["pytest-debug", "service1", "service2", "service2.stderr"])
+
+    def test_get_log_services(self):
+        """Validate the services are resolved from the logs index, or from the compose files."""
+        compose_path = os.path.join(self.log_dir, "docker-compose.yml")
+        self.write("docker-compose.yml", u"services:\n  service1:\n    image: alpine\n")
+        with mock.patch("docker_test_tools.compose_file.CACHE_DIR", os.path.join(self.log_dir, "cache")):
+            self.assertEqual(log_merge.get_log_services(self.log_path, compose_paths=[compose_path]), ["service1"])
+            self.assertIsNone(log_merge.get_log_services(self.log_path))
+
+            indexer = log_index.LogIndexer()
+            indexer.add_file("service2.log", "service2")
+            indexer.add_file("service2.stderr.log", "service2", stream="stderr")
+            indexer.close()
+            indexer.write(log_index.get_index_path(self.log_path))
+            self.assertEqual(log_merge.get_log_services(self.log_path, compose_paths=[compose_path]), ["service2"])
+
+    def test_merge(self):
+        """Validate the services lines are ordered by time, keeping continuation lines in place."""
+        self.assertEqual(self.merge(), [
+            ("service1", "service1 first"),
+            ("service2", "service2 first"),
+            ("service1", "service1 second"),
+            ("service1", "continued"),
+            ("service2", "service2 second"),
+            ("service2.stderr", "service2 error"),
+            ("service1", "service1 third"),
+            ("service2", "service2 third"),
+            ("service1", "service1 fourth"),
+        ])
+
+    def test_merge_window(self):
+        """Validate merging the lines of a time range or a test."""
+        self.assertEqual(self.merge(since="2024-01-01T10:00:04Z", until=1704103208), [
+            ("service2.stderr", "service2 error"),
+            ("service1", "service1 third"),
+            ("service2", "service2 third"),
+        ])
+        self.assertEqual(self.merge(test="test_one"), [("service1", "service1 third")])
+
+    def test_cli(self):
+        """Validate the logs merge command line."""
+        with mock.patch("sys.stdout") as mock_stdout:
+            self.assertEqual(cli.main(["merge", "--log-path", self.log_path, "-s", "service2", "--since", "1704103203"]), 0)
+
+        printed = [call[0][0] for call in mock_stdout.write.call_args_list if call[0][0].strip()]
+        self.assertEqual(printed, [
+            "service2        | 2024-01-01T10:00:03Z service2 second",
+            "service2.stderr | 2024-01-01T10:00:04Z service2 error",
+            "service2        | 2024-01-01T10:00:08Z service2 third",
+        ])
+
+    def test_cli_services(self):
+        """Validate the logs merge command line merges only the compose services logs."""
+        compose_path = os.path.join(self.log_dir, "docker-compose.yml")
+        self.write("docker-compose.yml", u"services:\n  service2:\n    image: alpine\n")
+        with mock.patch("docker_test_tools.compose_file.CACHE_DIR", os.path.join(self.log_dir, "cache")), \
+                mock.patch("sys.stdout") as mock_stdout:
+            self.assertEqual(cli.main(["merge", "--log-path", self.log_path, "--compose-path", compose_path]), 0)
+
+        printed = [call[0][0] for call in mock_stdout.write.call_args_list if call[0][0].strip()]
+        self.assertEqual(len(printed), 4)
+        self.assertFalse([line for line in printed if "unrelated" in line or "service1" in line])
+
+        with mock.patch("sys.stderr"):
+            self.assertEqual(cli.main(["merge", "--log-path", self.log_path, "--compose-path",
+                                       os.path.join(self.log_dir, "missing.yml")]), 2)
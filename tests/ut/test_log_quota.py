@@ -0,0 +1,62 @@
+import unittest
+
+from docker_test_tools import log_quota
+
+
+class FakeClock(object):
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLogQuota(unittest.TestCase):
+    """Test for the per service log quota."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_lines_per_second(self):
+        """Validate the lines exceeding the lines rate are dropped, per service."""
+        quota = log_quota.LogQuota(lines_per_second=2, clock=self.clock)
+        self.assertEqual([quota.admit("service1", "line") for _ in range(4)], [True, True, False, False])
+        self.assertTrue(quota.admit("service2", "line"))
+
+        self.clock.now += 0.5
+        self.assertEqual([quota.admit("service1", "line") for _ in range(2)], [True, False])
+        self.assertEqual(quota.get_summary(), {
+            "service1": {"written_lines": 3, "dropped_lines": 3, "dropped_bytes": 12, "sampled_lines": 0},
+        })
+
+    def test_bytes_per_second(self):
+        """Validate the bytes rate, allowing lines larger than the rate once the bucket is full."""
+        quota = log_quota.LogQuota(bytes_per_second=10, clock=self.clock)
+        self.assertTrue(quota.admit("service1", "x" * 8))
+        self.assertFalse(quota.admit("service1", "x" * 8))
+
+        self.clock.now += 1
+        self.assertTrue(quota.admit("service1", "x" * 30))
+        self.clock.now += 1
+        self.assertFalse(quota.admit("service1", "x"))
+        self.clock.now += 2
+        self.assertTrue(quota.admit("service1", "x"))
+
+    def test_sampling_and_tail(self):
+        """Validate sampling of the dropped lines, and the tail of the last dropped lines."""
+        quota = log_quota.LogQuota(lines_per_second=1, sample_rate=3, tail_bytes=10, clock=self.clock)
+        admitted = [quota.admit("service1", "line{0}".format(index), "stdout") for index in range(8)]
+        self.assertEqual(admitted, [True, False, False, True, False, False, True, False])
+        self.assertEqual(quota.get_summary()["service1"]["sampled_lines"], 2)
+
+        drained = quota.drain()
+        self.assertEqual(drained["service1"][1:], [("stdout", "line5"), ("stdout", "line7")])
+        self.assertIn("exceeded by 7 lines", drained["service1"][0][1])
+        self.assertEqual(quota.drain()["service1"][1:], [])
+
+    def test_disabled(self):
+        """Validate the quota is disabled without limits."""
+        self.assertFalse(log_quota.LogQuota(sample_rate=10, tail_bytes=10).enabled)
+        self.assertTrue(log_quota.LogQuota(lines_per_second=10).enabled)
@@ -0,0 +1,107 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import cli, log_index, log_split, logs
+
+COMBINED_LOG = (
+    u">>> 2024-01-01T10:00:00 ========= TEST BEGINNING: test_one =========\n"
+    u"service1-1  | 2024-01-01T10:00:00Z first | line\n"
+    u"service1-1  | 2024-01-01T10:00:01Z second line שלום\r\n"
+    u">>> 2024-01-01T10:00:02 ========= TEST END: test_one =========\n"
+    u"not a service line\n"
+    u">>> 2024-01-01T10:00:02 ========= TEST BEGINNING: test_two =========\n"
+    u"service2-1  | 2024-01-01T10:00:03Z third line\rservice1-1  | carriage return line\n"
+    u">>> 2024-01-01T10:00:04 ========= TEST END: test_two =========\n"
+    u"service3-1  | 2024-01-01T10:00:05Z fourth line\n"
+    u">>> 2024-01-01T10:00:06 session finished\n"
+    u"service2-1  | 2024-01-01T10:00:07Z last line"
+)
+
+
+class TestLogSplit(unittest.TestCase):
+    """Test for the parallel combined log splitting."""
+
+    def setUp(self):
+        """Write the combined log file into a temporary directory."""
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_path = os.path.join(self.log_dir, "docker-tests.log")
+        with io.open(self.log_path, "w", encoding="utf-8", newline="") as log_file:
+            log_file.write(COMBINED_LOG)
+
+    def read_services_logs(self):
+        services_logs = {}
+        for file_name in sorted(os.listdir(self.log_dir)):
+            if file_name.endswith(".log") and file_name != "docker-tests.log":
+                with io.open(os.path.join(self.log_dir, file_name), "rb") as log_file:
+                    services_logs[file_name] = log_file.read()
+
+        return services_logs
+
+    def get_expected_logs(self):
+        """Return the services logs written by the log collector splitting."""
+        logs.LogCollector(log_path=self.log_path, encoding="utf-8", compose=mock.MagicMock())._split_logs()
+        expected = self.read_services_logs()
+        for file_name in expected:
+            os.remove(os.path.join(self.log_dir, file_name))
+
+        return expected
+
+    def test_get_chunks(self):
+        """Validate the chunks are line aligned and cover the log file."""
+        chunks = log_split.get_chunks(self.log_path, chunk_size=30)
+        with io.open(self.log_path, "rb") as log_file:
+            content = log_file.read()
+
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(content))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(content[end - 1:end], b"\n")
+
+    def test_split_logs(self):
+        """Validate the services logs are identical to the log collector ones, for any chunk size."""
+        expected = self.get_expected_logs()
+        self.assertEqual(sorted(expected), ["service1-1.log", "service2-1.log", "service3-1.log"])
+
+        for chunk_size in [1, 30, 100, 1024]:
+            services = log_split.split_logs(self.log_path, encoding="utf-8", workers=1, chunk_size=chunk_size)
+            self.assertEqual(services, ["service1-1", "service2-1", "service3-1"])
+            self.assertEqual(self.read_services_logs(), expected, "chunk size %d" % chunk_size)
+
+    def test_split_logs_workers(self):
+        """Validate splitting the log file chunks using a process pool."""
+        expected = self.get_expected_logs()
+        log_split.split_logs(self.log_path, encoding="utf-8", workers=2, chunk_size=50)
+        self.assertEqual(self.read_services_logs(), expected)
+        self.assertEqual([name for name in os.listdir(self.log_dir) if name.startswith(".split-")], [])
+
+    def test_split_logs_index(self):
+        """Validate the split services logs are indexed."""
+        log_split.split_logs(self.log_path, workers=1, chunk_size=30, index_logs=True)
+        index = log_index.LogIndex.load(log_index.get_index_path(self.log_path))
+        self.assertEqual([match.line for match in index.search(terms=["line"], test="test_two")],
+                         [u" carriage return line"])
+        self.assertEqual(sorted(index.services), ["service1-1", "service2-1", "service3-1"])
+
+    def test_split_logs_encoding(self):
+        """Validate encodings with multi-byte newlines are refused."""
+        self.assertRaises(RuntimeError, log_split.split_logs, self.log_path, encoding="utf-16")
+
+    def test_cli(self):
+        """Validate the logs split command line."""
+        with mock.patch("sys.stdout"):
+            self.assertEqual(cli.main(["split", "--log-path", self.log_path, "--workers", "1"]), 0)
+            self.assertEqual(cli.main(["split", "--log-path", os.path.join(self.log_dir, "missing.log")]), 2)
+
+        self.assertEqual(sorted(self.read_services_logs()), ["service1-1.log", "service2-1.log", "service3-1.log"])
@@ -1,3 +1,9 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
 import unittest
 from six import PY3
 
@@ -6,7 +12,7 @@ if PY3:
 else:
     import mock
 
-from docker_test_tools import logs
+from docker_test_tools import log_index, log_quota, logs
 
 
 class TestLogsCollector(unittest.TestCase):
@@ -40,6 +46,20 @@ class TestLogsCollector(unittest.TestCase):
         self.compose_mock.start_logs_collector.assert_called_with(mock_test_file)
         self.assertEqual(self.log_collector.logs_file, mock_test_file)
 
+    @mock.patch("io.open")
+    def test_shared_start_and_attach(self, mock_open):
+        """"Validate the log file is written in append mode when shared with other processes."""
+        self.log_collector.shared = True
+        self.log_collector.start()
+        mock_open.assert_called_with(self.TEST_LOG_PATH, 'a', encoding=self.TEST_ENCODING)
+        mock_open.return_value.truncate.assert_called_once_with(0)
+
+        self.log_collector.attach()
+        mock_open.assert_called_with(self.TEST_LOG_PATH, 'a', encoding=self.TEST_ENCODING)
+        self.log_collector.detach()
+        mock_open.return_value.close.assert_called_once_with()
+        self.compose_mock.stop_logs_collector.assert_not_called()
+
     @mock.patch('docker_test_tools.logs.LogCollector._split_logs')
     def test_stop(self, mock_split_logs):
         """"Validate the log collector stop method."""
@@ -59,3 +79,276 @@ class TestLogsCollector(unittest.TestCase):
             logs.LogCollector.COMMON_LOG_FORMAT.format(message=test_message)
         )
         self.log_collector.logs_file.flush.assert_called_once_with()
+
+    def test_split_logs_with_index(self):
+        """Validate the combined log is split into a file per service, indexed while written."""
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        log_collector = logs.LogCollector(
+            log_path=os.path.join(log_dir, "docker.log"),
+            encoding="utf-8",
+            compose=self.compose_mock,
+            index_logs=True,
+        )
+        with io.open(log_collector.log_path, "w", encoding="utf-8") as log_file:
+            log_file.write(u"service1-1  | 2024-01-01T10:00:00Z first | line\n"
+                           u">>> 2024-01-01T10:00:01 test_one\n"
+                           u"service2-1  | 2024-01-01T10:00:02Z second line\n"
+                           u"service1-1  | 2024-01-01T10:00:03Z third line\n")
+
+        log_collector._split_logs()
+
+        with io.open(os.path.join(log_dir, "service1-1.log"), encoding="utf-8") as log_file:
+            self.assertEqual(log_file.read(), u" 2024-01-01T10:00:00Z first | line\n\n"
+                                              u">>> 2024-01-01T10:00:01 test_one\n\n"
+                                              u" 2024-01-01T10:00:03Z third line\n")
+
+        index = log_index.LogIndex.load(log_index.get_index_path(log_collector.log_path))
+        self.assertEqual([match.line for match in index.search(terms=["line"], service="service1-1")],
+                         [u" 2024-01-01T10:00:00Z first | line", u" 2024-01-01T10:00:03Z third line"])
+        self.assertEqual([match.line for match in index.search(terms=["line"], test="test_one")],
+                         [u" 2024-01-01T10:00:03Z third line"])
+
+
+    def test_quota(self):
+        """Validate only the lines within the services quota are written, followed by the dropped lines tail."""
+        log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, log_dir)
+        self.compose_mock.start_logs_collector.return_value.stdout = io.BytesIO(
+            b"Attaching to service1-1\n" + b"".join(
+                "service1-1  | line {0}\n".format(index).encode("utf-8") for index in range(5)
+            ) + b"service2-1  | other line\n"
+        )
+        log_collector = logs.LogCollector(
+            log_path=os.path.join(log_dir, "docker.log"),
+            encoding="utf-8",
+            compose=self.compose_mock,
+            quota=log_quota.LogQuota(lines_per_second=2, tail_bytes=8, clock=lambda: 0),
+        )
+        log_collector.start()
+        self.compose_mock.start_logs_collector.assert_called_once_with(subprocess.PIPE)
+        log_collector.stop()
+
+        with io.open(os.path.join(log_dir, "service1-1.log"), encoding="utf-8") as log_file:
+            lines = log_file.read().splitlines()
+        self.assertEqual(lines[:2], [" line 0", " line 1"])
+        self.assertIn("exceeded by 3 lines", lines[2])
+        self.assertEqual(lines[3:], [" line 4"])
+
+        with io.open(os.path.join(log_dir, "service2-1.log"), encoding="utf-8") as log_file:
+            self.assertEqual(log_file.read(), " other line\n")
+
+
+
+class FakeStream(list):
+    """Docker api stream, closed once fully consumed."""
+
+    def close(self):
+        pass
+
+
+class TestStreamingLogCollector(unittest.TestCase):
+    """Test for the streaming logs collector."""
+
+    def setUp(self):
+        """Create a streaming log collector writing into a temporary directory."""
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.docker_client = mock.MagicMock()
+        self.log_collector = logs.StreamingLogCollector(
+            log_path=os.path.join(self.log_dir, "docker.log"),
+            encoding="utf-8",
+            docker_client=self.docker_client,
+            project_name="project",
+        )
+
+    def read_log(self, file_name):
+        with io.open(os.path.join(self.log_dir, file_name), encoding="utf-8") as log_file:
+            return log_file.read()
+
+    def consume_streams(self):
+        """Wait for the fake streams to be consumed, so stopping doesn't close them before they're read."""
+        index = 0
+        while index < len(self.log_collector.threads):
+            self.log_collector.threads[index].join()
+            index += 1
+
+    def test_streaming(self):
+        """Validate each service stdout & stderr are written to separate files, including started containers."""
+        container_logs = {
+            ("container1", "stdout"): [b"t1 first\nt2 sec", b"ond | with separator\n"],
+            ("container1", "stderr"): [b"t3 error\n"],
+            ("container2", "stdout"): [b"t4 started later\n"],
+            ("container2", "stderr"): [],
+        }
+        self.docker_client.logs.side_effect = lambda container_id, stdout, stderr, **kwargs: FakeStream(
+            container_logs[(container_id, "stdout" if stdout else "stderr")]
+        )
+        self.docker_client.containers.return_value = [
+            {"Id": "container1", "Labels": {logs.SERVICE_LABEL: "service1"}},
+        ]
+        self.docker_client.events.return_value = FakeStream([
+            {"Action": "start", "Actor": {"ID": "container2", "Attributes": {logs.SERVICE_LABEL: "service2"}}},
+        ])
+
+        self.log_collector.start()
+        self.consume_streams()
+        self.log_collector.stop()
+
+        self.assertEqual(self.read_log("service1.log"), "t1 first\nt2 second | with separator\n")
+        self.assertEqual(self.read_log("service1.stderr.log"), "t3 error\n")
+        self.assertEqual(self.read_log("service2.log"), "t4 started later\n")
+        self.assertFalse(os.path.exists(os.path.join(self.log_dir, "service2.stderr.log")))
+        self.assertEqual(
+            sorted(self.read_log("docker.log").splitlines()),
+            ["service1 | t1 first", "service1 | t2 second | with separator", "service1 | t3 error",
+             "service2 | t4 started later"],
+        )
+        self.docker_client.logs.assert_any_call(
+            "container1", stdout=True, stderr=False, stream=True, follow=True, timestamps=True, since=None
+        )
+
+    def test_quota(self):
+        """Validate the services quota, with the dropped lines tail written to the stream log files."""
+        self.log_collector.quota = log_quota.LogQuota(lines_per_second=1, tail_bytes=100, clock=lambda: 0)
+        self.docker_client.logs.side_effect = lambda container_id, stdout, stderr, **kwargs: FakeStream(
+            [b"t1 first\nt2 second\n"] if stdout else [b"t3 error\n"]
+        )
+        self.docker_client.containers.return_value = [
+            {"Id": "container1", "Labels": {logs.SERVICE_LABEL: "service1"}},
+        ]
+        self.docker_client.events.return_value = FakeStream()
+
+        self.log_collector.start()
+        self.consume_streams()
+        self.log_collector.stop()
+
+        written = self.read_log("service1.log").splitlines() + self.read_log("service1.stderr.log").splitlines()
+        self.assertEqual(len([line for line in written if line.startswith("t")]), 3)
+        self.assertEqual(len([line for line in written if "log quota exceeded by 2 lines" in line]), 1)
+
+    def test_start_again(self):
+        """Validate a stopped collector collects the logs again once started again, e.g. when recycled."""
+        self.docker_client.logs.side_effect = lambda container_id, stdout, stderr, **kwargs: FakeStream(
+            [container_id.encode("ascii") + b" line\n"] if stdout else []
+        )
+        self.docker_client.events.return_value = FakeStream()
+        for container_id in ["container1", "container2"]:
+            self.docker_client.containers.return_value = [
+                {"Id": container_id, "Labels": {logs.SERVICE_LABEL: "service1"}},
+            ]
+            self.log_collector.start()
+            self.consume_streams()
+            self.log_collector.stop()
+
+        self.assertEqual(self.read_log("service1.log"), "container2 line\n")
+        self.assertEqual(self.read_log("docker.log"), "service1 | container2 line\n")
+
+    def test_restarted_container(self):
+        """Validate restarted containers logs are streamed from their restart time."""
+        self.docker_client.logs.return_value = FakeStream()
+        self.docker_client.containers.return_value = [
+            {"Id": "container1", "Labels": {logs.SERVICE_LABEL: "service1"}},
+        ]
+        self.log_collector.start()
+        self.log_collector.follow("container1", "service1")
+        self.assertEqual(self.docker_client.logs.call_count, 2)
+
+        self.log_collector._watch_events([
+            {"Action": "start", "timeNano": 1500000000000000000,
+             "Actor": {"ID": "container1", "Attributes": {logs.SERVICE_LABEL: "service1"}}},
+        ])
+        self.log_collector.stop()
+        self.assertEqual(self.docker_client.logs.call_count, 4)
+        self.assertEqual(self.docker_client.logs.call_args[1]["since"], 1500000000)
+
+    def test_update(self):
+        """Validate common messages are written to the combined log and the services log files."""
+        self.docker_client.logs.return_value = FakeStream([b"line\n"])
+        self.docker_client.containers.return_value = [
+            {"Id": "container1", "Labels": {logs.SERVICE_LABEL: "service1"}},
+        ]
+        self.log_collector.start()
+        for thread in self.log_collector.threads:
+            thread.join()
+
+        self.log_collector.update("test-message")
+        self.log_collector.stop()
+
+        common_message = logs.LogCollector.COMMON_LOG_FORMAT.format(message="test-message")
+        self.assertTrue(self.read_log("docker.log").endswith(common_message))
+        self.assertTrue(self.read_log("service1.log").endswith(common_message))
+
+
+class TestLogTailer(unittest.TestCase):
+    """Test for the incremental log tailer."""
+
+    def setUp(self):
+        """Create a log tailer of a temporary log file."""
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.log_path = os.path.join(self.log_dir, "docker.log")
+        self.tailer = logs.LogTailer(log_path=self.log_path, encoding="utf-8", project_name="project")
+
+    def write(self, content, mode="a"):
+        with io.open(self.log_path, mode, encoding="utf-8") as log_file:
+            log_file.write(content)
+
+    def test_wait(self):
+        """Validate waiting for log lines of a service, from the log start or from a marker."""
+        self.write(u"service1-1  | ready\nservice2  | started\n")
+        marker = self.tailer.get_marker()
+        self.write(u">>> common message | service1\nproject_service1_1 | ready again\nservice2 | part")
+
+        self.assertEqual(self.tailer.wait(self.tailer.watch("service1", "ready"), timeout=0), "ready")
+        self.assertEqual(
+            self.tailer.wait(self.tailer.watch("service1", "ready", since=marker), timeout=0), "ready again"
+        )
+        self.assertIsNone(self.tailer.wait(self.tailer.watch("service", "ready"), timeout=0))
+
+        # Partial lines are matched once completed
+        waiter = self.tailer.watch("service2", "partial", since=marker)
+        self.assertIsNone(self.tailer.wait(waiter, timeout=0))
+        self.write(u"ial\n")
+        self.assertEqual(self.tailer.wait(self.tailer.watch("service2", "partial", since=marker), timeout=0),
+                         "partial")
+        self.assertEqual(self.tailer.waiters, [])
+
+    def test_bounded_reads(self):
+        """Validate the log is read in bounded chunks, keeping the lines split between chunks."""
+        self.tailer.READ_SIZE = 7
+        self.write(u"service1 | first line\n" * 3)
+        marker = self.tailer.get_marker()
+        self.write(u"service1 | second line\nservice2 | third line\n")
+
+        self.assertEqual(self.tailer.wait(self.tailer.watch("service2", "third"), timeout=0), "third line")
+        self.assertEqual(
+            self.tailer.wait(self.tailer.watch("service1", "line", since=marker), timeout=0), "second line"
+        )
+        self.assertEqual(self.tailer.pending, b"")
+
+    def test_shared_waiters(self):
+        """Validate concurrent waiters are released by the shared reads."""
+        self.write(u"")
+        results = {}
+
+        def wait_for(service, pattern):
+            results[service] = self.tailer.wait(self.tailer.watch(service, pattern), timeout=10, interval=0.01)
+
+        threads = [threading.Thread(target=wait_for, args=("service{0}".format(index), r"value \d+"))
+                   for index in range(5)]
+        for thread in threads:
+            thread.start()
+
+        self.write(u"".join(u"service{0} | value {0}\n".format(index) for index in range(5)))
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {"service{0}".format(index): "value {0}".format(index) for index in range(5)})
+
+    def test_truncated_log(self):
+        """Validate the log is read from its start once truncated."""
+        self.write(u"service1 | first run line\n")
+        waiter = self.tailer.watch("service1", "new", since=self.tailer.get_marker())
+        self.write(u"service1 | new\n", mode="w")
+        self.assertEqual(self.tailer.wait(waiter, timeout=0), "new")
@@ -0,0 +1,81 @@
+import json
+import unittest
+
+from docker_test_tools import metrics
+
+
+class Operations(object):
+    """Object with measured operations."""
+
+    def __init__(self, observers=None):
+        self.metrics = metrics.Metrics(observers)
+
+    @metrics.timed("succeed")
+    def succeed(self, value):
+        return value
+
+    @metrics.timed("fail")
+    def fail(self):
+        raise RuntimeError("failure")
+
+
+class FailingObserver(metrics.MetricsObserver):
+    """Observer which always fails."""
+
+    def observe(self, operation, duration, success):
+        raise ValueError("observer failure")
+
+
+class TestMetrics(unittest.TestCase):
+    """Test for the operations metrics."""
+
+    def test_timed(self):
+        """Validate measured operations are reported to the observers."""
+        histogram = metrics.HistogramObserver()
+        operations = Operations([FailingObserver(), histogram])
+
+        self.assertEqual(operations.succeed(1), 1)
+        self.assertEqual(operations.succeed(2), 2)
+        with self.assertRaises(RuntimeError):
+            operations.fail()
+
+        summary = histogram.get_summary()
+        self.assertEqual(sorted(summary), ["fail", "succeed"])
+        self.assertEqual((summary["succeed"]["count"], summary["succeed"]["errors"]), (2, 0))
+        self.assertEqual((summary["fail"]["count"], summary["fail"]["errors"]), (1, 1))
+
+    def test_timed_disabled(self):
+        """Validate operations behave as is without observers."""
+        operations = Operations()
+        self.assertEqual(operations.succeed(1), 1)
+        with self.assertRaises(RuntimeError):
+            operations.fail()
+
+    def test_histogram(self):
+        """Validate the histogram summary & percentiles."""
+        histogram = metrics.HistogramObserver(buckets=(0.1, 1, 10))
+        for duration in [0.05] * 8 + [0.5, 20]:
+            histogram.observe("operation", duration, success=True)
+
+        summary = histogram.get_summary()["operation"]
+        self.assertEqual(summary["count"], 10)
+        self.assertEqual(summary["min"], 0.05)
+        self.assertEqual(summary["max"], 20)
+        self.assertAlmostEqual(summary["mean"], 2.09)
+        self.assertEqual(summary["p50"], 0.1)
+        self.assertEqual(summary["p90"], 1)
+        self.assertEqual(summary["p99"], 20)
+        self.assertEqual([bucket["count"] for bucket in summary["buckets"]], [8, 1, 0, 1])
+        self.assertEqual(summary["buckets"][-1]["le"], "+Inf")
+
+    def test_export(self):
+        """Validate the JSON & text exports."""
+        histogram = metrics.HistogramObserver()
+        histogram.observe("kill_container", 0.2, success=True)
+
+        self.assertEqual(json.loads(histogram.to_json())["kill_container"]["count"], 1)
+        lines = histogram.to_text().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("operation"))
+        self.assertTrue(lines[1].startswith("kill_container"))
+        self.assertIn("200.00", lines[1])
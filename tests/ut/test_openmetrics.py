@@ -0,0 +1,139 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import urlopen
+
+from docker_test_tools import openmetrics
+
+MB = 1000 * 1000
+
+
+class TestOpenMetricsExporter(unittest.TestCase):
+    """Test for the OpenMetrics exporter of the live containers stats."""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.stats_path = os.path.join(self.work_dir, "stats.json")
+        self.metrics_path = openmetrics.get_metrics_file_path(self.work_dir)
+        self.exporter = openmetrics.OpenMetricsExporter(
+            stats_file_path=self.stats_path, metrics_file_path=self.metrics_path, project_name="project",
+        )
+
+    def write(self, *lines):
+        with io.open(self.stats_path, "a", encoding="utf-8") as stats_file:
+            stats_file.write(u"".join(line + u"\n" for line in lines))
+
+    def sample(self, name, cpu, ram, net, block, net_tx=0, block_write=0):
+        return json.dumps({"name": name, "cpu": cpu, "ram": ram, "net": net, "block": block, "net_tx": net_tx,
+                           "block_write": block_write})
+
+    def get_samples(self, text, metric):
+        return [line for line in text.splitlines() if line.startswith(metric + "{")]
+
+    def test_get_service_name(self):
+        """Validate the service name is extracted from the container name."""
+        self.assertEqual(openmetrics.get_service_name("project-consul.service-1", "project"), "consul.service")
+        self.assertEqual(openmetrics.get_service_name("project_consul_1", "project"), "consul")
+        self.assertEqual(openmetrics.get_service_name("consul", "project"), "consul")
+
+    def test_render(self):
+        """Validate the gauges hold the last samples, and the counters the growth while each test ran."""
+        self.write(
+            self.sample("project-consul.service-1", 1.5, 10 * MB, 100, 1000),
+            u">>> [gw0] ========= TEST BEGINNING: test_one =========",
+            self.sample("project-consul.service-1", 2.0, 12 * MB, 150, 1000),
+            u"\x1b[2J\x1b[H" + json.dumps({"name": "project-consul.service-1", "cpu": "25.00%",
+                                           "ram": "20MiB / 1GiB", "net": "200B / 30B", "block": "3KiB / 1KiB"}),
+            u">>> [gw0] ========= TEST END: test_one =========",
+            self.sample("project-consul.service-1", 1.0, 11 * MB, 50, 500),
+        )
+
+        text = self.exporter.scrape()
+        self.assertTrue(text.startswith(
+            "# TYPE dtt_container_cpu_percent gauge\n"
+            "# UNIT dtt_container_cpu_percent percent\n"
+            "# HELP dtt_container_cpu_percent Used CPU percentage, 100 per fully used CPU.\n"
+        ))
+        self.assertTrue(text.endswith("\n# EOF\n"))
+        self.assertEqual(self.get_samples(text, "dtt_container_cpu_percent"), [
+            'dtt_container_cpu_percent{container="project-consul.service-1",service="consul.service",test=""} 1.0',
+        ])
+        self.assertEqual(self.get_samples(text, "dtt_container_memory_bytes_total"), [])
+
+        # The restarted container counters start over
+        self.assertEqual(self.get_samples(text, "dtt_container_network_receive_bytes_total"), [
+            'dtt_container_network_receive_bytes_total{container="project-consul.service-1",'
+            'service="consul.service",test=""} 150',
+            'dtt_container_network_receive_bytes_total{container="project-consul.service-1",'
+            'service="consul.service",test="test_one"} 100',
+        ])
+        self.assertEqual(self.get_samples(text, "dtt_container_block_read_bytes_total"), [
+            'dtt_container_block_read_bytes_total{container="project-consul.service-1",'
+            'service="consul.service",test=""} 1500',
+            'dtt_container_block_read_bytes_total{container="project-consul.service-1",'
+            'service="consul.service",test="test_one"} 2072',
+        ])
+
+    def test_directions(self):
+        """Validate the transmitted & written bytes counters are exported along with the received & read ones."""
+        self.write(
+            self.sample("project-consul.service-1", 1.0, 10 * MB, 100, 1000, net_tx=10, block_write=2000),
+            u">>> test_one",
+            self.sample("project-consul.service-1", 1.0, 10 * MB, 150, 1500, net_tx=40, block_write=2100),
+        )
+
+        text = self.exporter.scrape()
+        labels = 'container="project-consul.service-1",service="consul.service",test='
+        self.assertEqual(self.get_samples(text, "dtt_container_network_receive_bytes_total"), [
+            'dtt_container_network_receive_bytes_total{' + labels + '""} 100',
+            'dtt_container_network_receive_bytes_total{' + labels + '"test_one"} 50',
+        ])
+        self.assertEqual(self.get_samples(text, "dtt_container_network_transmit_bytes_total"), [
+            'dtt_container_network_transmit_bytes_total{' + labels + '""} 10',
+            'dtt_container_network_transmit_bytes_total{' + labels + '"test_one"} 30',
+        ])
+        self.assertEqual(self.get_samples(text, "dtt_container_block_read_bytes_total"), [
+            'dtt_container_block_read_bytes_total{' + labels + '""} 1000',
+            'dtt_container_block_read_bytes_total{' + labels + '"test_one"} 500',
+        ])
+        self.assertEqual(self.get_samples(text, "dtt_container_block_write_bytes_total"), [
+            'dtt_container_block_write_bytes_total{' + labels + '""} 2000',
+            'dtt_container_block_write_bytes_total{' + labels + '"test_one"} 100',
+        ])
+        self.assertIn("# TYPE dtt_container_network_transmit_bytes counter\n", text)
+        self.assertIn("# TYPE dtt_container_block_write_bytes counter\n", text)
+
+    def test_escape_labels(self):
+        """Validate label values are escaped."""
+        self.assertEqual(openmetrics.format_sample("metric", [("test", 'test["a\\b"]\n')], 1),
+                         'metric{test="test[\\"a\\\\b\\"]\\n"} 1')
+
+    def test_endpoint(self):
+        """Validate the metrics are served while the exporter runs, and written to the metrics file once it stops."""
+        self.write(self.sample("project-consul.service-1", 1.5, 10 * MB, 100, 1000))
+        self.exporter.port = 0
+        self.exporter.interval = 60
+        self.exporter.start()
+        self.addCleanup(self.exporter.stop)
+        self.assertNotEqual(self.exporter.port, 0)
+
+        self.write(u">>> test_two", self.sample("project-consul.service-1", 3.5, 10 * MB, 100, 1000))
+        response = urlopen(self.exporter.url)
+        self.assertEqual(response.headers["Content-Type"], openmetrics.CONTENT_TYPE)
+        self.assertIn('test="test_two"} 3.5', response.read().decode("utf-8"))
+
+        with self.assertRaises(HTTPError) as context:
+            urlopen(self.exporter.url.replace("/metrics", "/other"))
+        self.assertEqual(context.exception.code, 404)
+
+        self.write(self.sample("project-consul.service-1", 4.5, 10 * MB, 100, 1000))
+        self.exporter.stop()
+        self.assertIsNone(self.exporter.url)
+        with io.open(self.metrics_path, encoding="utf-8") as metrics_file:
+            self.assertIn('test="test_two"} 4.5', metrics_file.read())
@@ -0,0 +1,93 @@
+import os
+import threading
+import unittest
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import pool
+from docker_test_tools.config import Config
+
+
+class TestEnvironmentPool(unittest.TestCase):
+    """Test for the environment pool."""
+
+    def get_controller(self, name):
+        """Return a mocked controller."""
+        controller = mock.MagicMock(project_name=name, log_path="logs/{0}/docker.log".format(name))
+        controller.wait_for_services.return_value = True
+        return controller
+
+    def test_acquire_and_release(self):
+        """Validate environments are set up, handed out and recycled."""
+        controllers = [self.get_controller("env-0"), self.get_controller("env-1")]
+        environment_pool = pool.EnvironmentPool(controllers=controllers)
+        environment_pool.start()
+
+        acquired = [environment_pool.acquire(timeout=5), environment_pool.acquire(timeout=5)]
+        self.assertEqual(sorted(controller.project_name for controller in acquired), ["env-0", "env-1"])
+        for controller in controllers:
+            controller.setup.assert_called_once_with()
+
+        environment_pool.release(acquired[0])
+        self.assertIs(environment_pool.acquire(timeout=5), acquired[0])
+        acquired[0].teardown.assert_called_once_with()
+        self.assertEqual(acquired[0].setup.call_count, 2)
+
+        # Each lease collects its logs into its own directory
+        log_dir = "logs/{0}".format(acquired[0].project_name)
+        self.assertEqual(acquired[0].set_log_path.call_args_list, [
+            mock.call(os.path.join(log_dir, "lease1", "docker.log")),
+            mock.call(os.path.join(log_dir, "lease2", "docker.log")),
+        ])
+
+        environment_pool.close()
+        for controller in controllers:
+            self.assertTrue(controller.teardown.called)
+
+    def test_acquire_waits_for_recycle(self):
+        """Validate acquire blocks until a released environment is ready again."""
+        controller = self.get_controller("env-0")
+        environment_pool = pool.EnvironmentPool(controllers=[controller])
+        environment_pool.start()
+        environment_pool.acquire(timeout=5)
+
+        with self.assertRaises(RuntimeError):
+            environment_pool.acquire(timeout=0.01)
+
+        setup_allowed = threading.Event()
+        controller.setup.side_effect = lambda: setup_allowed.wait(5)
+        environment_pool.release(controller)
+        setup_allowed.set()
+        self.assertIs(environment_pool.acquire(timeout=5), controller)
+        environment_pool.close()
+
+    def test_failed_setup(self):
+        """Validate a failed environment set up is reported to the consumer, and the environment is recycled."""
+        controller = self.get_controller("env-0")
+        controller.wait_for_services.return_value = False
+        environment_pool = pool.EnvironmentPool(controllers=[controller])
+        environment_pool.start()
+
+        with self.assertRaises(RuntimeError):
+            environment_pool.acquire(timeout=5)
+
+        controller.wait_for_services.return_value = True
+        self.assertIs(environment_pool.acquire(timeout=5), controller)
+        controller.teardown.assert_called_once_with()
+        environment_pool.close()
+
+    @mock.patch("docker_test_tools.pool.EnvironmentController")
+    def test_from_config(self, controller_mock):
+        """Validate the pool environments use distinct projects."""
+        config = Config(project_name="project", log_path="build/docker.log", docker_compose_path="compose.yml")
+        environment_pool = pool.EnvironmentPool.from_config(config=config, size=2)
+
+        self.assertEqual(len(environment_pool.controllers), 2)
+        calls = controller_mock.from_config.call_args_list
+        self.assertEqual([call[1]["project_name"] for call in calls], ["project-pool0", "project-pool1"])
+        for call in calls:
+            self.assertTrue(call[1]["ephemeral_ports"])
@@ -0,0 +1,75 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from docker_test_tools.profiler import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    """Test for the environment operations profiler."""
+
+    def setUp(self):
+        """Create a temporary directory."""
+        self.target_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.target_dir)
+
+    def test_span(self):
+        """Validate spans are recorded with their timing, ordered by start time."""
+        profiler = Profiler()
+        with profiler.span("outer", category="environment"):
+            with profiler.span("inner", category="compose", command="docker-compose up"):
+                pass
+
+        profiler.add_span("ready service1", category="readiness", start=0, end=2, service="service1")
+
+        timeline = profiler.get_timeline()
+        self.assertEqual([span["name"] for span in timeline], ["ready service1", "outer", "inner"])
+        self.assertEqual(timeline[0]["duration"], 2)
+        self.assertEqual(timeline[2]["args"], {"command": "docker-compose up"})
+        self.assertLessEqual(timeline[1]["start"], timeline[2]["start"])
+        self.assertGreaterEqual(timeline[1]["end"], timeline[2]["end"])
+
+    def test_span_failure(self):
+        """Validate a span is recorded even if the wrapped block fails."""
+        profiler = Profiler()
+        with self.assertRaises(RuntimeError):
+            with profiler.span("failing", category="environment"):
+                raise RuntimeError("failure")
+
+        self.assertEqual([span["name"] for span in profiler.get_timeline()], ["failing"])
+
+    def test_disabled(self):
+        """Validate a disabled profiler records nothing."""
+        profiler = Profiler(enabled=False)
+        with profiler.span("setup", category="environment"):
+            pass
+
+        profiler.add_span("ready service1", category="readiness", start=0, end=2)
+        self.assertEqual(profiler.get_timeline(), [])
+
+    def test_write(self):
+        """Validate the timeline and chrome trace files content."""
+        profiler = Profiler()
+        profiler.add_span("setup", category="environment", start=1.5, end=3.5)
+
+        timeline_path = os.path.join(self.target_dir, "logs", "profile.json")
+        trace_path = os.path.join(self.target_dir, "trace.json")
+        profiler.write_timeline(timeline_path)
+        profiler.write_chrome_trace(trace_path)
+
+        with open(timeline_path) as timeline_file:
+            spans = json.load(timeline_file)["spans"]
+        self.assertEqual([(span["name"], span["duration"]) for span in spans], [("setup", 2)])
+
+        with open(trace_path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertEqual(events[0]["cat"], "environment")
+        self.assertEqual(events[0]["ts"], 1500000)
+        self.assertEqual(events[0]["dur"], 2000000)
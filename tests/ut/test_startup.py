@@ -0,0 +1,113 @@
+import threading
+import unittest
+from six import PY3
+from six.moves import queue
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import startup
+
+
+class FakeEventsStream(object):
+    """Docker events stream fed by the test."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def __iter__(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            yield event
+
+    def put(self, service, action, container_id="container-id"):
+        self.events.put({"Action": action,
+                         "Actor": {"ID": container_id, "Attributes": {startup.SERVICE_LABEL: service}}})
+
+    def close(self):
+        self.events.put(None)
+
+
+class TestStartupScheduler(unittest.TestCase):
+    """Test for the dependency ordered startup scheduler."""
+
+    DEPENDENCIES = {"db": [], "cache": [], "app": ["db", "cache"], "web": ["app"]}
+    HEALTH_CHECKED = {"db"}
+
+    def setUp(self):
+        """Create a scheduler with mocked compose & docker client."""
+        self.events = FakeEventsStream()
+        self.started = []
+        self.lock = threading.Lock()
+
+        self.healthy = set()
+
+        self.docker_client = mock.MagicMock()
+        self.docker_client.events.return_value = self.events
+
+        self.compose = mock.MagicMock()
+        self.compose.start.side_effect = self.compose_start
+
+        self.scheduler = startup.StartupScheduler(compose=self.compose,
+                                                  docker_client=self.docker_client,
+                                                  project_name="project",
+                                                  dependencies=self.DEPENDENCIES,
+                                                  is_ready=self.is_ready,
+                                                  timeout=5,
+                                                  interval=60)
+
+    def is_ready(self, service):
+        """Return True if the service is started, and healthy if it's health checked."""
+        with self.lock:
+            return service in self.started and (service not in self.HEALTH_CHECKED or service in self.healthy)
+
+    def compose_start(self, services):
+        """Emulate the containers events caused by starting a service."""
+        self.compose.create.assert_called_once_with(services=list(self.DEPENDENCIES))
+        service = services[0]
+        with self.lock:
+            for dependency in self.DEPENDENCIES[service]:
+                self.assertIn(dependency, self.started)
+            self.started.append(service)
+
+        self.events.put(service, "start", container_id=service)
+        if service in self.HEALTH_CHECKED:
+            with self.lock:
+                self.healthy.add(service)
+            self.events.put(service, "health_status: healthy", container_id=service)
+
+    def test_run(self):
+        """Validate services start after their dependencies are ready, and the report content."""
+        report = self.scheduler.run()
+
+        self.assertEqual(sorted(self.started), sorted(self.DEPENDENCIES))
+        self.assertEqual(self.started[-2:], ["app", "web"])
+        self.docker_client.events.assert_called_once_with(
+            decode=True, filters={"type": "container", "label": "com.docker.compose.project=project"}
+        )
+
+        self.assertEqual(sorted(report["services"]), sorted(self.DEPENDENCIES))
+        self.assertEqual(report["critical_path"][-2:], ["app", "web"])
+        self.assertIn(report["critical_path"][0], ["db", "cache"])
+        self.assertEqual(report["total"], report["services"]["web"]["ready"])
+        for timing in report["services"].values():
+            self.assertGreaterEqual(timing["startup"], 0)
+
+    def test_polled_readiness(self):
+        """Validate services which become ready without a container event (e.g. logging a pattern) are found."""
+        self.scheduler.interval = 0.01
+        self.events.put = mock.MagicMock()
+        self.scheduler.run()
+        self.assertEqual(self.started[-2:], ["app", "web"])
+
+    def test_dependency_not_ready(self):
+        """Validate a service which never becomes ready fails the startup."""
+        self.scheduler.timeout = 0.1
+        self.compose.start.side_effect = None
+
+        with self.assertRaises(RuntimeError):
+            self.scheduler.run()
@@ -0,0 +1,114 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import stats
+from docker_test_tools.pytest_plugin import pytest_plugin
+
+MB = 1000 * 1000
+
+
+class TestStatsTrend(unittest.TestCase):
+    """Test for the containers RAM trend analysis."""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.stats_path = os.path.join(self.work_dir, "stats.json")
+
+    def write_stats(self, lines):
+        with io.open(self.stats_path, "w", encoding="utf-8") as stats_file:
+            stats_file.write(u"".join(line + u"\n" for line in lines))
+
+    def docker_sample(self, name, ram):
+        """Return a docker stats sample line, each starting a new sample."""
+        return stats.ClusterStats.SAMPLE_PREFIX + json.dumps({
+            "name": name, "cpu": "1.00%", "ram": "{0}B / 1GiB".format(ram), "net": "0B / 0B", "block": "0B / 0B",
+        })
+
+    def test_linear_trend(self):
+        """Validate the iterative linear regression, over large (epoch time) values."""
+        trend = stats.LinearTrend()
+        self.assertIsNone(trend.slope)
+        for index in range(10):
+            trend.update(1700000000 + index, 2 * 10 ** 9 + 3 * index + (1 if index % 2 else -1))
+
+        self.assertAlmostEqual(trend.slope, 3, delta=0.2)
+        self.assertGreater(trend.r2, 0.9)
+
+        flat_trend = stats.LinearTrend()
+        for index in range(3):
+            flat_trend.update(index, 100)
+
+        self.assertEqual(flat_trend.slope, 0)
+        self.assertIsNone(flat_trend.r2)
+
+    def test_leak_suspects(self):
+        """Validate containers whose RAM grows steadily are suspected of leaking, using docker stats samples."""
+        lines = []
+        for index in range(12):
+            lines.append(self.docker_sample("leaking", 100 * MB + index * 2 * MB))
+            lines.append(json.dumps({"name": "steady", "cpu": "1.00%", "ram": "{0}B / 1GiB".format(
+                100 * MB + (index % 2) * 5 * MB), "net": "0B / 0B", "block": "0B / 0B"}))
+        self.write_stats(lines)
+
+        cluster_stats = stats.ClusterStats(stat_file_path=self.stats_path, encoding="utf-8", leak_slope=MB)
+        suspects = cluster_stats.get_leak_suspects()
+        self.assertEqual([suspect["name"] for suspect in suspects], ["leaking"])
+        self.assertAlmostEqual(suspects[0]["slope"], 120 * MB)
+        self.assertEqual(suspects[0]["samples"], 12)
+
+        summary = cluster_stats.to_dict()
+        self.assertTrue(summary["leaking"]["ram_trend"]["leak_suspect"])
+        self.assertEqual(summary["leaking"]["ram_trend"]["slope_per_minute"], "120 MB")
+        self.assertFalse(summary["steady"]["ram_trend"]["leak_suspect"])
+        self.assertEqual(summary["leak_suspects"], [dict(suspects[0], slope_per_minute="120 MB")])
+
+        # No container is suspected without a leak slope
+        cluster_stats = stats.ClusterStats(stat_file_path=self.stats_path, encoding="utf-8", leak_slope=0)
+        self.assertEqual(cluster_stats.get_leak_suspects(), [])
+
+    def test_test_windows(self):
+        """Validate the RAM average of each test window, and the RAM growth per test."""
+        self.write_stats([
+            u">>> ========= PYTEST SESSION BEGINNING =========",
+            u">>> [gw0] ========= TEST BEGINNING: test_one =========",
+            json.dumps({"name": "service1", "cpu": 1.0, "ram": 10 * MB, "net": 0, "block": 0, "time": 1.0}),
+            json.dumps({"name": "service1", "cpu": 1.0, "ram": 12 * MB, "net": 0, "block": 0, "time": 2.0}),
+            u">>> [gw0] ========= TEST END: test_one =========",
+            json.dumps({"name": "service1", "cpu": 1.0, "ram": 50 * MB, "net": 0, "block": 0, "time": 3.0}),
+            u">>> test_two",
+            json.dumps({"name": "service1", "cpu": 1.0, "ram": 15 * MB, "net": 0, "block": 0, "time": 4.0}),
+        ])
+
+        ram_trend = stats.ClusterStats(stat_file_path=self.stats_path, encoding="utf-8").to_dict()["service1"]["ram_trend"]
+        self.assertEqual(ram_trend["tests"], {"test_one": "11 MB", "test_two": "15 MB"})
+        self.assertEqual(ram_trend["slope_per_test"], "4 MB")
+        self.assertEqual(ram_trend["samples"], 4)
+
+    def test_session_report(self):
+        """Validate the containers suspected of leaking memory are reported at the end of the pytest session."""
+        config = mock.MagicMock(dtt_leak_suspects=[], spec=["dtt_leak_suspects"])
+        pytest_plugin.report_leak_suspects(config, [{"name": "leaking", "slope": 2 * MB, "r2": 0.9, "samples": 20}])
+
+        worker = mock.MagicMock(config=config, workeroutput={"dtt_leak_suspects": [
+            {"name": "other", "slope": -MB, "r2": 0.5, "samples": 10},
+        ]})
+        pytest_plugin.pytest_testnodedown(worker, None)
+
+        reporter = mock.MagicMock(config=config)
+        pytest_plugin.pytest_terminal_summary(reporter)
+        reporter.write_line.assert_has_calls([
+            mock.call("leaking: RAM grew by 2 MB per minute (r2 0.90, 20 samples)"),
+            mock.call("other: RAM grew by -1 MB per minute (r2 0.50, 10 samples)"),
+        ])
@@ -24,3 +24,18 @@ class TestUtils(unittest.TestCase):
         self.assertTrue(utils.run_health_checks([lambda: True, lambda: True], timeout=0))
         self.assertFalse(utils.run_health_checks([lambda: True, lambda: False], timeout=0))
         self.assertFalse(utils.run_health_checks([lambda: False, lambda: False], timeout=0))
+
+    def test_to_list(self):
+        """Validate the to_list function."""
+        self.assertEqual(utils.to_list(None), [])
+        self.assertEqual(utils.to_list(""), [])
+        self.assertEqual(utils.to_list("a.yml"), ["a.yml"])
+        self.assertEqual(utils.to_list(" a.yml, b.yml,\nc.yml "), ["a.yml", "b.yml", "c.yml"])
+        self.assertEqual(utils.to_list(("a.yml", "b.yml")), ["a.yml", "b.yml"])
+
+    def test_get_required_services(self):
+        """Validate the get_required_services function."""
+        self.assertEqual(utils.get_required_services([["b", "a"], ["a", "c"]]), ["a", "b", "c"])
+        self.assertIsNone(utils.get_required_services([["a"], []]))
+        self.assertIsNone(utils.get_required_services([["a"], None]))
+        self.assertIsNone(utils.get_required_services([]))
@@ -0,0 +1,168 @@
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from nose2 import events, result
+
+from docker_test_tools import plugin, watchdog
+from docker_test_tools.pytest_plugin import pytest_plugin
+
+MB = 1000 * 1000
+
+
+class FakeClock(object):
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResourceWatchdog(unittest.TestCase):
+    """Test for the live resource limits watchdog."""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.stats_path = os.path.join(self.work_dir, "stats.json")
+        self.clock = FakeClock()
+        self.watchdog = watchdog.ResourceWatchdog(
+            stats_file_path=self.stats_path,
+            limits="consul.service: ram=100MB, cpu=150%; *: ram_rate=1MB",
+            project_name="project",
+            clock=self.clock,
+        )
+
+    def write(self, text):
+        with io.open(self.stats_path, "a", encoding="utf-8") as stats_file:
+            stats_file.write(text)
+
+    def sample(self, name, ram, cpu=1.0, time=None):
+        sample = {"name": name, "cpu": cpu, "ram": ram, "net": 0, "block": 0}
+        if time is not None:
+            sample["time"] = time
+        return json.dumps(sample) + "\n"
+
+    def test_parse_limits(self):
+        """Validate parsing the limits of each service, from a string or a dictionary."""
+        self.assertEqual(watchdog.parse_limits("consul.service: ram=512MB, cpu=150%\n*: block_rate=1KiB"), {
+            "consul.service": {"ram": 512 * MB, "cpu": 150.0},
+            "*": {"block_rate": 1024},
+        })
+        self.assertEqual(watchdog.parse_limits({"consul.service": {"ram": "1GB", "cpu_rate": 10}}),
+                         {"consul.service": {"ram": 1000 * MB, "cpu_rate": 10}})
+        self.assertEqual(watchdog.parse_limits(""), {})
+        self.assertRaises(RuntimeError, watchdog.parse_limits, "consul.service: disk=1GB")
+        self.assertRaises(RuntimeError, watchdog.parse_limits, "consul.service")
+
+    def test_absolute_limits(self):
+        """Validate every new sample is evaluated against the container service limits."""
+        self.write(self.sample("project-consul.service-1", 150 * MB) +
+                   u"\x1b[2J\x1b[H" + json.dumps({"name": "project-consul.service-1", "cpu": "200.00%",
+                                                   "ram": "50MB / 1GB", "net": "0B / 0B", "block": "0B / 0B"}) + "\n" +
+                   u">>> ========= TEST BEGINNING: test_one =========\n" +
+                   self.sample("project-mocked.service-1", 500 * MB) +
+                   self.sample("project-consul.service-1", 120 * MB))
+
+        violations = self.watchdog.check()
+        self.assertEqual([str(violation) for violation in violations], [
+            "project-consul.service-1 cpu 200.0% exceeds its 150.0% limit",
+            "project-consul.service-1 ram 150 MB exceeds its 100 MB limit",
+        ])
+        self.assertEqual(self.watchdog.check(), [])
+
+    def test_rate_limits(self):
+        """Validate the rates of change are measured over the rate window, using the samples time."""
+        for second in range(0, 4):
+            self.write(self.sample("project-mocked.service-1", 10 * MB + second * 3 * MB, time=second))
+            self.watchdog.poll()
+
+        self.assertEqual(self.watchdog.drain(), [])
+        for second in range(5, 20):
+            self.write(self.sample("project-mocked.service-1", 10 * MB + second * 3 * MB, time=second))
+            self.watchdog.poll()
+
+        violations = self.watchdog.drain()
+        self.assertEqual([str(violation) for violation in violations],
+                         ["project-mocked.service-1 ram_rate 3 MB per second exceeds its 1 MB per second limit"])
+
+    def test_partial_lines_and_truncation(self):
+        """Validate partially written lines are evaluated once complete, and truncated stats are read again."""
+        line = self.sample("project-consul.service-1", 150 * MB)
+        self.write(u">>> ========= TEST BEGINNING: test_one =========\n" + line[:10])
+        self.assertEqual(self.watchdog.check(), [])
+        self.write(line[10:])
+        self.assertEqual(len(self.watchdog.check()), 1)
+
+        with io.open(self.stats_path, "w", encoding="utf-8") as stats_file:
+            stats_file.write(self.sample("project-consul.service-1", 101 * MB))
+        self.assertEqual(len(self.watchdog.check()), 1)
+
+    def test_attach(self):
+        """Validate attached watchdogs evaluate only the stats collected since they attached."""
+        self.write(self.sample("project-consul.service-1", 150 * MB))
+        self.watchdog.attach()
+        self.addCleanup(self.watchdog.detach)
+
+        self.assertEqual(self.watchdog.check(), [])
+        self.write(self.sample("project-consul.service-1", 160 * MB))
+        self.assertEqual([violation.value for violation in self.watchdog.check()], [160 * MB])
+
+    def test_nose2_plugin(self):
+        """Validate passing nose2 tests fail when the containers exceed their limits while they run."""
+        environment_plugin = plugin.EnvironmentPlugin()
+        environment_plugin.controller = mock.MagicMock(resource_watchdog=self.watchdog)
+        test = unittest.FunctionTestCase(lambda: None)
+
+        def get_outcome(outcome):
+            event = events.TestOutcomeEvent(test, mock.MagicMock(), outcome, expected=outcome == result.PASS)
+            environment_plugin.setTestOutcome(event)
+            return event
+
+        self.assertEqual(get_outcome(result.PASS).outcome, result.PASS)
+
+        self.write(self.sample("project-consul.service-1", 150 * MB))
+        event = get_outcome(result.PASS)
+        self.assertEqual(event.outcome, result.FAIL)
+        self.assertFalse(event.expected)
+        self.assertIsInstance(event.exc_info[1], AssertionError)
+        self.assertIn("ram 150 MB exceeds its 100 MB limit", str(event.exc_info[1]))
+
+        # Violations found while a failing test ran are drained, and not reported to the next test
+        self.write(self.sample("project-consul.service-1", 160 * MB))
+        self.assertIsNone(get_outcome(result.ERROR).exc_info)
+        self.assertEqual(get_outcome(result.PASS).outcome, result.PASS)
+
+        environment_plugin.controller.resource_watchdog = None
+        self.write(self.sample("project-consul.service-1", 170 * MB))
+        self.assertEqual(get_outcome(result.PASS).outcome, result.PASS)
+
+    def test_pytest_hooks(self):
+        """Validate passing pytest tests fail when the containers exceed their limits while they run."""
+        self.write(self.sample("project-consul.service-1", 150 * MB))
+        item = mock.MagicMock(spec=["config"], config=mock.MagicMock(dtt_resource_watchdog=self.watchdog))
+
+        hook = pytest_plugin.pytest_runtest_call(item)
+        next(hook)
+        self.write(self.sample("project-consul.service-1", 200 * MB))
+        self.assertRaises(StopIteration, next, hook)
+
+        report = mock.MagicMock(when="call", passed=True)
+        hook = pytest_plugin.pytest_runtest_makereport(item, mock.MagicMock())
+        next(hook)
+        self.assertRaises(StopIteration, hook.send, mock.MagicMock(**{"get_result.return_value": report}))
+        self.assertEqual(report.outcome, "failed")
+        self.assertEqual(report.longrepr, "Environment containers exceeded their resource limits:\n"
+                                          "  project-consul.service-1 ram 200 MB exceeds its 100 MB limit")
@@ -7,7 +7,7 @@ if PY3:
 else:
     import mock
 
-from docker_test_tools import wiremock
+from docker_test_tools import metrics, wiremock
 
 
 class TestWiremockController(unittest.TestCase):
@@ -17,6 +17,23 @@ class TestWiremockController(unittest.TestCase):
         with open("tests/resources/ut/requests-journal.json") as journal_file:
             self.journal_json = journal_file.read()
 
+    def test_metrics(self):
+        """Test the wiremock operations latency is reported to the metrics observers."""
+        histogram = metrics.HistogramObserver()
+        controller = wiremock.WiremockController(url='http://mocked.service:9999',
+                                                 metrics=metrics.Metrics([histogram]))
+
+        with mock.patch("requests.post", mock.MagicMock()):
+            controller.reset_mapping()
+
+        with self.assertRaises(wiremock.WiremockError):
+            controller.reset_mapping()
+
+        summary = histogram.get_summary()
+        self.assertEqual(list(summary), ["wiremock_reset_mapping"])
+        self.assertEqual(summary["wiremock_reset_mapping"]["count"], 2)
+        self.assertEqual(summary["wiremock_reset_mapping"]["errors"], 1)
+
     def test_reset_mapping(self):
         """Test reset mapping method."""
         # Reset should fail - service url is not reachable
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+import unittest
+from six import PY3
+
+if PY3:
+    from unittest import mock
+else:
+    import mock
+
+from docker_test_tools import workers
+
+
+class TestSharedEnvironment(unittest.TestCase):
+    """Test for the workers shared environment."""
+
+    def setUp(self):
+        """Create a temporary directory for the workers state."""
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.test_dir)
+
+    def get_shared_environment(self, worker_id, test_run_id="run-1"):
+        """Return a shared environment of a worker with a mocked controller."""
+        controller = mock.MagicMock(log_path=os.path.join(self.test_dir, "docker.log"), project_name="project")
+        return workers.SharedEnvironment(controller=controller,
+                                         worker_id=worker_id,
+                                         worker_count=2,
+                                         test_run_id=test_run_id,
+                                         finish_timeout=1,
+                                         interval=0.01,
+                                         registry=workers.WorkersRegistry(test_run_id, root_dir=self.test_dir))
+
+    def test_setup_once(self):
+        """Validate the environment is set up by the first worker and attached by the others."""
+        first = self.get_shared_environment("gw0")
+        second = self.get_shared_environment("gw1")
+
+        first.setup()
+        second.setup()
+
+        self.assertTrue(first.is_owner)
+        first.controller.setup.assert_called_once_with()
+        first.controller.attach.assert_not_called()
+
+        self.assertFalse(second.is_owner)
+        second.controller.setup.assert_not_called()
+        second.controller.attach.assert_called_once_with()
+
+    def test_new_test_run(self):
+        """Validate a state left by a different test run is not attached to."""
+        self.get_shared_environment("gw0", test_run_id="old-run").setup()
+
+        shared_environment = self.get_shared_environment("gw1", test_run_id="new-run")
+        shared_environment.setup()
+        shared_environment.controller.setup.assert_called_once_with()
+
+    def test_teardown_after_all_workers_finished(self):
+        """Validate the owner tears the environment down only after all workers finished."""
+        first = self.get_shared_environment("gw0")
+        second = self.get_shared_environment("gw1")
+        first.setup()
+        second.setup()
+
+        second.teardown()
+        second.controller.detach.assert_called_once_with()
+        second.controller.teardown.assert_not_called()
+
+        first.teardown()
+        first.controller.teardown.assert_called_once_with()
+        self.assertFalse(os.path.exists(first.state_path))
+        self.assertFalse(os.path.exists(first.registry.run_dir))
+
+    def test_registry(self):
+        """Validate workers which didn't use the environment or crashed are counted as finished."""
+        registry = workers.WorkersRegistry("run-1", root_dir=self.test_dir)
+        registry.start("gw0")
+        registry.start("gw1")
+        self.assertFalse(registry.all_finished(2))
+
+        registry.finish("gw0")
+        self.assertFalse(registry.all_finished(2))
+
+        with mock.patch("docker_test_tools.workers.is_process_alive", return_value=False):
+            self.assertTrue(registry.all_finished(2))
+
+        registry.finish("gw1")
+        self.assertTrue(registry.all_finished(2))
+        self.assertFalse(registry.all_finished(3))
+
+        registry.remove()
+        registry.finish("gw1")
+        self.assertFalse(os.path.exists(registry.run_dir))
+
+    def test_is_process_alive(self):
+        """Validate running processes are detected."""
+        self.assertTrue(workers.is_process_alive(os.getpid()))
+        with mock.patch("os.kill", side_effect=OSError(3, "No such process")):
+            self.assertFalse(workers.is_process_alive(1234))
+
+    def test_teardown_timeout(self):
+        """Validate the owner tears the environment down once the timeout expires."""
+        first = self.get_shared_environment("gw0")
+        first.setup()
+        first.teardown()
+        first.controller.teardown.assert_called_once_with()
+
+    def test_isolated_names(self):
+        """Validate the isolated environment project name & log path of a worker."""
+        self.assertEqual(workers.get_isolated_project_name("project", "gw1"), "project-gw1")
+        self.assertEqual(workers.get_isolated_log_path(os.path.join("build", "docker.log"), "gw1"),
+                         os.path.join("build", "gw1", "docker.log"))
+
+    @mock.patch.dict(os.environ, {workers.WORKER_ID_ENV_VAR: "gw3"})
+    def test_tag_message(self):
+        """Validate messages are tagged by the worker id."""
+        self.assertEqual(workers.tag_message("message"), "[gw3] message")
+        self.assertEqual(workers.tag_message("message", worker_id="gw1"), "[gw1] message")
+
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(workers.tag_message("message"), "message")